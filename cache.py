@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру in-memory кэш с вытеснением давно неиспользуемых
+    записей и необязательным временем жизни (ttl, в секундах).
+
+    С weigh maxsize ограничивает не число записей, а сумму weigh(value) —
+    для значений очень разного размера
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        weigh: Callable[[Any], int] | None = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh or (lambda value: 1)
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self._weights: dict[Hashable, int] = {}
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None):
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._delete(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        if key in self._data:
+            self._delete(key)
+        weight = self.weigh(value)
+        if weight > self.maxsize:
+            # Такое значение вытеснило бы весь кэш, и само не поместилось
+            return
+        self._data[key] = (expires_at, value)
+        self._weights[key] = weight
+        self.weight += weight
+        while self.weight > self.maxsize and self._data:
+            self._delete(next(iter(self._data)))
+
+    def _delete(self, key: Hashable):
+        _, value = self._data.pop(key)
+        self.weight -= self._weights.pop(key)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None):
+        if key not in self._data:
+            return default
+        return self._delete(key)
+
+    def pop_if(self, predicate):
+        """
+        Удаляет записи, для которых predicate(key, value) истинно
+        """
+        keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in keys:
+            self._delete(key)
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+        self._weights.clear()
+        self.weight = 0
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "weight": self.weight,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
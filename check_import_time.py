@@ -0,0 +1,79 @@
+"""
+Бюджет времени запуска: импорт main (без подключения к базе) не должен
+становиться медленнее. Для CI:
+
+    python check_import_time.py --budget-ms 450
+
+Импорт выполняется --runs раз в отдельных процессах с -X importtime,
+берется лучший результат. Скрипт завершается с кодом 1, если он больше
+бюджета или среди загруженных модулей есть --forbid (подсистемы, которые
+должны импортироваться лениво).
+"""
+
+import argparse
+import subprocess
+import sys
+
+
+def import_times(module: str):
+    """
+    {модуль: (собственное, накопленное время в мкс)} для одного запуска
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main(args):
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"Импорт {args.module}: {total_ms:.1f} мс (бюджет {args.budget_ms} мс)")
+    print("Самые медленные пакеты, мс:")
+    slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (_, cumulative) in [
+        item for item in slowest if item[0] != args.module and "." not in item[0]
+    ][: args.top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+    failed = False
+    loaded = [name for name in args.forbid if name in best]
+    if loaded:
+        print(f"FAIL: при запуске импортированы {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: время запуска превышает бюджет")
+        failed = True
+    if failed:
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=450)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--forbid",
+        nargs="*",
+        default=["aiohttp", "passlib", "jose", "views.deepseek"],
+    )
+
+    sys.exit(main(parser.parse_args()))
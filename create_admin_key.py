@@ -0,0 +1,33 @@
+"""
+Выпуск API-ключа администратора для маршрутов обслуживания
+(POST /api/data_version, POST /api/warmup, сверка движков с SQL).
+Через /api/api_keys пользователи получают только обычные ключи.
+
+    python create_admin_key.py --owner-id 1 --name loader
+
+Ключ печатается один раз, в базе хранится только его HMAC.
+"""
+
+import argparse
+import asyncio
+
+from database import engine, new_session
+import views.api_keys as api_key_views
+
+
+async def main(owner_id: int, name: str):
+    async with new_session() as db:
+        api_key, key = await api_key_views.create(
+            db, owner_id, name, scope=api_key_views.ADMIN_SCOPE
+        )
+    await engine.dispose()
+    print(f"id={api_key.id} prefix={api_key.prefix}")
+    print(key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--owner-id", type=int, required=True)
+    parser.add_argument("--name", default="admin")
+    args = parser.parse_args()
+    asyncio.run(main(args.owner_id, args.name))
@@ -1,20 +1,150 @@
 import os
+import time
 from typing import Annotated
 from dotenv import load_dotenv
 from fastapi import Depends
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{os.getenv('DATABASE_USER')}:{os.getenv('DATABASE_PASSWORD')}@{os.getenv('DATABASE_HOST')}:{os.getenv('DATABASE_PORT')}/{os.getenv('DATABASE_TABLE')}"
 
+# Подготовка частых запросов аналитики на каждом новом соединении пула:
+# первый запрос после рестарта не тратит обмен с сервером на Parse/Describe
+# (план PostgreSQL все равно строит при выполнении)
+DATABASE_PREPARE = os.getenv("DATABASE_PREPARE", "0") == "1"
+
+# Реплика для аналитики и списков: задается REPLICA_DATABASE_HOST (остальные
+# параметры по умолчанию как у основной базы); используется, пока ее
+# отставание не больше REPLICA_MAX_LAG секунд
+REPLICA_DATABASE_HOST = os.getenv("REPLICA_DATABASE_HOST")
+REPLICA_DATABASE_URL = f"postgresql+asyncpg://{os.getenv('REPLICA_DATABASE_USER', os.getenv('DATABASE_USER'))}:{os.getenv('REPLICA_DATABASE_PASSWORD', os.getenv('DATABASE_PASSWORD'))}@{REPLICA_DATABASE_HOST}:{os.getenv('REPLICA_DATABASE_PORT', os.getenv('DATABASE_PORT'))}/{os.getenv('REPLICA_DATABASE_TABLE', os.getenv('DATABASE_TABLE'))}"
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 1))
+
+# Отставание 0, если реплика догнала основную базу или это не реплика
+# (например, вторая локальная копия базы)
+REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery()
+        OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
 engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
 new_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+replica_engine = (
+    create_async_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_HOST else None
+)
+new_replica_session = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine
+    else None
+)
+replica_stats = {
+    "enabled": replica_engine is not None,
+    "max_lag": REPLICA_MAX_LAG,
+    "lag": None,
+    "checked_at": 0.0,
+    "reads": 0,
+    "fallbacks": 0,
+}
+
+# name -> SQL в синтаксисе asyncpg ($1, $2, ...); заполняет views/prepared
+statements: dict[str, str] = {}
+prepare_stats = {
+    "enabled": DATABASE_PREPARE,
+    "connections": 0,
+    "prepared": 0,
+    "failed": [],
+    "first_ms": None,
+    "last_ms": None,
+    "total_ms": 0.0,
+}
+
+
+def register_statement(name: str, sql: str):
+    statements[name] = str(text(sql).compile(dialect=engine.dialect))
+
+
+def prepare_statements(dbapi_connection, connection_record):
+    if not DATABASE_PREPARE:
+        return
+
+    started = time.perf_counter()
+    prepared, failed = 0, []
+    for name, sql in statements.items():
+        try:
+            # Через кэш подготовленных запросов адаптера SQLAlchemy: execute с
+            # тем же текстом берет запрос оттуда. Connection.prepare() asyncpg
+            # в этот кэш не попадает, и такой запрос готовился бы заново.
+            # 0 — время сброса схемы, как у курсоров, пока сбросов не было
+            dbapi_connection.await_(dbapi_connection._prepare(sql, 0))
+            prepared += 1
+        except Exception:
+            failed.append(name)
+    elapsed = round((time.perf_counter() - started) * 1000, 2)
+
+    prepare_stats["connections"] += 1
+    prepare_stats["prepared"] = prepared
+    prepare_stats["failed"] = failed
+    prepare_stats["first_ms"] = prepare_stats["first_ms"] or elapsed
+    prepare_stats["last_ms"] = elapsed
+    prepare_stats["total_ms"] = round(prepare_stats["total_ms"] + elapsed, 2)
+
+
+for _engine in (engine, replica_engine):
+    if _engine is not None:
+        event.listen(_engine.sync_engine, "connect", prepare_statements)
+
+
+async def replica_available():
+    """
+    Отставание реплики проверяется не чаще раза в REPLICA_LAG_CHECK_INTERVAL;
+    недоступная реплика считается отставшей
+    """
+    if replica_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - replica_stats["checked_at"] >= REPLICA_LAG_CHECK_INTERVAL:
+        replica_stats["checked_at"] = now
+        try:
+            async with replica_engine.connect() as connection:
+                lag = (await connection.execute(text(REPLICA_LAG))).scalar()
+            replica_stats["lag"] = None if lag is None else float(lag)
+        except Exception:
+            replica_stats["lag"] = None
+
+    lag = replica_stats["lag"]
+    return lag is not None and lag <= REPLICA_MAX_LAG
+
+
+async def read_session():
+    """
+    Сессия только для чтения: реплика, если она не отстала, иначе основная база
+    """
+    if await replica_available():
+        replica_stats["reads"] += 1
+        return new_replica_session()
+    if replica_engine is not None:
+        replica_stats["fallbacks"] += 1
+    return new_session()
+
 
 async def get_session():
     async with new_session() as session:
         yield session
 
 
+async def get_read_session():
+    async with await read_session() as session:
+        yield session
+
+
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# Аналитика и списки; записи и чтение сразу после записи — через SessionDep
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
@@ -0,0 +1,20 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Модуль, который импортируется при первом обращении к его атрибуту:
+    редко используемые подсистемы не замедляют запуск процесса
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def loaded(self):
+        return self._module is not None
@@ -0,0 +1,103 @@
+"""
+Нагрузочная проверка: задержка аналитических запросов не должна расти,
+пока параллельно идут логины (хэширование паролей вынесено из event loop).
+
+    python loadtest_auth.py --url http://localhost:8000 \\
+        --email user@mail.ru --password secret --supplier-id 1
+
+Сначала измеряется задержка аналитики без нагрузки, затем под нагрузкой
+из --logins параллельных логинов. Скрипт завершается с кодом 1, если p95
+под нагрузкой превышает базовый больше чем в --max-ratio раз.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import aiohttp
+
+
+async def measure(session: aiohttp.ClientSession, url: str, requests: int):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        async with session.get(url) as response:
+            await response.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def login_forever(
+    session: aiohttp.ClientSession, url: str, email: str, password: str, stop
+):
+    count = 0
+    while not stop.is_set():
+        async with session.post(
+            url, json={"email": email, "password": password}
+        ) as response:
+            await response.read()
+        count += 1
+    return count
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50": round(statistics.median(latencies), 1),
+        "p95": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "max": round(latencies[-1], 1),
+    }
+
+
+async def main(args):
+    analytics_url = (
+        f"{args.url}/api/utils/metric_total_revenue/"
+        f"{args.supplier_id}/{args.start_date}/{args.end_date}"
+    )
+    login_url = f"{args.url}/api/login"
+
+    async with aiohttp.ClientSession() as session:
+        await measure(session, analytics_url, 5)
+        baseline = summary(await measure(session, analytics_url, args.requests))
+
+        stop = asyncio.Event()
+        logins = [
+            asyncio.create_task(
+                login_forever(session, login_url, args.email, args.password, stop)
+            )
+            for _ in range(args.logins)
+        ]
+        under_load = summary(await measure(session, analytics_url, args.requests))
+        stop.set()
+        login_count = sum(await asyncio.gather(*logins))
+
+        async with session.get(f"{args.url}/api/metrics/password_hashing") as response:
+            hashing = await response.json()
+
+    print(f"Без нагрузки, мс:      {baseline}")
+    print(f"Под нагрузкой, мс:     {under_load}")
+    print(f"Логинов выполнено:     {login_count}")
+    print(f"Пул хэширования:       {hashing}")
+
+    if under_load["p95"] > baseline["p95"] * args.max_ratio:
+        print("FAIL: логины замедляют аналитические запросы")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--supplier-id", type=int, default=1)
+    parser.add_argument("--start-date", default="2022-01-01")
+    parser.add_argument("--end-date", default="2025-01-01")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=8)
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
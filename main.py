@@ -1,46 +1,109 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
+from types import SimpleNamespace
 from sqlalchemy import MetaData, select, text
-import uvicorn
-import aiohttp
 
-from fastapi import FastAPI, HTTPException
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    Security,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 
-from database import SessionDep, engine
+from database import (
+    ReadSessionDep,
+    SessionDep,
+    engine,
+    prepare_stats,
+    replica_engine,
+    replica_stats,
+)
+from lazy import LazyModule
+from responses import CompressionMiddleware, ORJSONResponse, ORJSONRoute, render
 
 from models import SupplierModel, DashboardSubscriptionModel
 import schemas.users as UserSchema
 import schemas.dashboards as DashboardSchema
 import schemas.deepseek as DeepseekSchema
 import schemas.other as OtherSchema
+import schemas.api_keys as ApiKeySchema
+import schemas.batch as BatchSchema
 
-import views.users as user_views
 import views.dashboards as dashboard_views
 import views.widgets as widget_views
 import views.utils as util_views
-
-import views.auth as auth_views
-
-app = FastAPI()
-
-# CORS allowed origins
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+import views.comparison as comparison_views
+import views.timeseries as timeseries_views
+import views.columnar as columnar_views
+import views.revenue_index as revenue_index_views
+import views.ranges as range_views
+import views.hhi as hhi_views
+import views.market as market_views
+import views.competitors as competitor_views
+import views.crossfilter as crossfilter_views
+import views.batch as batch_views
+import views.http_cache as http_cache_views
+import views.prepared as prepared_views
+import views.warmup as warmup_views
+import views.data_version as data_version_views
+from views.comparison import ComparisonDep
+from views.periods import parse_date
+
+import views.api_keys as api_key_views
+
+# LLM-прокси и криптография авторизации нужны немногим запросам —
+# импортируются при первом обращении
+user_views = LazyModule("views.users")
+deepseek_views = LazyModule("views.deepseek")
+prompt_views = LazyModule("views.prompts")
+auth_views = LazyModule("views.auth")
+token_views = LazyModule("views.tokens")
+password_views = LazyModule("views.passwords")
+
+prepared_views.register()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Каждый воркер: открыть пул (и подготовить запросы), прогреть
+    # структуры аналитики и дашборды (если включено) и прогревать их
+    # заново после каждой смены версии данных
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    warmup_views.start(warm_now=warmup_views.WARMUP_ON_STARTUP)
+
+    yield
+
+    # SIGTERM: сервер уже дождался текущих запросов
+    await warmup_views.cancel()
+    if deepseek_views.loaded():
+        await deepseek_views.close_session()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+# Маршруты создаются один раз при импорте, create_app подключает их к
+# приложению без пересоздания; подмены зависимостей (тесты) — общие
+dependency_overrides = {}
+router = APIRouter(
+    route_class=ORJSONRoute,
+    default_response_class=ORJSONResponse,
+    dependency_overrides_provider=SimpleNamespace(
+        dependency_overrides=dependency_overrides
+    ),
 )
 
-if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
-
 
 # ####################################################################
 
 
-@app.post("/api/register", response_model=UserSchema.Read)
+@router.post("/api/register", response_model=UserSchema.Read)
 async def register(user: UserSchema.Create, db: SessionDep):
     db_user = await user_views.get_by_email(db, email=user.email)
     if db_user:
@@ -48,7 +111,7 @@ async def register(user: UserSchema.Create, db: SessionDep):
 
     new_user = await user_views.create(db, user)
     new_user.supplier_id = new_user.id
-    new_user.password = auth_views.get_password_hash(user.password)
+    new_user.password = await auth_views.get_password_hash(user.password)
     new_user.token = auth_views.create_access_token(data={"sub": new_user.id})
 
     db.add(new_user)
@@ -58,45 +121,74 @@ async def register(user: UserSchema.Create, db: SessionDep):
     return new_user
 
 
-@app.post("/api/login")
+@router.post("/api/login")
 async def login(form_data: UserSchema.Login, db: SessionDep):
     user = await user_views.get_by_email(db, email=form_data.email)
     if not user:
         raise HTTPException(
             status_code=400, detail="Неверное имя пользователя или пароль"
         )
-    if not auth_views.authenticate_user(form_data.password, user.password):
+    if not await auth_views.authenticate_user(form_data.password, user.password):
         raise HTTPException(
             status_code=400, detail="Неверное имя пользователя или пароль"
         )
-    # access_token = create_access_token(data={"sub": user.full_name})
-    return {"access_token": user.token, "token_type": "bearer"}
+    access_token = await token_views.ensure_fresh_token(db, user)
+    return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.post("/api/auth")
+@router.post("/api/auth")
 async def auth(form_data: UserSchema.Auth, db: SessionDep):
-    user = await user_views.get_by_token(db, token=form_data.token)
+    user = await token_views.resolve(db, form_data.token)
     if not user:
         raise HTTPException(status_code=400, detail="У вас нет доступа к этой странице")
 
-    return {
-        "id": user.id,
-        "supplier_id": user.supplier_id,
-        "full_name": user.full_name,
-        "email": user.email,
-    }
+    return user
 
 
 # ####################################################################
 
 
-@app.get("/api/users", response_model=list[UserSchema.Read], tags=["Users"])
+async def get_user_by_token_or_401(db, token: str):
+    user = await token_views.resolve(db, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="У вас нет доступа к этой странице")
+    return user
+
+
+@router.post("/api/api_keys", response_model=ApiKeySchema.Created, tags=["ApiKeys"])
+async def create_api_key(form_data: ApiKeySchema.Create, db: SessionDep):
+    user = await get_user_by_token_or_401(db, form_data.token)
+    api_key, key = await api_key_views.create(db, user["id"], form_data.name)
+    return {**ApiKeySchema.Read.model_validate(api_key).model_dump(), "key": key}
+
+
+@router.get("/api/api_keys", response_model=list[ApiKeySchema.Read], tags=["ApiKeys"])
+async def get_api_keys(token: str, db: SessionDep):
+    user = await get_user_by_token_or_401(db, token)
+    return await api_key_views.get_by_owner_id(db, user["id"])
+
+
+@router.delete(
+    "/api/api_keys/{key_id}", response_model=ApiKeySchema.Read, tags=["ApiKeys"]
+)
+async def revoke_api_key(key_id: int, token: str, db: SessionDep):
+    user = await get_user_by_token_or_401(db, token)
+    api_key = await api_key_views.revoke(db, key_id, user["id"])
+    if not api_key:
+        raise HTTPException(status_code=404, detail="Ключ не найден")
+    return api_key
+
+
+# ####################################################################
+
+
+@router.get("/api/users", response_model=list[UserSchema.Read], tags=["Users"])
 async def read_users(db: SessionDep, skip: int = 0, limit: int = 100):
     users = await user_views.get_all(db, skip=skip, limit=limit)
     return users
 
 
-@app.get("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
+@router.get("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
 async def read_user(user_id: int, db: SessionDep):
     user = await user_views.get_by_id(db, user_id)
     if not user:
@@ -104,7 +196,7 @@ async def read_user(user_id: int, db: SessionDep):
     return user
 
 
-@app.put("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
+@router.put("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
 async def update_user_endpoint(
     user_id: int, user_update: UserSchema.Update, db: SessionDep
 ):
@@ -114,7 +206,7 @@ async def update_user_endpoint(
     return user
 
 
-@app.delete("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
+@router.delete("/api/users/{user_id}", response_model=UserSchema.Read, tags=["Users"])
 async def delete_user_endpoint(user_id: int, db: SessionDep):
     result = await user_views.delete_by_id(db, user_id)
     if not result:
@@ -125,7 +217,7 @@ async def delete_user_endpoint(user_id: int, db: SessionDep):
 # ####################################################################
 
 
-@app.get("/api/suppliers/{inn}", tags=["Suppliers"])
+@router.get("/api/suppliers/{inn}", tags=["Suppliers"])
 async def get_supplier_by_inn(inn: str, db: SessionDep):
     res = await db.execute(select(SupplierModel).where(SupplierModel.inn == inn))
 
@@ -135,33 +227,33 @@ async def get_supplier_by_inn(inn: str, db: SessionDep):
 # ####################################################################
 
 
-@app.get("/api/dashboards", tags=["Dashboard"])
-async def get_dashboards(db: SessionDep):
+@router.get("/api/dashboards", tags=["Dashboard"])
+async def get_dashboards(db: ReadSessionDep):
     return await dashboard_views.get_all(db)
 
 
-@app.post("/api/dashboards", tags=["Dashboard"])
+@router.post("/api/dashboards", tags=["Dashboard"])
 async def create_dashboard(dashboard: DashboardSchema.Create, db: SessionDep):
     return await dashboard_views.create(db, dashboard)
 
 
-@app.patch("/api/dashboards/{dashboard_id}", tags=["Dashboard"])
+@router.patch("/api/dashboards/{dashboard_id}", tags=["Dashboard"])
 async def update_dashboards_by_id(dashboard_id: int, dashboard, db: SessionDep):
     return await dashboard_views.update_by_id(db, dashboard_id, dashboard)
 
 
-@app.get("/api/dashboards/owner/{owner_id}", tags=["Dashboard"])
-async def get_dashboards_by_owner_id(owner_id: int, db: SessionDep):
+@router.get("/api/dashboards/owner/{owner_id}", tags=["Dashboard"])
+async def get_dashboards_by_owner_id(owner_id: int, db: ReadSessionDep):
     return await dashboard_views.get_by_owner_id(db, owner_id)
 
 
-@app.get("/api/dashboards_subsribers", tags=["Subscribers"])
+@router.get("/api/dashboards_subsribers", tags=["Subscribers"])
 async def get_subscribers(db: SessionDep):
     res = await db.execute(select(DashboardSubscriptionModel))
     return res.scalars().all()
 
 
-@app.patch("/api/dashboards_subsribers", tags=["Subscribers"])
+@router.patch("/api/dashboards_subsribers", tags=["Subscribers"])
 async def update_subscribers(db: SessionDep):
     schedule = DashboardSubscriptionModel(
         dashboard_id=1,
@@ -180,78 +272,225 @@ async def update_subscribers(db: SessionDep):
 # ####################################################################
 
 
-@app.get("/api/widgets", tags=["Widgets"])
-async def get_widgets(db: SessionDep):
+@router.get("/api/widgets", tags=["Widgets"])
+async def get_widgets(db: ReadSessionDep):
     return await widget_views.get_all(db)
 
 
-@app.get("/api/widgets/dashboard/{dashboard_id}", tags=["Widgets"])
-async def get_widgets_by_dashboard_id(dashboard_id: int, db: SessionDep):
+@router.get("/api/widgets/dashboard/{dashboard_id}", tags=["Widgets"])
+async def get_widgets_by_dashboard_id(dashboard_id: int, db: ReadSessionDep):
     return await widget_views.get_by_dashboard_id(db, dashboard_id)
 
 
+# Скрипты обращаются к аналитике с заголовком X-API-Key
+utils_dependencies = [Depends(api_key_views.optional_api_key)]
+
+
+@router.get(
+    "/api/widgets/dashboard/{dashboard_id}/data/{start_date}/{end_date}",
+    tags=["Widgets"],
+    dependencies=utils_dependencies,
+)
+async def get_widgets_with_data_by_dashboard_id(
+    dashboard_id: int,
+    start_date: str,
+    end_date: str,
+    request: Request,
+    db: ReadSessionDep,
+    api_key: dict | None = Depends(api_key_views.optional_api_key),
+    token: str | None = None,
+):
+    # Данные дашборда видят его владелец и подписчики: пользователь по
+    # токену или владелец API-ключа; ключ администратора — любой дашборд
+    if api_key is None and token is None:
+        raise HTTPException(status_code=401, detail="У вас нет доступа к этой странице")
+    if api_key is None or api_key["scope"] != api_key_views.ADMIN_SCOPE:
+        user_id = (
+            api_key["owner_id"]
+            if api_key
+            else (await get_user_by_token_or_401(db, token))["id"]
+        )
+        allowed = await dashboard_views.can_read(db, dashboard_id, user_id)
+        if allowed is None:
+            raise HTTPException(status_code=404, detail="Дашборд не найден")
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Нет доступа к дашборду")
+
+    # ETag учитывает настройки виджетов: после их изменения 304 не отдается
+    fingerprint = await widget_views.fingerprint(db, dashboard_id)
+    if fingerprint is None:
+        raise HTTPException(status_code=404, detail="Дашборд не найден")
+    tag, headers = http_cache_views.validators(
+        request, await data_version_views.current(db), *fingerprint
+    )
+    response = http_cache_views.not_modified(request, tag, headers)
+    if response is not None:
+        return response
+
+    widgets = await widget_views.get_with_data_by_dashboard_id(
+        db, dashboard_id, start_date, end_date
+    )
+    if widgets is None:
+        raise HTTPException(status_code=404, detail="Дашборд не найден")
+    response = render(widgets)
+    if http_cache_views.HTTP_CACHE:
+        response.headers.update(headers)
+    return response
+
+
 # ####################################################################
 
 
-@app.get(
+@router.get(
     "/api/utils/herfindahl_hirschman_index/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Metrics"],
+    dependencies=utils_dependencies,
 )
 async def get_herfindahl_hirschman_rate(
-    supplier_id: int, start_date: str, end_date: str, db: SessionDep
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "herfindahl_hirschman_rate",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.herfindahl_hirschman_rate(
         supplier_id, start_date, end_date, db
     )
 
 
-@app.get(
+@router.get(
+    "/api/utils/herfindahl_hirschman_index_trend/{supplier_id}/{start_date}/{end_date}",
+    tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
+)
+async def get_herfindahl_hirschman_rate_trend(
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    db: ReadSessionDep,
+    bucket: hhi_views.Bucket = "month",
+):
+    return await hhi_views.trend(db, supplier_id, start_date, end_date, bucket)
+
+
+@router.get(
     "/api/utils/metric_percentage_wins/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Metrics"],
+    dependencies=utils_dependencies,
 )
 async def get_metric_percentage_wins(
-    supplier_id: int, start_date: str, end_date: str, db: SessionDep
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "metric_percentage_wins",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.metric_percentage_wins(
         supplier_id, start_date, end_date, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/metric_avg_downgrade_cost/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Metrics"],
+    dependencies=utils_dependencies,
 )
 async def get_metric_avg_downgrade_cost(
-    supplier_id: int, start_date: str, end_date: str, db: SessionDep
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "metric_avg_downgrade_cost",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.metric_avg_downgrade_cost(
         supplier_id, start_date, end_date, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/metric_total_revenue/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Metrics"],
+    dependencies=utils_dependencies,
 )
 async def get_metric_total_revenue(
-    supplier_id: int, start_date: str, end_date: str, db: SessionDep
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "metric_total_revenue",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.metric_total_revenue(supplier_id, start_date, end_date, db)
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_regions/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_regions(
-    supplier_id: int, start_date: str, end_date: str, db: SessionDep
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_regions",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.revenue_by_regions(supplier_id, start_date, end_date, db)
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_kpgz_category_by_region_id/{supplier_id}/{start_date}/{end_date}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_kpgz_category_by_region_id(
     supplier_id: int,
@@ -259,16 +498,30 @@ async def get_revenue_by_kpgz_category_by_region_id(
     end_date: str,
     region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_kpgz_category_by_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_kpgz_category_by_region_id(
         supplier_id, start_date, end_date, region_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_kpgz_category_by_kpgz_category_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_kpgz_category_by_kpgz_category_id(
     supplier_id: int,
@@ -276,16 +529,30 @@ async def get_revenue_by_kpgz_category_by_kpgz_category_id(
     end_date: str,
     kpgz_category_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_kpgz_category_by_kpgz_category_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_kpgz_category_by_kpgz_category_id(
         supplier_id, start_date, end_date, kpgz_category_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_kpgz_category_by_kpgz_category_id_and_region_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_kpgz_category_by_kpgz_category_id_and_region_id(
     supplier_id: int,
@@ -294,63 +561,116 @@ async def get_revenue_by_kpgz_category_by_kpgz_category_id_and_region_id(
     kpgz_category_id: int,
     region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_kpgz_category_by_kpgz_category_id_and_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_kpgz_category_by_kpgz_category_id_and_region_id(
         supplier_id, start_date, end_date, kpgz_category_id, region_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/total_revenue_by_kpgz_category/{start_date}/{end_date}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_total_revenue_by_kpgz_category(
     start_date: str,
     end_date: str,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "total_revenue_by_kpgz_category",
+            compare,
+            db,
+            start_date,
+            end_date,
+            limit=limit,
+        )
+
     return await util_views.total_revenue_by_kpgz_category(
         start_date, end_date, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/total_revenue_by_kpgz_category_by_region_id/{start_date}/{end_date}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_total_revenue_by_kpgz_category_by_region_id(
     start_date: str,
     end_date: str,
     region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "total_revenue_by_kpgz_category_by_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.total_revenue_by_kpgz_category_by_region_id(
         start_date, end_date, region_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/total_revenue_by_regions_by_kpgz_category_id/{start_date}/{end_date}/{kpgz_category_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_total_revenue_by_regions_by_kpgz_category_id(
     start_date: str,
     end_date: str,
     kpgz_category_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "total_revenue_by_regions_by_kpgz_category_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            kpgz_category_id=kpgz_category_id,
+            limit=limit,
+        )
+
     return await util_views.total_revenue_by_regions_by_kpgz_category_id(
         start_date, end_date, kpgz_category_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/total_revenue_by_regions_by_kpgz_category_and_region_id/{start_date}/{end_date}/{kpgz_category_id}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_total_revenue_by_regions_by_kpgz_category_and_region_id(
     start_date: str,
@@ -358,110 +678,200 @@ async def get_total_revenue_by_regions_by_kpgz_category_and_region_id(
     kpgz_category_id: int,
     region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "total_revenue_by_regions_by_kpgz_category_and_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.total_revenue_by_regions_by_kpgz_category_and_region_id(
         start_date, end_date, kpgz_category_id, region_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_mounth/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_mounth(
     supplier_id: int,
     start_date: str,
     end_date: str,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_mounth",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.revenue_trend_by_mounth(
         supplier_id, start_date, end_date, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_weeks/{supplier_id}/{start_date}/{end_date}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_weeks(
     supplier_id: int,
     start_date: str,
     end_date: str,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_weeks",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+        )
+
     return await util_views.revenue_trend_by_weeks(
         supplier_id, start_date, end_date, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_mounth_by_region_id/{supplier_id}/{start_date}/{end_date}/{region_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_mounth_by_region_id(
     supplier_id: int,
     start_date: str,
     end_date: str,
     region_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_mounth_by_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            region_id=region_id,
+        )
+
     return await util_views.revenue_trend_by_mounth_by_region_id(
         supplier_id, start_date, end_date, region_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_weeks_by_region_id/{supplier_id}/{start_date}/{end_date}/{region_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_weeks_by_region_id(
     supplier_id: int,
     start_date: str,
     end_date: str,
     region_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_weeks_by_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            region_id=region_id,
+        )
+
     return await util_views.revenue_trend_by_weeks_by_region_id(
         supplier_id, start_date, end_date, region_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_mounth_by_kpgz_category_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_mounth_by_kpgz_category_id(
     supplier_id: int,
     start_date: str,
     end_date: str,
     kpgz_category_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_mounth_by_kpgz_category_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+        )
+
     return await util_views.revenue_trend_by_mounth_by_kpgz_category_id(
         supplier_id, start_date, end_date, kpgz_category_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_weeks_by_kpgz_category_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_weeks_by_kpgz_category_id(
     supplier_id: int,
     start_date: str,
     end_date: str,
     kpgz_category_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_weeks_by_kpgz_category_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+        )
+
     return await util_views.revenue_trend_by_weeks_by_kpgz_category_id(
         supplier_id, start_date, end_date, kpgz_category_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_mounth_by_kpgz_category_id_and_region_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{region_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_mounth_by_kpgz_category_id_and_region_id(
     supplier_id: int,
@@ -469,16 +879,30 @@ async def get_revenue_trend_by_mounth_by_kpgz_category_id_and_region_id(
     end_date: str,
     kpgz_category_id: int,
     region_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_mounth_by_kpgz_category_id_and_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+        )
+
     return await util_views.revenue_trend_by_mounth_by_kpgz_category_id_and_region_id(
         supplier_id, start_date, end_date, kpgz_category_id, region_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_trend_by_weeks_by_kpgz_category_id_and_region_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{region_id}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_trend_by_weeks_by_kpgz_category_id_and_region_id(
     supplier_id: int,
@@ -486,32 +910,59 @@ async def get_revenue_trend_by_weeks_by_kpgz_category_id_and_region_id(
     end_date: str,
     kpgz_category_id: int,
     region_id: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_trend_by_weeks_by_kpgz_category_id_and_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+        )
+
     return await util_views.revenue_trend_by_weeks_by_kpgz_category_id_and_region_id(
         supplier_id, start_date, end_date, kpgz_category_id, region_id, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_customers/{supplier_id}/{start_date}/{end_date}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_customers(
     supplier_id: int,
     start_date: str,
     end_date: str,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_customers",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_customers(
         supplier_id, start_date, end_date, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_customers_by_region_id/{supplier_id}/{start_date}/{end_date}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_customers_by_region_id(
     supplier_id: int,
@@ -519,16 +970,30 @@ async def get_revenue_by_customers_by_region_id(
     end_date: str,
     region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_customers_by_region_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_customers_by_region_id(
         supplier_id, start_date, end_date, region_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_customers_by_kpgz_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_customers_by_kpgz_id(
     supplier_id: int,
@@ -536,62 +1001,236 @@ async def get_revenue_by_customers_by_kpgz_id(
     end_date: str,
     kpgz_category_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_customers_by_kpgz_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_customers_by_kpgz_id(
         supplier_id, start_date, end_date, kpgz_category_id, limit, db
     )
 
 
-@app.get(
+@router.get(
     "/api/utils/revenue_by_customers_by_region_id_and_kpgz_category_id/{supplier_id}/{start_date}/{end_date}/{kpgz_category_id}/{region_id}/{limit}",
     tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
 )
 async def get_revenue_by_customers_by_region_id_and_kpgz_category_id(
     supplier_id: int,
     start_date: str,
     end_date: str,
     kpgz_category_id: int,
-    region_id,
+    region_id: int,
     limit: int,
-    db: SessionDep,
+    compare: ComparisonDep,
+    db: ReadSessionDep,
 ):
+    if compare:
+        return await comparison_views.compare(
+            "revenue_by_customers_by_region_id_and_kpgz_category_id",
+            compare,
+            db,
+            start_date,
+            end_date,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+            limit=limit,
+        )
+
     return await util_views.revenue_by_customers_by_region_id_and_kpgz_category_id(
         supplier_id, start_date, end_date, kpgz_category_id, region_id, limit, db
     )
 
 
+@router.get(
+    "/api/utils/timeseries/{start_date}/{end_date}",
+    tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
+)
+async def get_timeseries(
+    start_date: str,
+    end_date: str,
+    db: ReadSessionDep,
+    bucket: timeseries_views.Bucket = "month",
+    supplier_id: list[int] | None = Query(None),
+    split_by: timeseries_views.SplitBy | None = None,
+    region_id: int | None = None,
+    kpgz_category_id: int | None = None,
+    measure: timeseries_views.Measure = "revenue",
+    date_field: timeseries_views.DateField = "end_ks",
+    series_limit: int | None = 10,
+):
+    return await timeseries_views.timeseries(
+        db,
+        start_date,
+        end_date,
+        bucket=bucket,
+        supplier_ids=supplier_id,
+        split_by=split_by,
+        region_id=region_id,
+        kpgz_category_id=kpgz_category_id,
+        measure=measure,
+        date_field=date_field,
+        series_limit=series_limit,
+    )
+
+
+@router.post(
+    "/api/utils/batch",
+    response_model=list[BatchSchema.Result],
+    tags=["Utils"],
+    dependencies=utils_dependencies,
+)
+async def run_batch(batch: BatchSchema.Create):
+    return await batch_views.execute(batch.calls)
+
+
+@router.get(
+    "/api/utils/crossfilter/{supplier_id}/{start_date}/{end_date}",
+    tags=["Utils/Charts"],
+    dependencies=utils_dependencies,
+)
+async def get_crossfilter(
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    db: ReadSessionDep,
+    region_id: int | None = None,
+    kpgz_category_id: int | None = None,
+    limit: int = 10,
+):
+    return await crossfilter_views.crossfilter(
+        db, supplier_id, start_date, end_date, region_id, kpgz_category_id, limit
+    )
+
+
+@router.get(
+    "/api/utils/competitors/{start_date}/{end_date}",
+    tags=["Utils/Metrics"],
+    dependencies=utils_dependencies,
+)
+async def get_competitors(
+    start_date: str,
+    end_date: str,
+    db: ReadSessionDep,
+    supplier_id: list[int] = Query(...),
+    measure: list[competitor_views.Measure] | None = Query(None),
+    trend: timeseries_views.Bucket | None = None,
+):
+    return await competitor_views.compare(
+        db, supplier_id, start_date, end_date, measures=measure, trend=trend
+    )
+
+
 # ####################################################################
 
 
-@app.post("/api/deepseek", response_model=DeepseekSchema.Message, tags=["DeepSeek"])
-async def deepseek(secret_key: str, deep: DeepseekSchema.Promt):
-    if not auth_views.pwd_context.verify(
+async def check_deepseek_access(
+    db: SessionDep,
+    secret_key: str | None = None,
+    api_key: str | None = Security(api_key_views.api_key_header),
+):
+    # Машинные клиенты передают X-API-Key, secret_key оставлен для совместимости
+    if api_key:
+        await api_key_views.require_api_key(db, api_key)
+        return
+
+    if not secret_key or not await api_key_views.verify_legacy_secret(
         secret_key,
         "$5$rounds=535000$U/n.eV30oSlzqJ7.$rRhZQqSHGhH9HQHOPGQco1peH7iQUM4Yh6t4ibN/uZ8",
     ):
         raise HTTPException(status_code=401, detail="Incorrect secret key")
 
-    url = "http://localhost:11434/api/generate/"
 
-    json_body = {
-        "model": "deepseek-r1:32b",
-        "prompt": deep.prompt,
-        "stream": False,
-    }
+@router.post(
+    "/api/deepseek",
+    response_model=DeepseekSchema.Message,
+    tags=["DeepSeek"],
+    dependencies=[Depends(check_deepseek_access)],
+)
+async def deepseek(deep: DeepseekSchema.Promt):
+    message = await deepseek_views.generate(
+        deep.prompt,
+        model=deep.model,
+        options=deep.options,
+        bypass_cache=deep.bypass_cache,
+    )
+    return {"message": message}
+
+
+@router.post(
+    "/api/deepseek/dashboard/{dashboard_id}/{start_date}/{end_date}",
+    response_model=DeepseekSchema.Message,
+    tags=["DeepSeek"],
+    dependencies=[Depends(check_deepseek_access)],
+)
+async def deepseek_dashboard(
+    dashboard_id: int,
+    start_date: str,
+    end_date: str,
+    db: SessionDep,
+    top_n: int = 5,
+    token_budget: int = 600,
+    bypass_cache: bool = False,
+):
+    prompt = await prompt_views.build_dashboard_prompt(
+        db, dashboard_id, start_date, end_date, top_n, token_budget
+    )
+    if prompt is None:
+        raise HTTPException(status_code=404, detail="Дашборд не найден")
+
+    message = await deepseek_views.generate(prompt, bypass_cache=bypass_cache)
+    return {"message": message}
+
+
+@router.get("/api/metrics/password_hashing", tags=["Metrics"])
+async def get_password_hashing_metrics():
+    return password_views.metrics.as_dict()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=json_body) as response:
-            if response.status == 200:
-                data = await response.json()
-                return {"message": data["response"]}
-            else:
-                raise HTTPException(
-                    status_code=response.status, detail=await response.text()
-                )
 
+@router.get("/api/metrics/range_cache", tags=["Metrics"])
+async def get_range_cache_metrics():
+    return range_views.stats()
 
-@app.get("/api/download/{file_name}", tags=["Download"])
+
+@router.get("/api/metrics/market_cache", tags=["Metrics"])
+async def get_market_cache_metrics():
+    return market_views.stats()
+
+
+@router.get("/api/metrics/widget_cache", tags=["Metrics"])
+async def get_widget_cache_metrics():
+    return widget_views.stats()
+
+
+@router.get("/api/metrics/prepared_statements", tags=["Metrics"])
+async def get_prepared_statements_metrics():
+    return prepare_stats
+
+
+@router.get("/api/metrics/replica", tags=["Metrics"])
+async def get_replica_metrics():
+    return replica_stats
+
+
+@router.get("/api/metrics/warmup", tags=["Metrics"])
+async def get_warmup_metrics():
+    return warmup_views.stats
+
+
+@router.get("/api/download/{file_name}", tags=["Download"])
 async def download_file(file_name: str):
     return FileResponse(f"reports/{file_name}")
 
@@ -599,6 +1238,58 @@ async def download_file(file_name: str):
 # ###################################################################
 
 
+@router.get("/api/data_version", tags=["Database"])
+async def get_data_version(db: SessionDep):
+    return {"version": await data_version_views.current(db)}
+
+
+@router.post(
+    "/api/data_version",
+    tags=["Database"],
+    dependencies=[Depends(api_key_views.require_admin_key)],
+)
+async def bump_data_version(db: SessionDep, since: str | None = None):
+    # Вызывается загрузчиком после обновления ks/orders/...;
+    # since — самая ранняя дата end_ks среди загруженных КС
+    await hhi_views.refresh(db, parse_date(since) if since else None)
+    version = await data_version_views.bump(db)
+    # Этот воркер — сразу, остальные — когда заметят новую версию
+    warmup_views.schedule()
+    return {"version": version}
+
+
+@router.post(
+    "/api/warmup",
+    tags=["Database"],
+    dependencies=[Depends(api_key_views.require_admin_key)],
+)
+async def start_warmup():
+    # Прогрев идет в фоне; результат — в /api/metrics/warmup
+    return {"started": warmup_views.schedule()}
+
+
+@router.get(
+    "/api/utils/columnar/verify/{supplier_id}/{start_date}/{end_date}",
+    tags=["Database"],
+    dependencies=[Depends(api_key_views.require_admin_key)],
+)
+async def verify_columnar_engine(
+    supplier_id: int, start_date: str, end_date: str, db: ReadSessionDep
+):
+    return await columnar_views.verify(db, supplier_id, start_date, end_date)
+
+
+@router.get(
+    "/api/utils/revenue_index/verify/{supplier_id}/{start_date}/{end_date}",
+    tags=["Database"],
+    dependencies=[Depends(api_key_views.require_admin_key)],
+)
+async def verify_revenue_index(
+    supplier_id: int, start_date: str, end_date: str, db: ReadSessionDep
+):
+    return await revenue_index_views.verify(db, supplier_id, start_date, end_date)
+
+
 def get_table_names(sync_conn):
     metadata = MetaData()
     # Делаем рефлексию, чтобы получить список таблиц
@@ -606,7 +1297,7 @@ def get_table_names(sync_conn):
     return metadata.tables
 
 
-@app.get("/api/properties", tags=["Database"])
+@router.get("/api/properties", tags=["Database"])
 async def get_properties():
     async with engine.connect() as conn:
         tables = await conn.run_sync(get_table_names)
@@ -615,14 +1306,14 @@ async def get_properties():
         ]
 
 
-@app.get("/api/tables", tags=["Database"], response_model=list[str])
+@router.get("/api/tables", tags=["Database"], response_model=list[str])
 async def get_tables():
     async with engine.connect() as conn:
         tables = await conn.run_sync(get_table_names)
     return tables.keys()
 
 
-@app.get(
+@router.get(
     "/api/tables/{table_name}/columns", tags=["Database"], response_model=list[str]
 )
 async def get_table_columns(table_name: str):
@@ -638,7 +1329,7 @@ async def get_table_columns(table_name: str):
     return columns
 
 
-@app.get("/api/tables/{table_name}/columns/{column_name}/{func}", tags=["Database"])
+@router.get("/api/tables/{table_name}/columns/{column_name}/{func}", tags=["Database"])
 async def get_table_column_data(
     table_name: str, column_names: str, func: str | None = None
 ):
@@ -673,3 +1364,35 @@ async def get_table_column_data(
     ]
 
     return items
+
+
+# ####################################################################
+
+
+def create_app():
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.router.routes.extend(router.routes)
+    app.dependency_overrides = dependency_overrides
+
+    # До CORS, чтобы ответы 304 тоже получали CORS-заголовки
+    app.add_middleware(http_cache_views.ConditionalGetMiddleware)
+
+    # CORS allowed origins
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+app = create_app()
+
+# Для разработки; в продакшене — python serve.py
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
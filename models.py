@@ -34,6 +34,8 @@ class UserModel(Base):
     dashboard_subscriptions = relationship(
         "DashboardSubscriptionModel", back_populates="users", uselist=True
     )
+    # one-to-many relationship with ApiKeys
+    api_keys = relationship("ApiKeyModel", back_populates="owner", uselist=True)
 
 
 class DashboardModel(Base):
@@ -161,6 +163,46 @@ class WidgetModel(Base):
     dashboard = relationship("DashboardModel", back_populates="widgets", uselist=False)
 
 
+class ApiKeyModel(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    name = Column(String(255))
+    # Первые символы ключа, чтобы владелец мог отличить ключи друг от друга
+    prefix = Column(String(16), nullable=False)
+    # HMAC-SHA256 от ключа, сам ключ не хранится
+    key_hash = Column(String(64), unique=True, index=True, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # user или admin (маршруты обслуживания), см. views/api_keys
+    scope = Column(String(16), nullable=False, default="user", server_default="user")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    revoked_at = Column(DateTime, nullable=True)
+
+    owner = relationship("UserModel", back_populates="api_keys", uselist=False)
+
+
+class DataVersionModel(Base):
+    __tablename__ = "data_versions"
+
+    # Строка 1 — версия данных, увеличивается после каждой загрузки;
+    # строка 2 — версия, для которой пересчитана supplier_customer_months
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SupplierCustomerMonthModel(Base):
+    __tablename__ = "supplier_customer_months"
+
+    # Выручка поставщика по заказчику за месяц (по end_ks), пересчитывается
+    # при загрузке данных; из нее собирается ИХХ за любые месяцы
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    revenue = Column(Numeric(20, 2), nullable=False)
+    auctions = Column(Integer, nullable=False)
+
+
 class ReportStatusModel(Base):
     __tablename__ = "report_statuses"
 
@@ -0,0 +1,215 @@
+import contextvars
+import gzip
+import inspect
+import os
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+
+import brotli
+import msgpack
+import orjson
+from dotenv import load_dotenv
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import decimal_encoder, jsonable_encoder
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+load_dotenv()
+
+# Ответы меньше порога не сжимаются: выигрыш не окупает время сжатия
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Формат графиков: ?format=columns — столбцы вместо строк,
+# Accept: application/msgpack — MessagePack (всегда по столбцам)
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+# (media type, по столбцам) текущего запроса; выставляет ORJSONRoute
+_representation = contextvars.ContextVar("representation", default=None)
+
+
+def _default(value):
+    # Decimal — как в jsonable_encoder (целые остаются целыми), остальное
+    # (модели SQLAlchemy, pydantic) — через jsonable_encoder
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    return jsonable_encoder(value)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON через orjson: datetime, numpy и Decimal сериализуются без
+    предварительного обхода jsonable_encoder
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return jsonable_encoder(value)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default)
+
+
+def representation(request: Request):
+    """
+    Media type и раскладка ответа по заголовку Accept и ?format=
+    """
+    accept = request.headers.get("accept", "")
+    if any(media_type in accept for media_type in MSGPACK_TYPES):
+        return MSGPACK, True
+    return "application/json", request.query_params.get("format") == "columns"
+
+
+def columns(content):
+    """
+    Строки графика [{подпись: ..., значение: ...}, ...] по столбцам:
+    {"columns": [...], "labels": [...], "values": [...], прочие столбцы}.
+    Остальные ответы не меняются
+    """
+    if not isinstance(content, list) or not all(
+        isinstance(row, dict) for row in content
+    ):
+        return content
+
+    names = list(content[0]) if content else []
+    result = {
+        "columns": names,
+        "labels": [row.get(names[0]) for row in content] if names else [],
+        "values": [row.get(names[1]) for row in content] if len(names) > 1 else [],
+    }
+    for name in names[2:]:
+        result[name] = [row.get(name) for row in content]
+    return result
+
+
+def render(content):
+    media_type, by_columns = _representation.get() or ("application/json", False)
+    if by_columns:
+        content = columns(content)
+    if media_type == MSGPACK:
+        return MsgPackResponse(content)
+    return ORJSONResponse(content)
+
+
+class ORJSONRoute(APIRoute):
+    """
+    Для маршрутов без response_model результат обработчика сразу отдается
+    в ORJSONResponse (или MsgPackResponse): FastAPI иначе сначала прогоняет
+    его через jsonable_encoder, что дорого для длинных рядов
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if (
+            inspect.iscoroutinefunction(endpoint)
+            # include_router пересоздает маршруты с уже обернутым обработчиком
+            and not getattr(endpoint, "direct", False)
+            and (
+                response_model is None or isinstance(response_model, DefaultPlaceholder)
+            )
+            and inspect.signature(endpoint).return_annotation is inspect.Signature.empty
+        ):
+            endpoint = _direct(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            token = _representation.set(representation(request))
+            try:
+                return await handler(request)
+            finally:
+                _representation.reset(token)
+
+        return route_handler
+
+
+def _direct(endpoint):
+    @wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, Response):
+            return content
+        return render(content)
+
+    wrapper.direct = True
+    return wrapper
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов br/gzip по Accept-Encoding, если тело не меньше
+    COMPRESS_MIN_SIZE. Потоковые ответы (файлы) передаются как есть
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        encoding = "br" if "br" in accepted else "gzip" if "gzip" in accepted else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def compressing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+            ):
+                await send(start)
+            else:
+                body = (
+                    brotli.compress(body, quality=BROTLI_QUALITY)
+                    if encoding == "br"
+                    else gzip.compress(body, compresslevel=GZIP_LEVEL)
+                )
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                await send(start)
+                message = {**message, "body": body}
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, compressing_send)
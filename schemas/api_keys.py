@@ -0,0 +1,24 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class Create(BaseModel):
+    token: str
+    name: str
+
+
+class Read(BaseModel):
+    id: int
+    name: str | None
+    prefix: str
+    scope: str
+    created_at: datetime | None
+    revoked_at: datetime | None
+
+    class Config:
+        from_attributes = True
+
+
+class Created(Read):
+    # Показывается один раз при создании
+    key: str
@@ -0,0 +1,21 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class Call(BaseModel):
+    # Ключ для сопоставления с ответом; по умолчанию — позиция в списке
+    id: str | None = None
+    function: str
+    params: dict[str, Any] = {}
+
+
+class Create(BaseModel):
+    calls: list[Call]
+
+
+class Result(BaseModel):
+    id: str
+    function: str
+    result: Any = None
+    error: str | None = None
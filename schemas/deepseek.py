@@ -3,6 +3,9 @@ from pydantic import BaseModel
 
 class Promt(BaseModel):
     prompt: str
+    model: str | None = None
+    options: dict | None = None
+    bypass_cache: bool = False
 
 
 class Message(BaseModel):
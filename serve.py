@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+load_dotenv()
+
+# Продакшен: gunicorn с воркерами uvicorn по числу ядер, приложение
+# импортируется один раз в мастере (preload) и наследуется воркерами.
+# SIGTERM: новые соединения не принимаются, текущие запросы дорабатывают
+# не дольше GRACEFUL_TIMEOUT секунд, затем выполняется shutdown lifespan
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", 120))
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+
+        return app
+
+
+if __name__ == "__main__":
+    Server(
+        {
+            "bind": f"{HOST}:{PORT}",
+            "workers": WEB_CONCURRENCY,
+            "worker_class": "uvicorn_worker.UvicornWorker",
+            "preload_app": True,
+            "graceful_timeout": GRACEFUL_TIMEOUT,
+            "timeout": WORKER_TIMEOUT,
+            "keepalive": 5,
+        }
+    ).run()
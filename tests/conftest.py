@@ -0,0 +1,224 @@
+"""
+Тесты с базой создают отдельную базу TEST_DATABASE_TABLE (по умолчанию
+tender_hack_test) на сервере из DATABASE_* и удаляют ее в конце. Если
+PostgreSQL недоступен, такие тесты пропускаются.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+# До первого импорта database: движок приложения смотрит в тестовую базу
+os.environ["DATABASE_TABLE"] = os.getenv("TEST_DATABASE_TABLE", "tender_hack_test")
+
+SUPPLIERS = [1, 2, 3]
+REGIONS = [1, 2, 3]
+CATEGORIES = [1, 2, 3, 4]
+# Заказчик, которого нет в customers: в выгрузке ks нет внешних ключей
+ORPHAN_CUSTOMER = 999
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+async def _admin_connection():
+    import asyncpg
+
+    return await asyncpg.connect(
+        host=os.getenv("DATABASE_HOST"),
+        port=os.getenv("DATABASE_PORT"),
+        user=os.getenv("DATABASE_USER"),
+        password=os.getenv("DATABASE_PASSWORD"),
+        database="postgres",
+        timeout=5,
+    )
+
+
+def _seed():
+    """
+    Небольшой набор КС и позиций за 2022-2024: несколько поставщиков,
+    регионов и категорий, позиции без КПГЗ, КС без start_price и КС
+    неизвестного заказчика
+    """
+    rnd = random.Random(7)
+    rows = {
+        "regions": [(id, f"Регион {id}") for id in REGIONS],
+        "suppliers": [(id, f"Поставщик {id}", str(id), 1) for id in SUPPLIERS],
+        "customers": [
+            (id, f"Заказчик {id}", str(id), REGIONS[id % len(REGIONS)])
+            for id in range(1, 9)
+        ],
+        "kpgz_categories": [
+            (id, f"Категория {id}", f"01.{id:02d}") for id in CATEGORIES
+        ],
+        "kpgz_details": [
+            (id, f"01.{id:02d}.01", f"Позиция {id}", CATEGORIES[id % len(CATEGORIES)])
+            for id in range(1, 13)
+        ],
+        # cte 0 ссылается на несуществующую позицию КПГЗ
+        "cte": [(id, f"СТЕ {id}", None, id % 13 or 99) for id in range(0, 26)],
+        "ks": [],
+        "orders": [],
+    }
+
+    start = datetime(2022, 1, 1)
+    for id_ks in range(1, 401):
+        start_ks = start + timedelta(minutes=rnd.randrange(3 * 365 * 24 * 60))
+        end_ks = start_ks + timedelta(hours=rnd.randrange(1, 200))
+        start_price = Decimal(rnd.randrange(10000, 10000000)) / 100
+        end_price = (start_price * Decimal(rnd.uniform(0.7, 1))).quantize(
+            Decimal("0.01")
+        )
+        customer_id = ORPHAN_CUSTOMER if id_ks % 37 == 0 else rnd.randrange(1, 9)
+        rows["ks"].append(
+            (
+                id_ks,
+                f"ks/{id_ks}",
+                start_ks,
+                end_ks,
+                None if id_ks % 23 == 0 else start_price,
+                end_price,
+                customer_id,
+                rnd.choice(SUPPLIERS),
+            )
+        )
+        for _ in range(rnd.randrange(1, 4)):
+            rows["orders"].append(
+                (
+                    len(rows["orders"]) + 1,
+                    rnd.randrange(0, 26),
+                    id_ks,
+                    Decimal(rnd.randrange(1, 2000)) / 100,
+                    Decimal(1),
+                    start_ks,
+                    end_ks,
+                    Decimal(rnd.randrange(100, 1000000)) / 100,
+                )
+            )
+    return rows
+
+
+COLUMNS = {
+    "regions": ["id", "name"],
+    "suppliers": ["id", "name", "inn", "region_id"],
+    "customers": ["id", "name", "inn", "region_id"],
+    "kpgz_categories": ["id", "name", "code"],
+    "kpgz_details": ["id", "code", "name", "parent_id"],
+    "cte": ["id", "cte_name", "link", "kpgz_id"],
+    "ks": [
+        "id_ks",
+        "link",
+        "start_ks",
+        "end_ks",
+        "start_price",
+        "end_price",
+        "customer_id",
+        "winner_id",
+    ],
+    "orders": [
+        "id",
+        "id_cte",
+        "id_ks",
+        "count",
+        "price",
+        "oferta_start",
+        "oferta_end",
+        "oferta_price",
+    ],
+}
+
+
+async def _create(name: str):
+    admin = await _admin_connection()
+    try:
+        await admin.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        await admin.execute(
+            f"CREATE DATABASE \"{name}\" ENCODING 'UTF8' TEMPLATE template0"
+        )
+    finally:
+        await admin.close()
+
+    from database import engine
+    from models import Base
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        # Как в загруженной выгрузке: без внешних ключей и NOT NULL
+        await connection.exec_driver_sql(
+            "ALTER TABLE ks DROP CONSTRAINT ks_customer_id_fkey"
+        )
+        await connection.exec_driver_sql(
+            "ALTER TABLE cte DROP CONSTRAINT cte_kpgz_id_fkey"
+        )
+        await connection.exec_driver_sql(
+            "ALTER TABLE ks ALTER COLUMN start_price DROP NOT NULL"
+        )
+        raw = (await connection.get_raw_connection()).driver_connection
+        for table, records in _seed().items():
+            await raw.copy_records_to_table(
+                table, records=records, columns=COLUMNS[table]
+            )
+        await connection.exec_driver_sql(
+            "INSERT INTO data_versions (id, version) VALUES (1, 0)"
+        )
+
+
+async def _drop(name: str):
+    from database import engine
+
+    await engine.dispose()
+    admin = await _admin_connection()
+    try:
+        await admin.execute(f'DROP DATABASE IF EXISTS "{name}"')
+    finally:
+        await admin.close()
+
+
+@pytest.fixture(scope="session")
+def database(loop):
+    name = os.environ["DATABASE_TABLE"]
+    try:
+        admin = loop.run_until_complete(_admin_connection())
+        loop.run_until_complete(admin.close())
+    except Exception as error:
+        pytest.skip(f"PostgreSQL недоступен: {error}")
+
+    loop.run_until_complete(_create(name))
+    yield name
+    loop.run_until_complete(_drop(name))
+
+
+@pytest.fixture
+def db(loop, database):
+    from database import new_session
+
+    session = new_session()
+    yield session
+    loop.run_until_complete(session.close())
+
+
+@pytest.fixture
+def client(loop, database):
+    import httpx
+
+    from main import app
+
+    # Запросы идут в приложение на том же цикле событий, что и пул
+    # соединений; lifespan не запускается
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+    yield client
+    loop.run_until_complete(client.aclose())
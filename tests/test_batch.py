@@ -0,0 +1,17 @@
+import views.batch as batch_views
+
+CALL = ("metric_total_revenue", (("supplier_id", 1),))
+
+
+def test_unexpected_errors_are_not_sent_to_the_client(
+    loop, database, monkeypatch, caplog
+):
+    async def fail(**kwargs):
+        raise RuntimeError("SELECT secret FROM ks")
+
+    _, model = batch_views.FUNCTIONS["metric_total_revenue"]
+    monkeypatch.setitem(batch_views.FUNCTIONS, "metric_total_revenue", (fail, model))
+
+    results = loop.run_until_complete(batch_views.run([CALL]))
+    assert results[CALL] == (None, "Internal error")
+    assert "SELECT secret" in caplog.text
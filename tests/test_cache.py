@@ -0,0 +1,29 @@
+from cache import LRUCache
+
+
+def test_weighted_cache_is_bounded_by_total_weight():
+    cache = LRUCache(maxsize=10, weigh=len)
+    cache.set("a", "x" * 4)
+    cache.set("b", "x" * 4)
+    cache.set("c", "x" * 4)
+    assert "a" not in cache and cache.weight == 8
+
+    # Замена записи учитывает новый вес, а не складывает оба
+    cache.set("b", "x" * 1)
+    assert cache.weight == 5
+
+    # Значение тяжелее всего кэша не вытесняет остальные записи
+    cache.set("d", "x" * 11)
+    assert "d" not in cache and cache.weight == 5
+
+    cache.pop("c")
+    assert cache.weight == 1
+    cache.clear()
+    assert cache.weight == 0 and len(cache) == 0
+
+
+def test_default_weight_counts_entries():
+    cache = LRUCache(maxsize=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert len(cache) == cache.weight == 2
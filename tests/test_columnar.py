@@ -0,0 +1,124 @@
+from decimal import Decimal
+
+import pytest
+
+import views.columnar as columnar_views
+import views.data_version as data_version_views
+from tests.conftest import CATEGORIES, REGIONS, SUPPLIERS
+
+PERIODS = [("2022-01-01", "2024-12-31"), ("2023-02-10", "2023-08-20")]
+LIMIT = 1000
+
+# Имя функции в views/utils -> аргументы после (supplier_id, start, end)
+CHECKS = {
+    "herfindahl_hirschman_rate": [()],
+    "metric_percentage_wins": [()],
+    "metric_avg_downgrade_cost": [()],
+    "metric_total_revenue": [()],
+    "revenue_by_regions": [()],
+    "revenue_by_customers": [(LIMIT,)],
+    "revenue_by_customers_by_region_id": [(id, LIMIT) for id in REGIONS],
+    "revenue_by_customers_by_kpgz_id": [(id, LIMIT) for id in CATEGORIES],
+    "revenue_by_customers_by_region_id_and_kpgz_category_id": [
+        (category, region, LIMIT) for category in CATEGORIES for region in REGIONS
+    ],
+    "revenue_by_kpgz_category_by_region_id": [(id, LIMIT) for id in REGIONS],
+    "revenue_by_kpgz_category_by_kpgz_category_id": [(id, LIMIT) for id in CATEGORIES],
+}
+
+TRENDS = {
+    "revenue_trend_by_mounth": ("month", lambda: [((), {})]),
+    "revenue_trend_by_weeks": ("week", lambda: [((), {})]),
+    "revenue_trend_by_mounth_by_region_id": (
+        "month",
+        lambda: [((id,), {"region_id": id}) for id in REGIONS],
+    ),
+    "revenue_trend_by_weeks_by_kpgz_category_id": (
+        "week",
+        lambda: [((id,), {"kpgz_category_id": id}) for id in CATEGORIES],
+    ),
+    "revenue_trend_by_mounth_by_kpgz_category_id_and_region_id": (
+        "month",
+        lambda: [
+            ((category, region), {"kpgz_category_id": category, "region_id": region})
+            for category in CATEGORIES
+            for region in REGIONS
+        ],
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def engine(loop, database):
+    from database import new_session
+
+    async def load():
+        async with new_session() as db:
+            version = await data_version_views.current(db)
+            return await columnar_views.ColumnarEngine(version).load(db)
+
+    return loop.run_until_complete(load())
+
+
+def _numbers(result):
+    rows = result if isinstance(result, list) else [result]
+    return [
+        value
+        for row in rows
+        for value in row.values()
+        if isinstance(value, (int, float, Decimal))
+    ]
+
+
+@pytest.mark.parametrize("name", CHECKS)
+@pytest.mark.parametrize("period", PERIODS)
+@pytest.mark.parametrize("supplier_id", SUPPLIERS)
+def test_engine_matches_sql(loop, db, engine, name, period, supplier_id):
+    for extra in CHECKS[name]:
+        args = (supplier_id, *period, *extra)
+        expected = loop.run_until_complete(columnar_views.oracle(db, name, *args))
+        actual = getattr(engine, name)(*args)
+        assert columnar_views.same(actual, expected), (args, actual, expected)
+
+
+@pytest.mark.parametrize("name", TRENDS)
+@pytest.mark.parametrize("period", PERIODS)
+@pytest.mark.parametrize("supplier_id", SUPPLIERS)
+def test_trend_matches_sql(loop, db, engine, name, period, supplier_id):
+    bucket, cases = TRENDS[name]
+    for extra, filters in cases():
+        args = (supplier_id, *period, *extra)
+        expected = loop.run_until_complete(columnar_views.oracle(db, name, *args))
+        actual = engine.revenue_trend(bucket, supplier_id, *period, **filters)
+        # Тренд сравнивается точно: суммы копеек не должны расходиться
+        assert actual == expected, (args, actual, expected)
+
+
+def test_money_is_decimal(engine):
+    supplier_id, (start_date, end_date) = SUPPLIERS[0], PERIODS[0]
+    results = [
+        engine.metric_total_revenue(supplier_id, start_date, end_date),
+        engine.revenue_by_regions(supplier_id, start_date, end_date),
+        engine.revenue_trend("month", supplier_id, start_date, end_date),
+        engine.revenue_trend(
+            "month", supplier_id, start_date, end_date, kpgz_category_id=1
+        ),
+    ]
+    for result in results:
+        values = _numbers(result)
+        assert values
+        assert all(isinstance(value, Decimal) for value in values)
+
+
+def test_null_start_price_and_orphan_customers_are_skipped(engine):
+    # Как AVG и JOIN customers в SQL: такие КС не дают NaN и не ломают поиск
+    for supplier_id in SUPPLIERS:
+        for start_date, end_date in PERIODS:
+            downgrade = engine.metric_avg_downgrade_cost(
+                supplier_id, start_date, end_date
+            )
+            assert "nan" not in str(downgrade).lower()
+            customers = engine.revenue_by_customers(
+                supplier_id, start_date, end_date, LIMIT
+            )
+            assert all(row["customer_name"] for row in customers)
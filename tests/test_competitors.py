@@ -0,0 +1,26 @@
+import pytest
+
+import views.columnar as columnar_views
+import views.competitors as competitor_views
+from tests.conftest import SUPPLIERS
+
+PERIODS = [("2022-01-01", "2024-12-31"), ("2023-02-10", "2023-08-20")]
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_hhi_matches_the_supplier_metric(loop, db, period):
+    # В сиде есть КС заказчика, которого нет в customers: они не должны
+    # менять доли ни здесь, ни в метрике поставщика
+    result = loop.run_until_complete(
+        competitor_views.compare(
+            db, SUPPLIERS, *period, measures=["herfindahl_hirschman_rate"]
+        )
+    )
+    assert len(result["suppliers"]) == len(SUPPLIERS)
+    for row in result["suppliers"]:
+        expected = loop.run_until_complete(
+            columnar_views.oracle(
+                db, "herfindahl_hirschman_rate", row["supplier_id"], *period
+            )
+        )
+        assert row["herfindahl_hirschman_rate"] == expected["value"], (row, expected)
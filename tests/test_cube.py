@@ -0,0 +1,53 @@
+import pytest
+
+import views.columnar as columnar_views
+import views.cube as cube_views
+import views.data_version as data_version_views
+from tests.conftest import CATEGORIES, REGIONS
+
+# Полный период и период с неполными месяцами на обоих концах
+PERIODS = [("2022-01-01", "2024-12-31"), ("2022-03-15", "2023-11-10")]
+LIMITS = [2, 1000]
+
+# Имя функции в views/utils -> аргументы после (start, end) без limit
+CHECKS = {
+    "total_revenue_by_kpgz_category": [()],
+    "total_revenue_by_kpgz_category_by_region_id": [(id,) for id in REGIONS],
+    "total_revenue_by_regions_by_kpgz_category_id": [(id,) for id in CATEGORIES],
+    "total_revenue_by_regions_by_kpgz_category_and_region_id": [
+        (category, region) for category in CATEGORIES for region in REGIONS
+    ],
+}
+
+
+@pytest.fixture(scope="module")
+def cube(loop, database):
+    from database import new_session
+
+    async def build():
+        async with new_session() as db:
+            version = await data_version_views.current(db)
+            return await cube_views.MarketCube(version).build(db)
+
+    return loop.run_until_complete(build())
+
+
+@pytest.mark.parametrize("name", CHECKS)
+@pytest.mark.parametrize("period", PERIODS)
+@pytest.mark.parametrize("limit", LIMITS)
+def test_cube_matches_sql(loop, db, cube, name, period, limit):
+    for extra in CHECKS[name]:
+        args = (*period, *extra, limit)
+        expected = loop.run_until_complete(columnar_views.oracle(db, name, *args))
+        actual = getattr(cube, name)(*args)
+        assert columnar_views.same(actual, expected), (args, actual, expected)
+
+
+def test_cube_falls_back_to_sql_while_building(loop, db, cube, monkeypatch):
+    monkeypatch.setattr(cube_views, "_cube", None)
+
+    async def run():
+        async with cube_views._lock:
+            return await cube_views.get_cube(db)
+
+    assert loop.run_until_complete(run()) is None
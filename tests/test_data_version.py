@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import views.data_version as data_version_views
+
+REPLICA_SCHEMA = "replica"
+
+
+@pytest.fixture
+def replica(loop, database, monkeypatch):
+    """
+    Отставшая реплика: своя таблица data_versions в отдельной схеме той же
+    базы (search_path), версия 0
+    """
+    import database as database_module
+
+    engine = create_async_engine(
+        database_module.SQLALCHEMY_DATABASE_URL,
+        connect_args={"server_settings": {"search_path": REPLICA_SCHEMA}},
+    )
+
+    async def create():
+        async with engine.begin() as connection:
+            await connection.execute(text(f"CREATE SCHEMA {REPLICA_SCHEMA}"))
+            await connection.execute(
+                text(
+                    "CREATE TABLE data_versions AS "
+                    "SELECT id, 0 AS version FROM public.data_versions"
+                )
+            )
+
+    async def drop():
+        async with engine.begin() as connection:
+            await connection.execute(text(f"DROP SCHEMA {REPLICA_SCHEMA} CASCADE"))
+        await engine.dispose()
+
+    loop.run_until_complete(create())
+    monkeypatch.setattr(data_version_views, "replica_engine", engine)
+    monkeypatch.setattr(data_version_views, "_versions", {})
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    loop.run_until_complete(drop())
+
+
+def test_version_is_cached_per_database(loop, db, replica):
+    async def run():
+        await data_version_views.bump(db)
+        primary = await data_version_views.current(db)
+        assert primary > 0
+        # Пока реплика не проверялась, версия без базы неизвестна
+        assert data_version_views.cached() is None
+
+        async with replica() as replica_db:
+            assert await data_version_views.current(replica_db) == 0
+        assert await data_version_views.current(db) == primary
+        assert data_version_views.cached() is None
+
+        async with replica() as replica_db:
+            await replica_db.execute(
+                text("UPDATE data_versions SET version = :version WHERE id = 1"),
+                {"version": primary},
+            )
+            await replica_db.commit()
+            # До истечения DATA_VERSION_TTL — прежняя версия реплики
+            assert await data_version_views.current(replica_db) == 0
+            data_version_views._versions.pop(replica_db.bind)
+            assert await data_version_views.current(replica_db) == primary
+        assert data_version_views.cached() == primary
+
+    loop.run_until_complete(run())
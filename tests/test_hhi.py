@@ -0,0 +1,56 @@
+import views.columnar as columnar_views
+import views.data_version as data_version_views
+import views.hhi as hhi_views
+import views.ranges as range_views
+from tests.conftest import SUPPLIERS
+
+PERIODS = [("2022-01-01", "2024-12-31"), ("2022-03-15", "2023-11-10")]
+
+
+async def _matches_sql(db):
+    for supplier_id in SUPPLIERS:
+        for start_date, end_date in PERIODS:
+            args = (supplier_id, start_date, end_date)
+            expected = await columnar_views.oracle(
+                db, "herfindahl_hirschman_rate", *args
+            )
+            actual = await range_views.herfindahl_hirschman_rate(db, *args)
+            if actual != expected:
+                return False
+    return True
+
+
+def test_table_is_used_only_after_refresh(loop, db):
+    async def run():
+        version = await data_version_views.current(db)
+        assert not await hhi_views.maintained(db, version)
+        # Без пересчета таблицы — живой запрос по ks
+        assert await _matches_sql(db)
+
+        await hhi_views.refresh(db)
+        version = await data_version_views.bump(db)
+        assert await hhi_views.maintained(db, version)
+        # Месяцы из таблицы и крайние дни одинаково отбрасывают КС
+        # заказчиков, которых нет в customers
+        assert await _matches_sql(db)
+
+        # Увеличение версии без пересчета: таблица снова не используется
+        version = await data_version_views.bump(db)
+        assert not await hhi_views.maintained(db, version)
+
+    loop.run_until_complete(run())
+
+
+def test_trend_takes_whole_buckets(loop, db):
+    async def run():
+        for supplier_id in SUPPLIERS:
+            cut = await hhi_views.trend(
+                db, supplier_id, "2022-01-01", "2023-08-05", "quarter"
+            )
+            whole = await hhi_views.trend(
+                db, supplier_id, "2022-01-01", "2023-09-30", "quarter"
+            )
+            assert cut == whole
+            assert cut[-1]["quarter"] == "2023-Q3"
+
+    loop.run_until_complete(run())
@@ -0,0 +1,74 @@
+import gzip
+
+import brotli
+import pytest
+
+from models import UserModel
+import views.api_keys as api_key_views
+
+TREND = "/api/utils/revenue_trend_by_weeks/1/2022-01-01/2024-12-31"
+
+
+VERIFY = "/api/utils/revenue_index/verify/1/2022-01-01/2024-12-31"
+
+
+@pytest.fixture(scope="module")
+def admin_key(loop, database):
+    from database import new_session
+
+    async def seed():
+        async with new_session() as db:
+            db.add(UserModel(id=301, supplier_id=1, email="admin@example.com"))
+            await db.flush()
+            _, key = await api_key_views.create(
+                db, 301, "Сверка", scope=api_key_views.ADMIN_SCOPE
+            )
+            return key
+
+    return loop.run_until_complete(seed())
+
+
+def _get(loop, client, path, **headers):
+    return loop.run_until_complete(client.get(path, headers=headers))
+
+
+async def _raw(client, path, **headers):
+    # httpx распаковывает тело сам, поэтому читается сырой поток
+    async with client.stream("GET", path, headers=headers) as response:
+        return response, b"".join([chunk async for chunk in response.aiter_raw()])
+
+
+def test_responses_are_compressed_through_the_middleware_stack(loop, client):
+    plain = _get(loop, client, TREND, **{"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert len(plain.content) > 1024
+
+    for encoding, decompress in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+        response, raw = loop.run_until_complete(
+            _raw(client, TREND, **{"Accept-Encoding": encoding})
+        )
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept, Accept-Encoding"
+        assert response.headers["etag"] == plain.headers["etag"]
+        assert len(raw) < len(plain.content)
+        assert decompress(raw) == plain.content
+
+
+def test_conditional_get_returns_not_modified(loop, client):
+    first = _get(loop, client, TREND)
+    response = _get(loop, client, TREND, **{"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_verify_routes_bypass_the_http_cache(loop, client, admin_key):
+    header = api_key_views.api_key_header.model.name
+    response = _get(loop, client, VERIFY, **{header: admin_key})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert "public" not in response.headers.get("cache-control", "")
+
+    # Без ключа — отказ, а не 304 из кэша
+    for headers in ({}, {"If-None-Match": "*"}):
+        assert _get(loop, client, VERIFY, **headers).status_code in (401, 403)
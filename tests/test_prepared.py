@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import asyncpg
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database as database_module
+import views.market as market_views
+import views.prepared as prepared_views
+
+PARAMS = {"start_date": datetime(2022, 1, 1), "end_date": datetime(2023, 1, 1)}
+
+
+def _prepares_on_first_query(loop, monkeypatch, enabled: bool):
+    monkeypatch.setattr(database_module, "DATABASE_PREPARE", enabled)
+    engine = create_async_engine(database_module.SQLALCHEMY_DATABASE_URL)
+    event.listen(engine.sync_engine, "connect", database_module.prepare_statements)
+
+    prepares = []
+    prepare = asyncpg.connection.Connection.prepare
+
+    async def counting_prepare(self, query, *args, **kwargs):
+        prepares.append(query)
+        return await prepare(self, query, *args, **kwargs)
+
+    monkeypatch.setattr(asyncpg.connection.Connection, "prepare", counting_prepare)
+
+    async def run():
+        try:
+            async with engine.connect() as connection:
+                # Подготовка при подключении и служебные запросы диалекта
+                prepares.clear()
+                await connection.execute(text(market_views.AUCTION_COUNT), PARAMS)
+        finally:
+            await engine.dispose()
+        return list(prepares)
+
+    return loop.run_until_complete(run())
+
+
+def test_first_query_reuses_statement_prepared_on_connect(loop, database, monkeypatch):
+    prepared_views.register()
+    monkeypatch.setitem(database_module.prepare_stats, "failed", [])
+
+    assert _prepares_on_first_query(loop, monkeypatch, enabled=False) == [
+        database_module.statements["auction_count"]
+    ]
+    assert _prepares_on_first_query(loop, monkeypatch, enabled=True) == []
+    assert database_module.prepare_stats["failed"] == []
+    assert database_module.prepare_stats["prepared"] == len(database_module.statements)
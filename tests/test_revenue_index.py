@@ -0,0 +1,55 @@
+from sqlalchemy import text
+
+import views.columnar as columnar_views
+import views.data_version as data_version_views
+import views.revenue_index as revenue_index_views
+from tests.conftest import SUPPLIERS
+
+PERIOD = ("2022-01-01", "2024-12-31")
+
+
+async def _matches_sql(db):
+    index = await revenue_index_views.get_index(db)
+    for supplier_id in SUPPLIERS:
+        args = (supplier_id, *PERIOD)
+        for name in ("metric_total_revenue", "metric_percentage_wins"):
+            expected = await columnar_views.oracle(db, name, *args)
+            if getattr(index, name)(*args) != expected:
+                return False
+        expected = await columnar_views.oracle(db, "revenue_trend_by_mounth", *args)
+        if index.revenue_trend("month", *args) != expected:
+            return False
+    return True
+
+
+def test_index_follows_updated_rows(loop, db):
+    # Меняются уже учтенные строки: число строк и сумма end_price те же
+    swap = """
+UPDATE ks SET
+    winner_id = CASE winner_id WHEN :a THEN :b WHEN :b THEN :a ELSE winner_id END,
+    end_ks = end_ks + interval '40 days'
+WHERE id_ks % 5 = 0
+"""
+
+    async def run():
+        assert await _matches_sql(db)
+        params = {"a": SUPPLIERS[0], "b": SUPPLIERS[1]}
+        await db.execute(text(swap), params)
+        await data_version_views.bump(db)
+        try:
+            return await _matches_sql(db)
+        finally:
+            await db.execute(text(swap.replace("+ interval", "- interval")), params)
+            await data_version_views.bump(db)
+
+    assert loop.run_until_complete(run())
+
+
+def test_index_falls_back_to_sql_while_building(loop, db, monkeypatch):
+    monkeypatch.setattr(revenue_index_views, "_index", None)
+
+    async def run():
+        async with revenue_index_views._lock:
+            return await revenue_index_views.get_index(db)
+
+    assert loop.run_until_complete(run()) is None
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from models import DashboardModel, UserModel
+import views.data_version as data_version_views
+import views.timeseries as timeseries_views
+import views.utils as util_views
+import views.warmup as warmup_views
+from views.dashboards import DEFAULT_END_DATE, DEFAULT_START_DATE
+
+OWNER = 201
+
+
+@pytest.fixture(scope="module")
+def dashboard(loop, database):
+    from database import new_session
+
+    async def seed():
+        async with new_session() as db:
+            db.add(UserModel(id=OWNER, supplier_id=1, email="warmup@example.com"))
+            await db.flush()
+            db.add(DashboardModel(id=OWNER, title="Прогрев", owner_id=OWNER))
+            await db.commit()
+
+    loop.run_until_complete(seed())
+    return OWNER
+
+
+def test_warmup_caches_the_scorecard_trend(loop, db, dashboard):
+    async def run():
+        await warmup_views.run()
+        assert warmup_views.stats["version"] == await data_version_views.current(db)
+
+        hits = timeseries_views._trends.hits
+        await util_views.revenue_trend_by_mounth(
+            dashboard, DEFAULT_START_DATE, DEFAULT_END_DATE, db
+        )
+        assert timeseries_views._trends.hits == hits + 1
+
+    loop.run_until_complete(run())
+
+
+def test_every_worker_warms_after_a_version_change(loop, db, dashboard, monkeypatch):
+    monkeypatch.setattr(warmup_views, "WARMUP_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(data_version_views, "DATA_VERSION_TTL", 0)
+
+    async def run():
+        warmup_views.start(warm_now=False)
+        try:
+            # Версию увеличил другой воркер: этот узнает о ней из базы
+            version = await data_version_views.bump(db)
+            for _ in range(500):
+                if (
+                    warmup_views.stats["version"] == version
+                    and warmup_views._task is not None
+                    and warmup_views._task.done()
+                ):
+                    break
+                await asyncio.sleep(0.01)
+            assert warmup_views.stats["version"] == version
+            assert warmup_views._task.done() and warmup_views._task.exception() is None
+        finally:
+            await warmup_views.cancel()
+
+    loop.run_until_complete(run())
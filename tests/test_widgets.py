@@ -0,0 +1,114 @@
+import pytest
+
+from models import (
+    DashboardModel,
+    DashboardSubscriptionModel,
+    UserModel,
+    WidgetModel,
+)
+import views.tokens as token_views
+
+PERIOD = "2022-01-01/2024-12-31"
+
+
+@pytest.fixture(scope="module")
+def users(loop, database):
+    from database import new_session
+
+    async def seed():
+        async with new_session() as db:
+            users = {}
+            for id, name in enumerate(("owner", "subscriber", "stranger"), 101):
+                users[name] = UserModel(
+                    id=id,
+                    supplier_id=1,
+                    email=f"{name}@example.com",
+                    token=token_views.create_access_token(data={"sub": id}),
+                )
+            db.add_all(users.values())
+            db.add(DashboardModel(id=101, title="Дашборд", owner_id=101))
+            await db.flush()
+            db.add(DashboardSubscriptionModel(dashboard_id=101, user_id=102))
+            db.add(
+                WidgetModel(
+                    dashboard_id=101, type="metric_total_revenue", index=0, title="1"
+                )
+            )
+            await db.commit()
+            return {name: user.token for name, user in users.items()}
+
+    return loop.run_until_complete(seed())
+
+
+def _get(loop, client, params=None, dashboard_id=101):
+    return loop.run_until_complete(
+        client.get(
+            f"/api/widgets/dashboard/{dashboard_id}/data/{PERIOD}", params=params
+        )
+    )
+
+
+def test_owner_and_subscribers_get_widget_data(loop, client, users):
+    for name in ("owner", "subscriber"):
+        response = _get(loop, client, {"token": users[name]})
+        assert response.status_code == 200
+        assert response.json()[0]["type"] == "metric_total_revenue"
+
+
+def test_other_users_are_rejected(loop, client, users):
+    assert _get(loop, client).status_code == 401
+    assert _get(loop, client, {"token": "invalid"}).status_code == 401
+    assert _get(loop, client, {"token": users["stranger"]}).status_code == 403
+    response = _get(loop, client, {"token": users["owner"]}, dashboard_id=999)
+    assert response.status_code == 404
+
+
+def test_etag_follows_widget_changes(loop, client, users):
+    from sqlalchemy import update
+
+    from database import new_session
+
+    params = {"token": users["owner"]}
+    first = _get(loop, client, params)
+    tag = first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("private")
+
+    response = loop.run_until_complete(
+        client.get(
+            f"/api/widgets/dashboard/101/data/{PERIOD}",
+            params=params,
+            headers={"If-None-Match": tag},
+        )
+    )
+    assert response.status_code == 304
+
+    async def rename():
+        async with new_session() as db:
+            await db.execute(
+                update(WidgetModel)
+                .where(WidgetModel.dashboard_id == 101)
+                .values(title="2")
+            )
+            await db.commit()
+
+    loop.run_until_complete(rename())
+    response = loop.run_until_complete(
+        client.get(
+            f"/api/widgets/dashboard/101/data/{PERIOD}",
+            params=params,
+            headers={"If-None-Match": tag},
+        )
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != tag
+    assert response.json()[0]["title"] == "2"
+
+    # Чужой ETag не заменяет проверку доступа
+    response = loop.run_until_complete(
+        client.get(
+            f"/api/widgets/dashboard/101/data/{PERIOD}",
+            params={"token": users["stranger"]},
+            headers={"If-None-Match": "*"},
+        )
+    )
+    assert response.status_code == 403
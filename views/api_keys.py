@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime
+from functools import cache
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Security
+from fastapi.security import APIKeyHeader
+from sqlalchemy import select
+
+from cache import LRUCache
+from database import SessionDep
+from lazy import LazyModule
+from models import ApiKeyModel
+
+load_dotenv()
+
+# Хэширование паролей и JWT нужны только при проверке ключей
+auth_views = LazyModule("views.auth")
+
+# Отзыв ключа в соседних воркерах вступает в силу не позже чем через ttl
+API_KEY_CACHE_TTL = int(os.getenv("API_KEY_CACHE_TTL", 60))
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", 4096))
+API_KEY_REQUIRED_FOR_UTILS = os.getenv("API_KEY_REQUIRED_FOR_UTILS", "0") == "1"
+
+KEY_PREFIX = "th_"
+# Обычные ключи выпускает себе любой пользователь; admin-ключи (загрузчик
+# данных, обслуживание) — только create_admin_key.py
+USER_SCOPE = "user"
+ADMIN_SCOPE = "admin"
+_MISSING = object()
+
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+# key_hash -> {"id", "owner_id", "scope"}
+_cache = LRUCache(maxsize=API_KEY_CACHE_SIZE, ttl=API_KEY_CACHE_TTL)
+# Неизвестные и отозванные ключи — отдельно и в небольшом кэше: перебор
+# случайных ключей не вытесняет действующие
+_unknown_cache = LRUCache(maxsize=256, ttl=API_KEY_CACHE_TTL)
+# HMAC от старого секретного ключа /api/deepseek, уже прошедшего проверку
+_legacy_cache = LRUCache(maxsize=64, ttl=API_KEY_CACHE_TTL)
+
+
+@cache
+def _secret():
+    return os.getenv("API_KEY_SECRET", auth_views.SECRET_KEY).encode("utf-8")
+
+
+def key_hash(key: str):
+    return hmac.new(_secret(), key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def generate_key():
+    return KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+async def authenticate(db: SessionDep, key: str):
+    digest = key_hash(key)
+    cached = _cache.get(digest)
+    if cached is not None:
+        return cached
+    if _unknown_cache.get(digest):
+        return None
+
+    # В базе ищется HMAC, а не сам ключ: по времени поиска ключ нельзя
+    # подобрать посимвольно, отдельное сравнение за постоянное время не нужно
+    result = await db.execute(
+        select(ApiKeyModel).where(
+            ApiKeyModel.key_hash == digest, ApiKeyModel.revoked_at.is_(None)
+        )
+    )
+    api_key = result.scalars().first()
+    if not api_key:
+        _unknown_cache.set(digest, True)
+        return None
+
+    identity = {"id": api_key.id, "owner_id": api_key.owner_id, "scope": api_key.scope}
+    _cache.set(digest, identity)
+    return identity
+
+
+async def verify_legacy_secret(secret_key: str, hashed_secret: str):
+    digest = key_hash(secret_key)
+    if _legacy_cache.get(digest):
+        return True
+
+    if not await auth_views.verify_password(secret_key, hashed_secret):
+        return False
+
+    _legacy_cache.set(digest, True)
+    return True
+
+
+async def create(db: SessionDep, owner_id: int, name: str, scope: str = USER_SCOPE):
+    key = generate_key()
+    api_key = ApiKeyModel(
+        name=name,
+        prefix=key[: len(KEY_PREFIX) + 6],
+        key_hash=key_hash(key),
+        owner_id=owner_id,
+        scope=scope,
+    )
+
+    db.add(api_key)
+    await db.commit()
+    await db.refresh(api_key)
+
+    return api_key, key
+
+
+async def get_by_owner_id(db: SessionDep, owner_id: int):
+    result = await db.execute(
+        select(ApiKeyModel)
+        .where(ApiKeyModel.owner_id == owner_id)
+        .order_by(ApiKeyModel.id)
+    )
+    return result.scalars().all()
+
+
+async def revoke(db: SessionDep, key_id: int, owner_id: int):
+    result = await db.execute(
+        select(ApiKeyModel).where(
+            ApiKeyModel.id == key_id, ApiKeyModel.owner_id == owner_id
+        )
+    )
+    api_key = result.scalars().first()
+    if not api_key:
+        return None
+
+    if api_key.revoked_at is None:
+        api_key.revoked_at = datetime.utcnow()
+        await db.commit()
+        await db.refresh(api_key)
+
+    _cache.pop(api_key.key_hash)
+
+    return api_key
+
+
+async def require_api_key(db: SessionDep, key: str | None = Security(api_key_header)):
+    identity = await authenticate(db, key) if key else None
+    if identity is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Неверный API-ключ",
+            headers={"WWW-Authenticate": "ApiKey"},
+        )
+    return identity
+
+
+async def require_admin_key(db: SessionDep, key: str | None = Security(api_key_header)):
+    """
+    Ключ для маршрутов обслуживания: сброс версии данных, прогрев, сверка
+    движков с SQL
+    """
+    identity = await require_api_key(db, key)
+    if identity["scope"] != ADMIN_SCOPE:
+        raise HTTPException(status_code=403, detail="Нужен API-ключ администратора")
+    return identity
+
+
+async def optional_api_key(db: SessionDep, key: str | None = Security(api_key_header)):
+    """
+    Ключ для /api/utils: если передан — проверяется, обязателен только при
+    API_KEY_REQUIRED_FOR_UTILS=1
+    """
+    if key or API_KEY_REQUIRED_FOR_UTILS:
+        return await require_api_key(db, key)
+    return None
@@ -1,37 +1,23 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-import views.users as user_views
+import views.passwords as password_views
+import views.tokens as token_views
+from views.tokens import SECRET_KEY, ALGORITHM, create_access_token
 from database import SessionDep
 
-SECRET_KEY = "$$#&><?><&*@#$%^&*()_+"
-ALGORITHM = "HS256"
-
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+async def get_password_hash(password: str):
+    return await password_views.hash_password(password)
 
 
-def authenticate_user(plain_password: str, hashed_password: str):
-    return verify_password(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str):
+    return await password_views.verify_password(plain_password, hashed_password)
 
 
-def create_access_token(data: dict):
-    from datetime import datetime, timedelta
-
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=30)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+async def authenticate_user(plain_password: str, hashed_password: str):
+    return await verify_password(plain_password, hashed_password)
 
 
 async def get_current_user(db: SessionDep, token: str = Depends(oauth2_scheme)):
@@ -40,14 +26,7 @@ async def get_current_user(db: SessionDep, token: str = Depends(oauth2_scheme)):
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = await user_views.get_by_email(db, username=username)
+    user = await token_views.resolve(db, token)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,165 @@
+import asyncio
+import inspect
+import logging
+import os
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pydantic import ConfigDict, ValidationError, create_model
+
+from database import read_session
+from schemas.batch import Call
+import views.utils as util_views
+from views.periods import parse_date
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Несколько вызовов аналитики за один HTTP-запрос: каждый уникальный
+# вызов получает свою сессию из пула, одновременно — не больше
+# BATCH_CONCURRENCY, чтобы один дашборд не занимал весь пул соединений
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_CALLS = int(os.getenv("BATCH_MAX_CALLS", 50))
+
+NAMES = (
+    "herfindahl_hirschman_rate",
+    "metric_percentage_wins",
+    "metric_avg_downgrade_cost",
+    "metric_total_revenue",
+    "revenue_by_regions",
+    "revenue_by_kpgz_category_by_region_id",
+    "revenue_by_kpgz_category_by_kpgz_category_id",
+    "revenue_by_kpgz_category_by_kpgz_category_id_and_region_id",
+    "total_revenue_by_kpgz_category",
+    "total_revenue_by_kpgz_category_by_region_id",
+    "total_revenue_by_regions_by_kpgz_category_id",
+    "total_revenue_by_regions_by_kpgz_category_and_region_id",
+    "revenue_trend_by_mounth",
+    "revenue_trend_by_weeks",
+    "revenue_trend_by_mounth_by_region_id",
+    "revenue_trend_by_weeks_by_region_id",
+    "revenue_trend_by_mounth_by_kpgz_category_id",
+    "revenue_trend_by_weeks_by_kpgz_category_id",
+    "revenue_trend_by_mounth_by_kpgz_category_id_and_region_id",
+    "revenue_trend_by_weeks_by_kpgz_category_id_and_region_id",
+    "revenue_by_customers",
+    "revenue_by_customers_by_region_id",
+    "revenue_by_customers_by_kpgz_id",
+    "revenue_by_customers_by_region_id_and_kpgz_category_id",
+)
+
+
+def _params_model(name: str, function):
+    # Параметры функции без сессии: типы и обязательность — из сигнатуры
+    fields = {
+        parameter.name: (
+            parameter.annotation,
+            ... if parameter.default is inspect.Parameter.empty else parameter.default,
+        )
+        for parameter in inspect.signature(function).parameters.values()
+        if parameter.name != "db"
+    }
+    return create_model(name, __config__=ConfigDict(extra="forbid"), **fields)
+
+
+FUNCTIONS = {
+    name: (getattr(util_views, name), _params_model(name, getattr(util_views, name)))
+    for name in NAMES
+}
+
+
+def call_key(function: str, **params):
+    return function, tuple(sorted(params.items()))
+
+
+def _validate(call: Call):
+    if call.function not in FUNCTIONS:
+        raise ValueError(f"Неизвестная функция '{call.function}'")
+    _, model = FUNCTIONS[call.function]
+    try:
+        params = model(**call.params).model_dump()
+    except ValidationError as error:
+        raise ValueError(
+            "; ".join(
+                f"{'.'.join(map(str, item['loc']))}: {item['msg']}"
+                for item in error.errors()
+            )
+        )
+    # Даты подставляются в SQL, поэтому проверяются до выполнения
+    for name in ("start_date", "end_date"):
+        try:
+            parse_date(params[name])
+        except HTTPException as error:
+            raise ValueError(error.detail)
+    return call_key(call.function, **params)
+
+
+def validate(calls: list[Call]):
+    """
+    Проверяет все вызовы до выполнения; при ошибках — 422 со списком
+    """
+    if len(calls) > BATCH_MAX_CALLS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Не больше {BATCH_MAX_CALLS} вызовов в одном запросе",
+        )
+
+    keys, errors = [], []
+    for position, call in enumerate(calls):
+        try:
+            keys.append(_validate(call))
+        except ValueError as error:
+            errors.append({"id": call.id or str(position), "error": str(error)})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    return keys
+
+
+async def _run(semaphore: asyncio.Semaphore, key: tuple):
+    name, params = key
+    function, _ = FUNCTIONS[name]
+    async with semaphore:
+        try:
+            async with await read_session() as db:
+                return await function(**dict(params), db=db), None
+        except HTTPException as error:
+            return None, str(error.detail)
+        except Exception:
+            # Текст исключения может содержать SQL и параметры: клиенту —
+            # только факт ошибки, подробности — в лог
+            logger.exception("Ошибка вызова %s в пакете", name)
+            return None, "Internal error"
+
+
+async def run(keys: list[tuple], concurrency: int = BATCH_CONCURRENCY):
+    """
+    Выполняет проверенные вызовы (function, params): одинаковые — один раз,
+    ошибка одного вызова не мешает остальным. {вызов: (результат, ошибка)}
+    """
+    unique = list(dict.fromkeys(keys))
+    semaphore = asyncio.Semaphore(concurrency)
+    return dict(
+        zip(
+            unique,
+            await asyncio.gather(*(_run(semaphore, key) for key in unique)),
+        )
+    )
+
+
+async def execute(calls: list[Call]):
+    keys = validate(calls)
+    outcomes = await run(keys)
+
+    response = []
+    for position, (call, key) in enumerate(zip(calls, keys)):
+        result, error = outcomes[key]
+        response.append(
+            {
+                "id": call.id or str(position),
+                "function": call.function,
+                "result": result,
+                "error": error,
+            }
+        )
+    return response
@@ -0,0 +1,566 @@
+import asyncio
+import os
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database import SessionDep
+import views.data_version as data_version_views
+from views.periods import buckets, parse_date
+
+load_dotenv()
+
+# Движок включается явно, SQL из views/utils остается запасным вариантом
+COLUMNAR_ENGINE = os.getenv("COLUMNAR_ENGINE", "0") == "1"
+
+
+# Деньги хранятся целыми числами в единицах последнего знака numeric:
+# суммы точные и совпадают с SUM() в SQL до копейки
+PRICE_PLACES = 2  # ks.end_price, numeric(18, 2)
+REVENUE_PLACES = 4  # orders.oferta_price * orders.count
+# Строки ks/orders читаются частями, чтобы не занимать event loop надолго
+FETCH_PARTITION = 50000
+
+
+def _seconds(value: datetime):
+    return np.datetime64(value, "s").astype(np.int64)
+
+
+def _timestamps(values):
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def _scaled(values, places: int):
+    # NULL в суммах SQL пропускается, здесь он просто не добавляет ничего
+    factor = 10**places
+    return np.array(
+        [0 if value is None else int(value * factor) for value in values],
+        dtype=np.int64,
+    )
+
+
+def _floats(values):
+    # NULL остается NaN и пропускается, как в AVG()
+    return np.array(
+        [np.nan if value is None else value for value in values], dtype=np.float64
+    )
+
+
+def _encode(values):
+    # Словарное кодирование: уникальные значения и код каждого элемента
+    uniques, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return list(uniques), codes.astype(np.int32)
+
+
+def _lookup(sorted_ids, ids):
+    """
+    Позиции ids в sorted_ids; -1 для отсутствующих — как строки, которые
+    отбросил бы JOIN
+    """
+    if not len(sorted_ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, positions, -1)
+
+
+def _take(values, positions, missing=-1):
+    return np.where(positions >= 0, values[np.maximum(positions, 0)], missing)
+
+
+def _sums(positions, values, size: int):
+    # Целочисленная сумма по группам (bincount с весами считает во float64)
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, positions, values)
+    return totals
+
+
+def _money(total, places: int):
+    return Decimal(int(total)) / 10**places
+
+
+def _round(value):
+    # Как ROUND(numeric, 2) в PostgreSQL
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+
+def _bucket_keys(seconds, bucket: str):
+    days = seconds // 86400
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        # 1970-01-01 — четверг, неделя начинается с понедельника
+        return days - (days + 3) % 7
+    months = seconds.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+    if bucket == "month":
+        return months
+    if bucket == "quarter":
+        return months // 3
+    return months // 12
+
+
+def _bucket_labels(start: datetime, end: datetime, bucket: str):
+    keys, labels = [], []
+    for day, label in buckets(start, end, bucket):
+        if bucket in ("day", "week"):
+            keys.append((day - date(1970, 1, 1)).days)
+        else:
+            month = (day.year - 1970) * 12 + day.month - 1
+            keys.append(month // {"month": 1, "quarter": 3, "year": 12}[bucket])
+        labels.append(label)
+    return np.array(keys, dtype=np.int64), labels
+
+
+async def _fetch(db: SessionDep, sql: str):
+    result = await db.stream(text(sql))
+    rows = []
+    async for partition in result.partitions(FETCH_PARTITION):
+        rows.extend(partition)
+    return rows
+
+
+class ColumnarEngine:
+    """
+    Таблицы ks и orders в виде столбцов NumPy, отсортированных по winner_id:
+    выборка поставщика — срез, агрегаты — векторные операции
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+
+    async def load(self, db: SessionDep):
+        regions = await _fetch(db, "SELECT id, name FROM regions ORDER BY id")
+        customers = await _fetch(
+            db, "SELECT id, name, region_id FROM customers ORDER BY id"
+        )
+        categories = await _fetch(
+            db, "SELECT id, code FROM kpgz_categories ORDER BY id"
+        )
+        ks = await _fetch(
+            db,
+            """
+SELECT id_ks, start_ks, end_ks, start_price, end_price, customer_id, winner_id
+FROM ks
+ORDER BY winner_id, id_ks
+            """,
+        )
+        orders = await _fetch(
+            db,
+            """
+SELECT o.id_ks, o.oferta_price * o.count AS revenue, COALESCE(kd.parent_id, -1)
+FROM orders o
+JOIN ks ON o.id_ks = ks.id_ks
+LEFT JOIN cte ON o.id_cte = cte.id
+LEFT JOIN kpgz_details kd ON cte.kpgz_id = kd.id
+            """,
+        )
+        # Построение столбцов — чистый CPU, event loop в это время свободен
+        await asyncio.to_thread(self._build, regions, customers, categories, ks, orders)
+        return self
+
+    def _build(self, regions, customers, categories, ks, orders):
+        region_ids = np.array([row[0] for row in regions], dtype=np.int64)
+        self.region_names, region_name_codes = _encode([row[1] for row in regions])
+
+        customer_ids = np.array([row[0] for row in customers], dtype=np.int64)
+        self.customer_names, customer_name_codes = _encode(
+            [row[1] for row in customers]
+        )
+        customer_region_ids = np.array([row[2] for row in customers], dtype=np.int64)
+
+        self.category_ids = np.array([row[0] for row in categories], dtype=np.int64)
+        self.category_codes, category_code_codes = _encode(
+            [row[1] for row in categories]
+        )
+
+        self.ks_winner = np.array([row[6] for row in ks], dtype=np.int64)
+        self.ks_start = _timestamps([row[1] for row in ks])
+        self.ks_end = _timestamps([row[2] for row in ks])
+        self.ks_start_price = _floats([row[3] for row in ks])
+        self.ks_end_price = _scaled([row[4] for row in ks], PRICE_PLACES)
+        # КС заказчиков, которых нет в customers, не попадают в разрезы
+        # по заказчикам и регионам (в SQL их отбрасывает JOIN customers)
+        customer_pos = _lookup(
+            customer_ids, np.array([row[5] for row in ks], dtype=np.int64)
+        )
+        self.ks_customer = customer_pos
+        self.ks_customer_name = _take(customer_name_codes, customer_pos)
+        self.ks_region_id = _take(customer_region_ids, customer_pos)
+        self.ks_region_name = _take(
+            region_name_codes, _lookup(region_ids, self.ks_region_id)
+        )
+
+        ks_ids = np.array([row[0] for row in ks], dtype=np.int64)
+        ks_order = np.argsort(ks_ids)
+        order_ks = ks_order[
+            _lookup(
+                ks_ids[ks_order], np.array([row[0] for row in orders], dtype=np.int64)
+            )
+        ]
+        order_revenue = _scaled([row[1] for row in orders], REVENUE_PLACES)
+        # Позиции без КПГЗ учитываются в разрезах по регионам и заказчикам,
+        # но не попадают ни в одну категорию
+        order_category_pos = _lookup(
+            self.category_ids, np.array([row[2] for row in orders], dtype=np.int64)
+        )
+
+        by_winner = np.argsort(self.ks_winner[order_ks], kind="stable")
+        self.order_ks = order_ks[by_winner]
+        self.order_winner = self.ks_winner[self.order_ks]
+        self.order_revenue = order_revenue[by_winner]
+        self.order_category_id = _take(self.category_ids, order_category_pos)[by_winner]
+        self.order_category_code = _take(category_code_codes, order_category_pos)[
+            by_winner
+        ]
+
+    # ------------------------------------------------------------------
+
+    def _ks_slice(self, supplier_id: int):
+        return slice(
+            np.searchsorted(self.ks_winner, supplier_id, side="left"),
+            np.searchsorted(self.ks_winner, supplier_id, side="right"),
+        )
+
+    def _orders_slice(self, supplier_id: int):
+        return slice(
+            np.searchsorted(self.order_winner, supplier_id, side="left"),
+            np.searchsorted(self.order_winner, supplier_id, side="right"),
+        )
+
+    @staticmethod
+    def _between(values, start_date: str, end_date: str):
+        return (values >= _seconds(parse_date(start_date))) & (
+            values <= _seconds(parse_date(end_date))
+        )
+
+    # ------------------------------------------------------------------
+
+    def herfindahl_hirschman_rate(
+        self, supplier_id: int, start_date: str, end_date: str
+    ):
+        ks = self._ks_slice(supplier_id)
+        mask = self._between(self.ks_end[ks], start_date, end_date)
+        mask &= self.ks_customer[ks] >= 0
+        value = None
+        if mask.any():
+            customers, codes = np.unique(
+                self.ks_customer[ks][mask], return_inverse=True
+            )
+            totals = _sums(codes, self.ks_end_price[ks][mask], len(customers))
+            if totals.sum():
+                shares = totals / totals.sum() * 100
+                value = _round(float(np.sum(shares**2)))
+        return {"name": "Индекс Херфиндаля-Хиршмана", "value": value, "unit": ""}
+
+    def metric_percentage_wins(self, supplier_id: int, start_date: str, end_date: str):
+        market = np.count_nonzero(self._between(self.ks_end, start_date, end_date))
+        ks = self._ks_slice(supplier_id)
+        wins = np.count_nonzero(self._between(self.ks_end[ks], start_date, end_date))
+        value = (
+            (Decimal(wins * 100) / market).quantize(Decimal("0.01"), ROUND_HALF_UP)
+            if market
+            else None
+        )
+        return {"name": "Доля побед в КС", "value": value, "unit": "%"}
+
+    def metric_avg_downgrade_cost(
+        self, supplier_id: int, start_date: str, end_date: str
+    ):
+        ks = self._ks_slice(supplier_id)
+        start_price = self.ks_start_price[ks]
+        mask = self._between(self.ks_start[ks], start_date, end_date)
+        mask &= ~np.isnan(start_price) & (start_price != 0)
+        value = None
+        if mask.any():
+            end_price = self.ks_end_price[ks][mask] / 10**PRICE_PLACES
+            reduction = (start_price[mask] - end_price) / start_price[mask] * 100
+            value = _round(float(np.mean(reduction)))
+        return {"name": "Среднее снижение цены", "value": value, "unit": "%"}
+
+    def metric_total_revenue(self, supplier_id: int, start_date: str, end_date: str):
+        ks = self._ks_slice(supplier_id)
+        mask = self._between(self.ks_end[ks], start_date, end_date)
+        value = None
+        if mask.any():
+            total = _money(self.ks_end_price[ks][mask].sum(), PRICE_PLACES)
+            value = (total / 1000000).quantize(Decimal("0.01"), ROUND_HALF_UP)
+        return {"name": "Общая выручка", "value": value, "unit": "млн. руб."}
+
+    def breakdown(
+        self,
+        supplier_id: int,
+        start_date: str,
+        end_date: str,
+        date_field: str,
+        by: str,
+        columns: tuple[str, str],
+        region_id: int | None = None,
+        kpgz_category_id: int | None = None,
+        limit: int | None = None,
+    ):
+        """
+        Выручка по позициям заказов поставщика в разрезе региона заказчика,
+        заказчика или укрупненной категории КПГЗ
+        """
+        orders = self._orders_slice(supplier_id)
+        order_ks = self.order_ks[orders]
+        dates = self.ks_start if date_field == "start_ks" else self.ks_end
+        mask = self._between(dates[order_ks], start_date, end_date)
+        mask &= self.ks_customer[order_ks] >= 0
+        if region_id is not None:
+            mask &= self.ks_region_id[order_ks] == region_id
+        if kpgz_category_id is not None:
+            mask &= self.order_category_id[orders] == kpgz_category_id
+
+        if by == "region":
+            codes, names = self.ks_region_name[order_ks], self.region_names
+        elif by == "customer":
+            codes, names = self.ks_customer_name[order_ks], self.customer_names
+        else:
+            codes, names = self.order_category_code[orders], self.category_codes
+        mask &= codes >= 0
+
+        totals = _sums(codes[mask], self.order_revenue[orders][mask], len(names))
+        present = np.bincount(codes[mask], minlength=len(names)) > 0
+        positions = np.flatnonzero(present)
+        positions = positions[np.argsort(-totals[positions], kind="stable")]
+        if limit is not None:
+            positions = positions[:limit]
+
+        label, value = columns
+        return [
+            {label: names[position], value: _money(totals[position], REVENUE_PLACES)}
+            for position in positions
+        ]
+
+    def revenue_by_regions(self, supplier_id: int, start_date: str, end_date: str):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "start_ks",
+            "region",
+            ("region_name", "revenue"),
+        )
+
+    def revenue_by_kpgz_category_by_region_id(
+        self, supplier_id, start_date, end_date, region_id, limit
+    ):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "kpgz_category",
+            ("kpgz_category", "total_revenue"),
+            region_id=region_id,
+            limit=limit,
+        )
+
+    def revenue_by_kpgz_category_by_kpgz_category_id(
+        self, supplier_id, start_date, end_date, kpgz_category_id, limit
+    ):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "region",
+            ("name", "total_revenue"),
+            kpgz_category_id=kpgz_category_id,
+            limit=limit,
+        )
+
+    def revenue_by_customers(self, supplier_id, start_date, end_date, limit):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "customer",
+            ("customer_name", "total_revenue"),
+            limit=limit,
+        )
+
+    def revenue_by_customers_by_region_id(
+        self, supplier_id, start_date, end_date, region_id, limit
+    ):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "customer",
+            ("customer_name", "total_revenue"),
+            region_id=region_id,
+            limit=limit,
+        )
+
+    def revenue_by_customers_by_kpgz_id(
+        self, supplier_id, start_date, end_date, kpgz_category_id, limit
+    ):
+        # SQL-версия не применяет limit, повторяем ее поведение
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "customer",
+            ("customer_name", "total_revenue"),
+            kpgz_category_id=kpgz_category_id,
+        )
+
+    def revenue_by_customers_by_region_id_and_kpgz_category_id(
+        self, supplier_id, start_date, end_date, kpgz_category_id, region_id, limit
+    ):
+        return self.breakdown(
+            supplier_id,
+            start_date,
+            end_date,
+            "end_ks",
+            "customer",
+            ("customer_name", "revenue"),
+            region_id=region_id,
+            kpgz_category_id=kpgz_category_id,
+            limit=limit,
+        )
+
+    def revenue_trend(
+        self,
+        bucket: str,
+        supplier_id: int,
+        start_date: str,
+        end_date: str,
+        region_id: int | None = None,
+        kpgz_category_id: int | None = None,
+    ):
+        if kpgz_category_id is None:
+            ks = self._ks_slice(supplier_id)
+            dates, revenue, regions = (
+                self.ks_end[ks],
+                self.ks_end_price[ks],
+                self.ks_region_id[ks],
+            )
+            places = PRICE_PLACES
+            mask = self._between(dates, start_date, end_date)
+        else:
+            # Выручка категории — по ее позициям заказа, как в views/timeseries
+            orders = self._orders_slice(supplier_id)
+            order_ks = self.order_ks[orders]
+            dates, revenue, regions = (
+                self.ks_end[order_ks],
+                self.order_revenue[orders],
+                self.ks_region_id[order_ks],
+            )
+            places = REVENUE_PLACES
+            mask = self._between(dates, start_date, end_date)
+            mask &= self.order_category_id[orders] == kpgz_category_id
+        if region_id is not None:
+            mask &= regions == region_id
+
+        keys, labels = _bucket_labels(
+            parse_date(start_date), parse_date(end_date), bucket
+        )
+        positions = np.searchsorted(keys, _bucket_keys(dates[mask], bucket))
+        totals = _sums(positions, revenue[mask], len(keys))
+        return [
+            {bucket: label, "total_revenue": _money(total, places)}
+            for label, total in zip(labels, totals)
+        ]
+
+
+_engine: ColumnarEngine | None = None
+_lock = asyncio.Lock()
+
+
+async def get_engine(db: SessionDep):
+    """
+    Движок для текущей версии данных или None, если он выключен;
+    после загрузки новых данных столбцы перестраиваются
+    """
+    global _engine
+    if not COLUMNAR_ENGINE or data_version_views.sql_only.get():
+        return None
+
+    version = await data_version_views.current(db)
+    if _engine is not None and _engine.version == version:
+        return _engine
+    if _lock.locked():
+        # Столбцы уже строит другой запрос: этот пока обслужит SQL
+        return None
+
+    async with _lock:
+        if _engine is None or _engine.version != version:
+            _engine = await ColumnarEngine(version).load(db)
+    return _engine
+
+
+async def oracle(db: SessionDep, name: str, *args):
+    """
+    Результат SQL-реализации из views/utils в обход движка
+    """
+    import views.utils as util_views
+
+    token = data_version_views.sql_only.set(True)
+    try:
+        return await getattr(util_views, name)(*args, db)
+    finally:
+        data_version_views.sql_only.reset(token)
+
+
+def same(engine_result, sql_result):
+    # Суммы сравниваются с точностью до копейки, порядок строк с равными
+    # значениями в SQL не определен
+    if isinstance(engine_result, dict):
+        engine_result, sql_result = [engine_result], [sql_result]
+    if len(engine_result) != len(sql_result):
+        return False
+    key = lambda row: tuple(str(value) for value in row.values())
+    for left, right in zip(sorted(engine_result, key=key), sorted(sql_result, key=key)):
+        for column, value in left.items():
+            other = right.get(column)
+            if isinstance(value, (int, float, Decimal)) or isinstance(
+                other, (int, float, Decimal)
+            ):
+                if value is None or other is None:
+                    if value is not other:
+                        return False
+                elif abs(float(value) - float(other)) > 0.011:
+                    return False
+            elif value != other:
+                return False
+    return True
+
+
+async def verify(db: SessionDep, supplier_id: int, start_date: str, end_date: str):
+    """
+    Сверяет ответы движка с SQL-реализацией для поставщика и периода
+    """
+    engine = await ColumnarEngine(await data_version_views.current(db)).load(db)
+    checks = {
+        "herfindahl_hirschman_rate": (supplier_id, start_date, end_date),
+        "metric_percentage_wins": (supplier_id, start_date, end_date),
+        "metric_avg_downgrade_cost": (supplier_id, start_date, end_date),
+        "metric_total_revenue": (supplier_id, start_date, end_date),
+        "revenue_by_regions": (supplier_id, start_date, end_date),
+        "revenue_by_customers": (supplier_id, start_date, end_date, 1000),
+    }
+
+    report = {}
+    for name, args in checks.items():
+        report[name] = same(getattr(engine, name)(*args), await oracle(db, name, *args))
+
+    for bucket, name in (
+        ("month", "revenue_trend_by_mounth"),
+        ("week", "revenue_trend_by_weeks"),
+    ):
+        report[name] = same(
+            engine.revenue_trend(bucket, supplier_id, start_date, end_date),
+            await oracle(db, name, supplier_id, start_date, end_date),
+        )
+
+    return report
@@ -0,0 +1,449 @@
+from typing import Annotated
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import text
+
+from database import SessionDep
+import views.market as market_views
+import views.timeseries as timeseries_views
+from views.periods import months_between, parse_date, weeks_between
+
+CURRENT = {"start": ":start_date", "end": ":end_date"}
+PREVIOUS = {"start": ":compare_start_date", "end": ":compare_end_date"}
+
+KPGZ_JOINS = """
+JOIN cte ON o.id_cte = cte.id
+JOIN kpgz_details kd ON cte.kpgz_id = kd.id
+JOIN kpgz_categories kc ON kd.parent_id = kc.id"""
+
+# Разбивки повторяют запросы из views/utils: подпись, значение, таблицы,
+# условие периода и фильтры. scale — делитель значения (млн. руб.),
+# date — столбец, если период задан одним BETWEEN (см. views/ranges)
+CHARTS = {
+    "revenue_by_regions": {
+        "label": "r.name",
+        "value": "o.count * o.oferta_price",
+        "source": """ks
+JOIN orders o ON ks.id_ks = o.id_ks
+JOIN customers c ON ks.customer_id = c.id
+JOIN regions r ON c.region_id = r.id""",
+        "date": "ks.start_ks",
+        "period": "ks.start_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id"],
+    },
+    "revenue_by_kpgz_category_by_region_id": {
+        "label": "kc.code",
+        "value": "o.oferta_price * o.count",
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id"""
+        + KPGZ_JOINS,
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id", "c.region_id = :region_id"],
+    },
+    "revenue_by_kpgz_category_by_kpgz_category_id": {
+        "label": "r.name",
+        "value": "o.oferta_price * o.count",
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id
+JOIN regions r ON c.region_id = r.id"""
+        + KPGZ_JOINS,
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id", "kc.id = :kpgz_category_id"],
+    },
+    "revenue_by_kpgz_category_by_kpgz_category_id_and_region_id": {
+        "label": "kd.code || ' ' || kd.name",
+        "value": "CAST(o.oferta_price AS numeric) * o.count",
+        "source": """ks
+JOIN orders o ON ks.id_ks = o.id_ks
+JOIN customers c ON ks.customer_id = c.id"""
+        + KPGZ_JOINS,
+        "period": "ks.start_ks >= {start} AND ks.end_ks <= {end}",
+        "filters": [
+            "ks.winner_id = :supplier_id",
+            "c.region_id = :region_id",
+            "kc.id = :kpgz_category_id",
+        ],
+    },
+    "total_revenue_by_kpgz_category": {
+        "label": "kc.code",
+        "value": "o.count * o.oferta_price",
+        "scale": 1000000,
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks"""
+        + KPGZ_JOINS,
+        "date": "ks.start_ks",
+        "period": "ks.start_ks BETWEEN {start} AND {end}",
+        "filters": [],
+    },
+    "total_revenue_by_kpgz_category_by_region_id": {
+        "label": "kc.code",
+        "value": "o.count * o.oferta_price",
+        "scale": 1000000,
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id"""
+        + KPGZ_JOINS,
+        "date": "ks.start_ks",
+        "period": "ks.start_ks BETWEEN {start} AND {end}",
+        "filters": ["c.region_id = :region_id"],
+    },
+    "total_revenue_by_regions_by_kpgz_category_id": {
+        "label": "r.name",
+        "value": "o.count * o.oferta_price",
+        "scale": 1000000,
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN suppliers s ON ks.winner_id = s.id
+JOIN regions r ON s.region_id = r.id"""
+        + KPGZ_JOINS,
+        "date": "ks.start_ks",
+        "period": "ks.start_ks BETWEEN {start} AND {end}",
+        "filters": ["kc.id = :kpgz_category_id"],
+    },
+    "total_revenue_by_regions_by_kpgz_category_and_region_id": {
+        "label": "kd.code || ' ' || kd.name",
+        "value": "o.count * o.oferta_price",
+        "scale": 1000000,
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id"""
+        + KPGZ_JOINS,
+        "date": "ks.start_ks",
+        "period": "ks.start_ks BETWEEN {start} AND {end}",
+        "filters": ["c.region_id = :region_id", "kc.id = :kpgz_category_id"],
+    },
+    "revenue_by_customers": {
+        "label": "c.name",
+        "value": "o.oferta_price * o.count",
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id""",
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id"],
+    },
+    "revenue_by_customers_by_region_id": {
+        "label": "c.name",
+        "value": "o.count * o.oferta_price",
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id""",
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id", "c.region_id = :region_id"],
+    },
+    "revenue_by_customers_by_kpgz_id": {
+        "label": "c.name",
+        "value": "o.count * o.oferta_price",
+        "source": """orders o
+JOIN ks ON o.id_ks = ks.id_ks
+JOIN customers c ON ks.customer_id = c.id"""
+        + KPGZ_JOINS,
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": ["ks.winner_id = :supplier_id", "kc.id = :kpgz_category_id"],
+    },
+    "revenue_by_customers_by_region_id_and_kpgz_category_id": {
+        "label": "c.name",
+        "value": "o.oferta_price * o.count",
+        "source": """ks
+JOIN customers c ON ks.customer_id = c.id
+JOIN orders o ON ks.id_ks = o.id_ks"""
+        + KPGZ_JOINS,
+        "date": "ks.end_ks",
+        "period": "ks.end_ks BETWEEN {start} AND {end}",
+        "filters": [
+            "ks.winner_id = :supplier_id",
+            "kc.id = :kpgz_category_id",
+            "c.region_id = :region_id",
+        ],
+    },
+}
+
+_TREND_BASE = {
+    "value": "ks.end_price",
+    "source": "ks",
+    "date": "ks.end_ks",
+    "filters": ["ks.winner_id = :supplier_id"],
+}
+_TREND_BY_REGION = {
+    **_TREND_BASE,
+    "source": f"ks {timeseries_views.CUSTOMERS_JOIN}",
+    "filters": [*_TREND_BASE["filters"], "c.region_id = :region_id"],
+}
+# Выручка категории — по ее позициям заказа, как в views/timeseries
+_TREND_BY_KPGZ = {
+    **_TREND_BASE,
+    "value": "o.oferta_price * o.count",
+    "source": f"ks\n{timeseries_views.KPGZ_CATEGORIES_JOIN}",
+    "filters": [*_TREND_BASE["filters"], "kc.id = :kpgz_category_id"],
+}
+_TREND_BY_KPGZ_AND_REGION = {
+    **_TREND_BY_KPGZ,
+    "source": f"{_TREND_BY_KPGZ['source']}\n{timeseries_views.CUSTOMERS_JOIN}",
+    "filters": [*_TREND_BY_KPGZ["filters"], "c.region_id = :region_id"],
+}
+
+TRENDS = {
+    "revenue_trend_by_mounth": {**_TREND_BASE, "unit": "month"},
+    "revenue_trend_by_weeks": {**_TREND_BASE, "unit": "week"},
+    "revenue_trend_by_mounth_by_region_id": {**_TREND_BY_REGION, "unit": "month"},
+    "revenue_trend_by_weeks_by_region_id": {**_TREND_BY_REGION, "unit": "week"},
+    "revenue_trend_by_mounth_by_kpgz_category_id": {**_TREND_BY_KPGZ, "unit": "month"},
+    "revenue_trend_by_weeks_by_kpgz_category_id": {**_TREND_BY_KPGZ, "unit": "week"},
+    "revenue_trend_by_mounth_by_kpgz_category_id_and_region_id": {
+        **_TREND_BY_KPGZ_AND_REGION,
+        "unit": "month",
+    },
+    "revenue_trend_by_weeks_by_kpgz_category_id_and_region_id": {
+        **_TREND_BY_KPGZ_AND_REGION,
+        "unit": "week",
+    },
+}
+
+BUCKET_LABELS = {"month": "YYYY-MM", "week": 'IYYY-"W"IW'}
+
+METRICS = {
+    "herfindahl_hirschman_rate": {
+        "name": "Индекс Херфиндаля-Хиршмана",
+        "unit": "",
+        "sql": """
+WITH per_customer AS (
+    SELECT
+        ks.customer_id,
+        SUM(ks.end_price) FILTER (WHERE ks.end_ks BETWEEN :start_date AND :end_date) AS current,
+        SUM(ks.end_price) FILTER (
+            WHERE ks.end_ks BETWEEN :compare_start_date AND :compare_end_date
+        ) AS previous
+    FROM ks
+    WHERE ks.winner_id = :supplier_id
+      AND (ks.end_ks BETWEEN :start_date AND :end_date
+           OR ks.end_ks BETWEEN :compare_start_date AND :compare_end_date)
+    GROUP BY ks.customer_id
+),
+shares AS (
+    SELECT
+        current / NULLIF(SUM(current) OVER (), 0) * 100 AS current_share,
+        previous / NULLIF(SUM(previous) OVER (), 0) * 100 AS previous_share
+    FROM per_customer
+)
+SELECT
+    ROUND(SUM(POWER(current_share, 2)), 2) AS value,
+    ROUND(SUM(POWER(previous_share, 2)), 2) AS previous_value
+FROM shares
+        """,
+    },
+    # Число КС на рынке за оба периода берется из общего слоя views/market
+    "metric_percentage_wins": {
+        "name": "Доля побед в КС",
+        "unit": "%",
+        "market": True,
+        "sql": """
+SELECT
+    ROUND(
+        COUNT(*) FILTER (WHERE ks.end_ks BETWEEN :start_date AND :end_date) * 100.0
+        / NULLIF(:market, 0),
+        2
+    ) AS value,
+    ROUND(
+        COUNT(*) FILTER (
+            WHERE ks.end_ks BETWEEN :compare_start_date AND :compare_end_date
+        ) * 100.0
+        / NULLIF(:compare_market, 0),
+        2
+    ) AS previous_value
+FROM ks
+WHERE ks.winner_id = :supplier_id
+  AND (ks.end_ks BETWEEN :start_date AND :end_date
+       OR ks.end_ks BETWEEN :compare_start_date AND :compare_end_date)
+        """,
+    },
+    "metric_avg_downgrade_cost": {
+        "name": "Среднее снижение цены",
+        "unit": "%",
+        "sql": """
+SELECT
+    ROUND(AVG((ks.start_price - ks.end_price) / ks.start_price * 100) FILTER (
+        WHERE ks.start_ks BETWEEN :start_date AND :end_date
+    ), 2) AS value,
+    ROUND(AVG((ks.start_price - ks.end_price) / ks.start_price * 100) FILTER (
+        WHERE ks.start_ks BETWEEN :compare_start_date AND :compare_end_date
+    ), 2) AS previous_value
+FROM ks
+WHERE ks.winner_id = :supplier_id
+  AND (ks.start_ks BETWEEN :start_date AND :end_date
+       OR ks.start_ks BETWEEN :compare_start_date AND :compare_end_date)
+        """,
+    },
+    "metric_total_revenue": {
+        "name": "Общая выручка",
+        "unit": "млн. руб.",
+        "sql": """
+SELECT
+    ROUND(SUM(ks.end_price) FILTER (
+        WHERE ks.end_ks BETWEEN :start_date AND :end_date
+    ) / 1000000, 2) AS value,
+    ROUND(SUM(ks.end_price) FILTER (
+        WHERE ks.end_ks BETWEEN :compare_start_date AND :compare_end_date
+    ) / 1000000, 2) AS previous_value
+FROM ks
+WHERE ks.winner_id = :supplier_id
+  AND (ks.end_ks BETWEEN :start_date AND :end_date
+       OR ks.end_ks BETWEEN :compare_start_date AND :compare_end_date)
+        """,
+    },
+}
+
+
+def comparison_period(
+    compare_start_date: str | None = None, compare_end_date: str | None = None
+):
+    if compare_start_date is None and compare_end_date is None:
+        return None
+    if compare_start_date is None or compare_end_date is None:
+        raise HTTPException(
+            status_code=422,
+            detail="Нужно указать compare_start_date и compare_end_date",
+        )
+    return compare_start_date, compare_end_date
+
+
+ComparisonDep = Annotated[tuple[str, str] | None, Depends(comparison_period)]
+
+
+def _delta(current, previous):
+    if current is None or previous is None:
+        return None
+    return current - previous
+
+
+def _where(spec: dict):
+    periods = "({} OR {})".format(
+        spec["period"].format(**CURRENT), spec["period"].format(**PREVIOUS)
+    )
+    return " AND ".join([periods, *spec["filters"]])
+
+
+def chart_sql(spec: dict, limit: bool):
+    scale = f" / {spec['scale']}" if spec.get("scale") else ""
+    return f"""
+SELECT
+    label,
+    current,
+    previous,
+    COALESCE(current, 0) - COALESCE(previous, 0) AS delta,
+    ROUND(current / NULLIF(SUM(current) OVER (), 0) * 100, 2) AS share,
+    RANK() OVER (ORDER BY previous DESC NULLS LAST) AS previous_rank
+FROM (
+    SELECT
+        {spec["label"]} AS label,
+        SUM({spec["value"]}) FILTER (WHERE {spec["period"].format(**CURRENT)}){scale} AS current,
+        SUM({spec["value"]}) FILTER (WHERE {spec["period"].format(**PREVIOUS)}){scale} AS previous
+    FROM {spec["source"]}
+    WHERE {_where(spec)}
+    GROUP BY {spec["label"]}
+) AS agg
+ORDER BY current DESC NULLS LAST
+{"LIMIT :limit" if limit else ""}
+    """
+
+
+def trend_sql(spec: dict):
+    unit = spec["unit"]
+    current = f"{spec['date']} BETWEEN :start_date AND :end_date"
+    previous = f"{spec['date']} BETWEEN :compare_start_date AND :compare_end_date"
+    # Прошлый период сдвигается на целое число месяцев/недель,
+    # чтобы его точки легли на корзины текущего
+    bucket = (
+        f"date_trunc('{unit}', CASE WHEN {current} THEN {spec['date']} "
+        f"ELSE {spec['date']} + make_interval({unit}s => :shift) END)"
+    )
+    return f"""
+WITH buckets AS (
+  SELECT generate_series(
+    date_trunc('{unit}', CAST(:start_date AS timestamp)),
+    date_trunc('{unit}', CAST(:end_date AS timestamp)),
+    interval '1 {unit}'
+  ) AS bucket
+),
+agg AS (
+  SELECT
+    {bucket} AS bucket,
+    SUM({spec["value"]}) FILTER (WHERE {current}) AS current,
+    SUM({spec["value"]}) FILTER (WHERE {previous}) AS previous
+  FROM {spec["source"]}
+  WHERE ({current} OR {previous})
+    AND {" AND ".join(spec["filters"])}
+  GROUP BY 1
+)
+SELECT
+  to_char(b.bucket, '{BUCKET_LABELS[unit]}') AS label,
+  COALESCE(a.current, 0) AS current,
+  COALESCE(a.previous, 0) AS previous,
+  COALESCE(a.current, 0) - COALESCE(a.previous, 0) AS delta
+FROM buckets b
+LEFT JOIN agg a ON a.bucket = b.bucket
+ORDER BY b.bucket
+    """
+
+
+async def compare(
+    name: str,
+    compare_period: tuple[str, str],
+    db: SessionDep,
+    start_date: str,
+    end_date: str,
+    **params,
+):
+    """
+    Показатель или график сразу за текущий и сравниваемый периоды
+    одним проходом по данным
+    """
+    params = {
+        **params,
+        "start_date": parse_date(start_date),
+        "end_date": parse_date(end_date),
+        "compare_start_date": parse_date(compare_period[0]),
+        "compare_end_date": parse_date(compare_period[1]),
+    }
+
+    if name in METRICS:
+        metric = METRICS[name]
+        if metric.get("market"):
+            params["market"] = await market_views.auction_count(
+                db, start_date, end_date
+            )
+            params["compare_market"] = await market_views.auction_count(
+                db, *compare_period
+            )
+        row = (await db.execute(text(metric["sql"]), params)).mappings().first()
+        return {
+            "name": metric["name"],
+            "value": row["value"],
+            "previous_value": row["previous_value"],
+            "delta": _delta(row["value"], row["previous_value"]),
+            "unit": metric["unit"],
+        }
+
+    if name in TRENDS:
+        spec = TRENDS[name]
+        between = months_between if spec["unit"] == "month" else weeks_between
+        params["shift"] = between(params["compare_start_date"], params["start_date"])
+        result = await db.execute(text(trend_sql(spec)), params)
+        return [dict(row) for row in result.mappings()]
+
+    params = tuple(sorted(params.items()))
+    if not any(":supplier_id" in where for where in CHARTS[name]["filters"]):
+        # Графики рынка одинаковы для всех поставщиков
+        return await market_views.shared(db, f"compare:{name}", _chart, name, params)
+    return await _chart(name, params, db)
+
+
+async def _chart(name: str, params: tuple, db: SessionDep):
+    params = dict(params)
+    result = await db.execute(text(chart_sql(CHARTS[name], "limit" in params)), params)
+    return [dict(row) for row in result.mappings()]
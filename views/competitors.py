@@ -0,0 +1,136 @@
+from typing import Literal, get_args
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from database import SessionDep
+import views.market as market_views
+import views.timeseries as timeseries_views
+from views.periods import parse_date
+
+Measure = Literal[
+    "total_revenue",
+    "percentage_wins",
+    "avg_downgrade_cost",
+    "herfindahl_hirschman_rate",
+    "auctions",
+]
+MEASURES = list(get_args(Measure))
+
+MAX_SUPPLIERS = 200
+
+# Показатели всех выбранных поставщиков одним проходом по их КС;
+# формулы те же, что у метрик в views/utils
+COMPETITORS = """
+WITH supplier_ks AS (
+    SELECT
+        ks.winner_id,
+        ks.customer_id,
+        ks.start_price,
+        ks.end_price,
+        ks.end_ks BETWEEN :start_date AND :end_date AS ended,
+        ks.start_ks BETWEEN :start_date AND :end_date AS started
+    FROM ks
+    WHERE ks.winner_id = ANY(:supplier_ids)
+      AND (ks.end_ks BETWEEN :start_date AND :end_date
+           OR ks.start_ks BETWEEN :start_date AND :end_date)
+),
+totals AS (
+    SELECT
+        winner_id,
+        COUNT(*) FILTER (WHERE ended) AS auctions,
+        ROUND(SUM(end_price) FILTER (WHERE ended) / 1000000, 2) AS total_revenue,
+        ROUND(
+            AVG((start_price - end_price) / start_price * 100) FILTER (WHERE started),
+            2
+        ) AS avg_downgrade_cost
+    FROM supplier_ks
+    GROUP BY winner_id
+),
+shares AS (
+    -- Как в herfindahl_hirschman_rate: КС заказчиков, которых нет
+    -- в справочнике, в доли не входят
+    SELECT
+        ks.winner_id,
+        SUM(ks.end_price)
+            / NULLIF(SUM(SUM(ks.end_price)) OVER (PARTITION BY ks.winner_id), 0)
+            * 100 AS share
+    FROM supplier_ks ks
+    JOIN customers c ON c.id = ks.customer_id
+    WHERE ks.ended
+    GROUP BY ks.winner_id, ks.customer_id
+),
+hhi AS (
+    SELECT winner_id, ROUND(SUM(POWER(share, 2)), 2) AS herfindahl_hirschman_rate
+    FROM shares
+    GROUP BY winner_id
+)
+SELECT
+    s.id AS supplier_id,
+    s.name,
+    t.total_revenue,
+    ROUND(COALESCE(t.auctions, 0) * 100.0 / NULLIF(:market, 0), 2) AS percentage_wins,
+    t.avg_downgrade_cost,
+    h.herfindahl_hirschman_rate,
+    COALESCE(t.auctions, 0) AS auctions
+FROM suppliers s
+LEFT JOIN totals t ON t.winner_id = s.id
+LEFT JOIN hhi h ON h.winner_id = s.id
+WHERE s.id = ANY(:supplier_ids)
+"""
+
+
+async def compare(
+    db: SessionDep,
+    supplier_ids: list[int],
+    start_date: str,
+    end_date: str,
+    measures: list[str] | None = None,
+    trend: timeseries_views.Bucket | None = None,
+):
+    """
+    Матрица поставщик × показатель и, по желанию, ряды выручки каждого
+    поставщика — без отдельного запроса на каждого
+    """
+    supplier_ids = list(dict.fromkeys(supplier_ids))
+    if len(supplier_ids) > MAX_SUPPLIERS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Можно сравнить не более {MAX_SUPPLIERS} поставщиков",
+        )
+    measures = measures or MEASURES
+
+    result = await db.execute(
+        text(COMPETITORS),
+        {
+            "supplier_ids": supplier_ids,
+            "start_date": parse_date(start_date),
+            "end_date": parse_date(end_date),
+            "market": await market_views.auction_count(db, start_date, end_date),
+        },
+    )
+    rows = {row["supplier_id"]: row for row in result.mappings()}
+
+    response = {
+        "measures": measures,
+        "suppliers": [
+            {
+                "supplier_id": supplier_id,
+                "name": rows[supplier_id]["name"],
+                **{measure: rows[supplier_id][measure] for measure in measures},
+            }
+            for supplier_id in supplier_ids
+            if supplier_id in rows
+        ],
+    }
+    if trend:
+        response["trend"] = await timeseries_views.timeseries(
+            db,
+            start_date,
+            end_date,
+            bucket=trend,
+            supplier_ids=supplier_ids,
+            split_by="supplier",
+            series_limit=None,
+        )
+    return response
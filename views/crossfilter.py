@@ -0,0 +1,86 @@
+from sqlalchemy import text
+
+from database import SessionDep
+from views.periods import parse_date
+
+# Все разбивки графиков 2 и 4 за один проход: каждая учитывает фильтры
+# по остальным измерениям, но не по своему (регионы — по выбранной
+# категории, категории — по выбранному региону, заказчики — по обоим)
+CROSSFILTER = """
+SELECT
+    CASE
+        WHEN GROUPING(r.name) = 0 THEN 'regions'
+        WHEN GROUPING(kc.code) = 0 THEN 'kpgz_categories'
+        ELSE 'customers'
+    END AS breakdown,
+    COALESCE(r.name, kc.code, c.name) AS label,
+    CASE
+        WHEN GROUPING(r.name) = 0
+            THEN SUM(o.count * o.oferta_price) FILTER (WHERE {kpgz_category})
+        WHEN GROUPING(kc.code) = 0
+            THEN SUM(o.count * o.oferta_price) FILTER (WHERE {region})
+        ELSE SUM(o.count * o.oferta_price) FILTER (WHERE {kpgz_category} AND {region})
+    END AS revenue
+FROM ks
+JOIN orders o ON ks.id_ks = o.id_ks
+JOIN customers c ON ks.customer_id = c.id
+JOIN regions r ON c.region_id = r.id
+LEFT JOIN cte ON o.id_cte = cte.id
+LEFT JOIN kpgz_details kd ON cte.kpgz_id = kd.id
+LEFT JOIN kpgz_categories kc ON kd.parent_id = kc.id
+WHERE ks.winner_id = :supplier_id
+  AND ks.end_ks BETWEEN :start_date AND :end_date
+GROUP BY GROUPING SETS ((r.name), (kc.code), (c.name))
+"""
+
+COLUMNS = {
+    "regions": "region_name",
+    "kpgz_categories": "kpgz_category",
+    "customers": "customer_name",
+}
+
+
+async def crossfilter(
+    db: SessionDep,
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    region_id: int | None = None,
+    kpgz_category_id: int | None = None,
+    limit: int = 10,
+):
+    """
+    Разбивки по регионам, категориям КПГЗ и топ заказчиков для текущего
+    состояния фильтров одним запросом
+    """
+    params = {
+        "supplier_id": supplier_id,
+        "start_date": parse_date(start_date),
+        "end_date": parse_date(end_date),
+    }
+    filters = {"region": "TRUE", "kpgz_category": "TRUE"}
+    if region_id is not None:
+        params["region_id"] = region_id
+        filters["region"] = "c.region_id = :region_id"
+    if kpgz_category_id is not None:
+        params["kpgz_category_id"] = kpgz_category_id
+        filters["kpgz_category"] = "kc.id = :kpgz_category_id"
+
+    result = await db.execute(text(CROSSFILTER.format(**filters)), params)
+
+    response = {breakdown: [] for breakdown in COLUMNS}
+    for row in result.mappings():
+        # NULL — строки группы не прошли фильтр или у позиции нет КПГЗ
+        if row["label"] is None or row["revenue"] is None:
+            continue
+        response[row["breakdown"]].append(
+            {COLUMNS[row["breakdown"]]: row["label"], "revenue": row["revenue"]}
+        )
+
+    for rows in response.values():
+        rows.sort(key=lambda row: row["revenue"], reverse=True)
+    response["customers"] = response["customers"][:limit]
+    return {
+        "filters": {"region_id": region_id, "kpgz_category_id": kpgz_category_id},
+        **response,
+    }
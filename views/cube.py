@@ -0,0 +1,333 @@
+import asyncio
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database import SessionDep
+import views.data_version as data_version_views
+from views.periods import parse_date
+
+load_dotenv()
+
+# Графики рынка не зависят от пользователя, поэтому по умолчанию
+# отдаются из куба; MARKET_CUBE=0 возвращает прямые SQL-запросы
+MARKET_CUBE = os.getenv("MARKET_CUBE", "1") == "1"
+
+FACTS = """
+SELECT
+    ks.start_ks,
+    c.region_id AS customer_region_id,
+    s.region_id AS supplier_region_id,
+    kc.id AS kpgz_category_id,
+    kd.code || ' ' || kd.name AS kpgz_detail_name,
+    SUM(o.count * o.oferta_price) AS revenue
+FROM orders o
+JOIN ks ON o.id_ks = ks.id_ks
+LEFT JOIN customers c ON ks.customer_id = c.id
+LEFT JOIN suppliers s ON ks.winner_id = s.id
+JOIN cte ON o.id_cte = cte.id
+JOIN kpgz_details kd ON cte.kpgz_id = kd.id
+JOIN kpgz_categories kc ON kd.parent_id = kc.id
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def _microseconds(value):
+    return np.datetime64(value, "us").astype(np.int64)
+
+
+def _month(microseconds):
+    return int(
+        np.datetime64(int(microseconds), "us").astype("datetime64[M]").astype(np.int64)
+    )
+
+
+def _month_start(month: int):
+    return np.datetime64(int(month), "M").astype("datetime64[us]").astype(np.int64)
+
+
+def _encode(values):
+    # Коды в порядке первого появления, None допустим как обычное значение
+    names = {}
+    codes = [names.setdefault(value, len(names)) for value in values]
+    return list(names), np.array(codes, dtype=np.int32)
+
+
+def _positions(sorted_ids, ids, missing: int):
+    # Позиция id в справочнике; отсутствующие (NULL) попадают в ячейку missing
+    if not len(sorted_ids):
+        return np.full(len(ids), missing, dtype=np.int32)
+    ids = np.array([-1 if value is None else value for value in ids], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, positions, missing).astype(np.int32)
+
+
+class MarketCube:
+    """
+    Плотный куб выручки регион × укрупненная категория КПГЗ × месяц
+    (отдельно по региону заказчика и региону поставщика).
+
+    Полные месяцы периода берутся из куба, неполные крайние месяцы
+    досчитываются по фактам, отсортированным по start_ks, поэтому
+    ответ совпадает с SQL для любых дат, а не только для границ месяцев
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+
+    async def build(self, db: SessionDep):
+        regions = (
+            await db.execute(text("SELECT id, name FROM regions ORDER BY id"))
+        ).all()
+        categories = (
+            await db.execute(text("SELECT id, code FROM kpgz_categories ORDER BY id"))
+        ).all()
+        facts = (await db.execute(text(FACTS))).all()
+        # Построение куба — чистый CPU, event loop в это время свободен
+        await asyncio.to_thread(self._build, regions, categories, facts)
+        return self
+
+    def _build(self, regions, categories, facts):
+        self.region_ids = np.array([row[0] for row in regions], dtype=np.int64)
+        self.region_names, self.region_name_codes = _encode([row[1] for row in regions])
+
+        self.category_ids = np.array([row[0] for row in categories], dtype=np.int64)
+        self.category_codes, self.category_code_codes = _encode(
+            [row[1] for row in categories]
+        )
+
+        no_region = len(self.region_ids)
+        ts = np.array([row[0] for row in facts], dtype="datetime64[us]").astype(
+            np.int64
+        )
+        customer_region = _positions(
+            self.region_ids, [row[1] for row in facts], no_region
+        )
+        supplier_region = _positions(
+            self.region_ids, [row[2] for row in facts], no_region
+        )
+        category = _positions(self.category_ids, [row[3] for row in facts], 0)
+        self.detail_names, detail = _encode([row[4] for row in facts])
+        revenue = np.nan_to_num(np.array([row[5] for row in facts], dtype=np.float64))
+
+        months = ts.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)
+        self.first_month = int(months.min()) if len(months) else 0
+        month = months - self.first_month
+        shape = (
+            no_region + 1,
+            len(self.category_ids),
+            int(month.max()) + 1 if len(month) else 0,
+        )
+
+        self.revenue = np.zeros(shape)
+        self.rows = np.zeros(shape, dtype=np.int32)
+        np.add.at(self.revenue, (customer_region, category, month), revenue)
+        np.add.at(self.rows, (customer_region, category, month), 1)
+        self.supplier_revenue = np.zeros(shape)
+        self.supplier_rows = np.zeros(shape, dtype=np.int32)
+        np.add.at(self.supplier_revenue, (supplier_region, category, month), revenue)
+        np.add.at(self.supplier_rows, (supplier_region, category, month), 1)
+
+        # Факты по времени — для неполных месяцев
+        by_time = np.argsort(ts, kind="stable")
+        self.ts = ts[by_time]
+        self.customer_region = customer_region[by_time]
+        self.supplier_region = supplier_region[by_time]
+        self.category = category[by_time]
+        self.fact_revenue = revenue[by_time]
+
+        # Факты по (регион заказчика, категория, время) — для детальных КПГЗ
+        by_block = np.lexsort((ts, category, customer_region))
+        self.block_key = (
+            customer_region[by_block].astype(np.int64) * len(self.category_ids)
+            + category[by_block]
+        )
+        self.block_ts = ts[by_block]
+        self.block_detail = detail[by_block]
+        self.block_revenue = revenue[by_block]
+
+    # ------------------------------------------------------------------
+
+    def _region(self, region_id: int):
+        position = np.searchsorted(self.region_ids, region_id)
+        if position < len(self.region_ids) and self.region_ids[position] == region_id:
+            return int(position)
+        return None
+
+    def _category(self, kpgz_category_id: int):
+        position = np.searchsorted(self.category_ids, kpgz_category_id)
+        if (
+            position < len(self.category_ids)
+            and self.category_ids[position] == kpgz_category_id
+        ):
+            return int(position)
+        return None
+
+    def _period(self, start_date: str, end_date: str):
+        """
+        Полные месяцы [first, last] в координатах куба и крайние
+        интервалы, которые считаются по фактам
+        """
+        start = _microseconds(parse_date(start_date))
+        end = _microseconds(parse_date(end_date))
+        start_month, end_month = _month(start), _month(end)
+
+        first = start_month if _month_start(start_month) == start else start_month + 1
+        last = end_month - 1
+        if first > last:
+            return None, [(start, end)]
+        edges = [(start, _month_start(first) - 1), (_month_start(last + 1), end)]
+        return (first - self.first_month, last - self.first_month), edges
+
+    def _totals(self, start_date: str, end_date: str, supplier: bool = False):
+        """
+        Выручка и число строк по (регион, категория) за период
+        """
+        revenue = self.supplier_revenue if supplier else self.revenue
+        rows = self.supplier_rows if supplier else self.rows
+        months, edges = self._period(start_date, end_date)
+
+        first, last = (0, -1) if months is None else months
+        first, last = max(first, 0), min(last, revenue.shape[2] - 1)
+        if first > last:
+            totals = np.zeros(revenue.shape[:2])
+            counts = np.zeros(revenue.shape[:2], dtype=np.int64)
+        else:
+            totals = revenue[:, :, first : last + 1].sum(axis=2)
+            counts = rows[:, :, first : last + 1].sum(axis=2).astype(np.int64)
+
+        region = self.supplier_region if supplier else self.customer_region
+        for start, end in edges:
+            window = slice(
+                np.searchsorted(self.ts, start, side="left"),
+                np.searchsorted(self.ts, end, side="right"),
+            )
+            cells = (region[window], self.category[window])
+            np.add.at(totals, cells, self.fact_revenue[window])
+            np.add.at(counts, cells, 1)
+
+        return totals, counts
+
+    @staticmethod
+    def _top(names, codes, totals, counts, columns: tuple[str, str], limit: int):
+        # Группировка по подписи (как GROUP BY name в SQL) и топ по убыванию
+        grouped = np.bincount(codes, weights=totals, minlength=len(names))
+        present = np.flatnonzero(
+            np.bincount(codes, weights=counts, minlength=len(names)) > 0
+        )
+        present = present[np.argsort(-grouped[present], kind="stable")][:limit]
+        label, value = columns
+        return [
+            {label: names[position], value: float(grouped[position] / 1000000)}
+            for position in present
+        ]
+
+    # ------------------------------------------------------------------
+
+    def total_revenue_by_kpgz_category(
+        self, start_date: str, end_date: str, limit: int
+    ):
+        totals, counts = self._totals(start_date, end_date)
+        return self._top(
+            self.category_codes,
+            self.category_code_codes,
+            totals.sum(axis=0),
+            counts.sum(axis=0),
+            ("aggregated_kpgz", "total_revenue"),
+            limit,
+        )
+
+    def total_revenue_by_kpgz_category_by_region_id(
+        self, start_date: str, end_date: str, region_id: int, limit: int
+    ):
+        region = self._region(region_id)
+        if region is None:
+            return []
+        totals, counts = self._totals(start_date, end_date)
+        return self._top(
+            self.category_codes,
+            self.category_code_codes,
+            totals[region],
+            counts[region],
+            ("category_name", "revenue"),
+            limit,
+        )
+
+    def total_revenue_by_regions_by_kpgz_category_id(
+        self, start_date: str, end_date: str, kpgz_category_id: int, limit: int
+    ):
+        # Исходный запрос группирует по региону поставщика, а не заказчика
+        category = self._category(kpgz_category_id)
+        if category is None:
+            return []
+        totals, counts = self._totals(start_date, end_date, supplier=True)
+        return self._top(
+            self.region_names,
+            self.region_name_codes,
+            totals[:-1, category],
+            counts[:-1, category],
+            ("region", "total_revenue"),
+            limit,
+        )
+
+    def total_revenue_by_regions_by_kpgz_category_and_region_id(
+        self,
+        start_date: str,
+        end_date: str,
+        kpgz_category_id: int,
+        region_id: int,
+        limit: int,
+    ):
+        region, category = self._region(region_id), self._category(kpgz_category_id)
+        if region is None or category is None:
+            return []
+
+        key = region * len(self.category_ids) + category
+        block = slice(
+            np.searchsorted(self.block_key, key, side="left"),
+            np.searchsorted(self.block_key, key, side="right"),
+        )
+        ts = self.block_ts[block]
+        window = slice(
+            np.searchsorted(ts, _microseconds(parse_date(start_date)), side="left"),
+            np.searchsorted(ts, _microseconds(parse_date(end_date)), side="right"),
+        )
+        details = self.block_detail[block][window]
+        revenue = self.block_revenue[block][window]
+
+        codes = np.arange(len(self.detail_names), dtype=np.int32)
+        return self._top(
+            self.detail_names,
+            codes,
+            np.bincount(details, weights=revenue, minlength=len(codes)),
+            np.bincount(details, minlength=len(codes)),
+            ("detailed_kpgz_name", "revenue"),
+            limit,
+        )
+
+
+_cube: MarketCube | None = None
+_lock = asyncio.Lock()
+
+
+async def get_cube(db: SessionDep):
+    """
+    Куб для текущей версии данных; после загрузки данных перестраивается
+    """
+    global _cube
+    if not MARKET_CUBE or data_version_views.sql_only.get():
+        return None
+
+    version = await data_version_views.current(db)
+    if _cube is not None and _cube.version == version:
+        return _cube
+    if _lock.locked():
+        # Куб уже строит другой запрос: этот пока обслужит SQL
+        return None
+
+    async with _lock:
+        if _cube is None or _cube.version != version:
+            _cube = await MarketCube(version).build(db)
+    return _cube
@@ -9,9 +9,12 @@ from models import (
 )
 from sqlalchemy import select
 import schemas.dashboards as DashboardSchema
-import views.users as user_views
 import views.utils as util_views
 
+# Период метрик и главного графика на карточке дашборда
+DEFAULT_START_DATE = "2022-01-01"
+DEFAULT_END_DATE = "2025-01-01"
+
 
 async def get_by_id(db: SessionDep, dashboard_id: int):
     query = select(DashboardModel).where(DashboardModel.id == dashboard_id)
@@ -19,6 +22,30 @@ async def get_by_id(db: SessionDep, dashboard_id: int):
     return result.scalars().first()
 
 
+async def can_read(db: SessionDep, dashboard_id: int, user_id: int):
+    """
+    Дашборд доступен владельцу и подписчикам; None, если дашборда нет
+    """
+    owner_id = (
+        await db.execute(
+            select(DashboardModel.owner_id).where(DashboardModel.id == dashboard_id)
+        )
+    ).scalar()
+    if owner_id is None:
+        return None
+    if owner_id == user_id:
+        return True
+    subscription = await db.execute(
+        select(DashboardSubscriptionModel.id)
+        .where(
+            DashboardSubscriptionModel.dashboard_id == dashboard_id,
+            DashboardSubscriptionModel.user_id == user_id,
+        )
+        .limit(1)
+    )
+    return subscription.scalar() is not None
+
+
 async def get_all(db: SessionDep):
     query = select(DashboardModel)
     result = await db.execute(query)
@@ -56,19 +83,19 @@ async def create(db: SessionDep, dashboard: DashboardSchema.Create):
     subscribers = (await db.execute(query)).scalars().all()
 
     metric_1 = await util_views.herfindahl_hirschman_rate(
-        new_dashboard.owner_id, "2022-01-01", "2025-01-01", db
+        new_dashboard.owner_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
     )
 
     metric_2 = await util_views.metric_percentage_wins(
-        new_dashboard.owner_id, "2022-01-01", "2025-01-01", db
+        new_dashboard.owner_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
     )
 
     metric_3 = await util_views.metric_avg_downgrade_cost(
-        new_dashboard.owner_id, "2022-01-01", "2025-01-01", db
+        new_dashboard.owner_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
     )
 
     metric_4 = await util_views.metric_total_revenue(
-        new_dashboard.owner_id, "2022-01-01", "2025-01-01", db
+        new_dashboard.owner_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
     )
 
     return {
@@ -95,8 +122,8 @@ async def create(db: SessionDep, dashboard: DashboardSchema.Create):
             },
         ],
         "filters": [],
-        "main_chart": util_views.revenue_trend_by_mounth(
-            dashboard.owner_id, "2022-01-01", "2025-01-01", db
+        "main_chart": await util_views.revenue_trend_by_mounth(
+            dashboard.owner_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
         ),
     }
 
@@ -141,19 +168,19 @@ async def get_by_owner_id(db: SessionDep, user_id: int):
         subscribers = (await db.execute(query)).scalars().all()
 
         metric_1 = await util_views.herfindahl_hirschman_rate(
-            user_id, "2022-01-01", "2025-01-01", db
+            user_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
         )
 
         metric_2 = await util_views.metric_percentage_wins(
-            user_id, "2022-01-01", "2025-01-01", db
+            user_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
         )
 
         metric_3 = await util_views.metric_avg_downgrade_cost(
-            user_id, "2022-01-01", "2025-01-01", db
+            user_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
         )
 
         metric_4 = await util_views.metric_total_revenue(
-            user_id, "2022-01-01", "2025-01-01", db
+            user_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
         )
 
         result.append(
@@ -181,8 +208,8 @@ async def get_by_owner_id(db: SessionDep, user_id: int):
                     },
                 ],
                 "subscribers": subscribers,
-                "main_chart": util_views.revenue_trend_by_mounth(
-                    user_id, "2022-01-01", "2025-01-01", db
+                "main_chart": await util_views.revenue_trend_by_mounth(
+                    user_id, DEFAULT_START_DATE, DEFAULT_END_DATE, db
                 ),
             }
         )
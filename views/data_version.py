@@ -0,0 +1,78 @@
+import contextvars
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+
+from database import SessionDep, engine, replica_engine
+from models import DataVersionModel
+
+load_dotenv()
+
+# Как часто перечитывать версию из базы (другие воркеры тоже могут ее менять)
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", 5))
+
+# Сверки с SQL (views/columnar.oracle) выставляют флаг, и запросы идут
+# мимо всех структур, построенных по версии данных
+sql_only = contextvars.ContextVar("sql_only", default=False)
+
+# Движок (основная база, реплика) -> (версия, когда проверена): реплика
+# может еще не дойти до версии основной базы, и кэши, построенные по ее
+# данным, не должны получить новую версию
+_versions: dict = {}
+
+
+def _fresh(entry):
+    if entry is not None and time.monotonic() - entry[1] < DATA_VERSION_TTL:
+        return entry[0]
+    return None
+
+
+def cached():
+    """
+    Версия без обращения к базе, если она проверялась не раньше чем
+    DATA_VERSION_TTL назад и одинакова во всех базах, иначе None
+    """
+    binds = [engine] if replica_engine is None else [engine, replica_engine]
+    versions = {_fresh(_versions.get(bind)) for bind in binds}
+    if len(versions) == 1:
+        return versions.pop()
+    return None
+
+
+async def current(db: SessionDep):
+    """
+    Версия данных ks/orders/...: меняется только после загрузки данных,
+    используется как часть ключей кэшей аналитики. Читается из той базы,
+    с которой работает сессия db
+    """
+    version = _fresh(_versions.get(db.bind))
+    if version is not None:
+        return version
+
+    result = await db.execute(
+        select(DataVersionModel.version).where(DataVersionModel.id == 1)
+    )
+    version = result.scalar() or 0
+    _versions[db.bind] = (version, time.monotonic())
+    return version
+
+
+async def bump(db: SessionDep):
+    result = await db.execute(
+        update(DataVersionModel)
+        .where(DataVersionModel.id == 1)
+        .values(version=DataVersionModel.version + 1)
+        .returning(DataVersionModel.version)
+    )
+    version = result.scalar()
+    if version is None:
+        version = 1
+        db.add(DataVersionModel(id=1, version=version))
+    await db.commit()
+
+    # Не запоминаем: реплика может еще не дойти до новой версии, — версия
+    # перечитывается из каждой базы при следующем запросе к ней
+    _versions.clear()
+    return version
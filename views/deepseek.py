@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from cache import LRUCache
+
+load_dotenv()
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate/")
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:32b")
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 60 * 60))
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", 256))
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", 10000))
+
+
+def cache_key(model: str, prompt: str, options: dict | None = None):
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "options": options or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов LLM: LRU в памяти процесса и SQLite на диске,
+    который переживает перезапуск приложения
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl: int = LLM_CACHE_TTL,
+        memory_size: int = LLM_CACHE_MEMORY_SIZE,
+        disk_size: int = LLM_CACHE_DISK_SIZE,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.disk_size = disk_size
+        self.memory = LRUCache(maxsize=memory_size, ttl=ttl)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_responses_created_at "
+                "ON llm_responses (created_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _disk_get(self, key: str):
+        with self._lock:
+            return self._disk_get_locked(key)
+
+    def _disk_get_locked(self, key: str):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        response, created_at = row
+        if created_at + self.ttl <= time.time():
+            conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        return response
+
+    def _disk_set(self, key: str, response: str):
+        with self._lock:
+            self._disk_set_locked(key, response)
+
+    def _disk_set_locked(self, key: str, response: str):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, response, created_at) "
+            "VALUES (?, ?, ?)",
+            (key, response, time.time()),
+        )
+        # Удаляем просроченные записи и самые старые сверх лимита
+        conn.execute(
+            "DELETE FROM llm_responses WHERE created_at <= ?",
+            (time.time() - self.ttl,),
+        )
+        conn.execute(
+            """
+DELETE FROM llm_responses WHERE key IN (
+    SELECT key FROM llm_responses ORDER BY created_at DESC LIMIT -1 OFFSET ?
+)
+            """,
+            (self.disk_size,),
+        )
+        conn.commit()
+
+    async def get(self, key: str):
+        response = self.memory.get(key)
+        if response is not None:
+            return response
+
+        response = await asyncio.to_thread(self._disk_get, key)
+        if response is not None:
+            self.memory.set(key, response)
+        return response
+
+    async def set(self, key: str, response: str):
+        self.memory.set(key, response)
+        await asyncio.to_thread(self._disk_set, key, response)
+
+
+response_cache = ResponseCache()
+
+
+# Общая сессия на воркер (пул соединений к Ollama): открывается при
+# первом запросе к LLM, закрывается в lifespan приложения
+_http: aiohttp.ClientSession | None = None
+
+
+async def open_session():
+    global _http
+    if _http is None or _http.closed:
+        _http = aiohttp.ClientSession()
+    return _http
+
+
+async def close_session():
+    global _http
+    if _http is not None:
+        await _http.close()
+        _http = None
+
+
+async def _post(session: aiohttp.ClientSession, json_body: dict):
+    async with session.post(OLLAMA_URL, json=json_body) as response:
+        if response.status != 200:
+            raise HTTPException(
+                status_code=response.status, detail=await response.text()
+            )
+        return await response.json()
+
+
+async def generate(
+    prompt: str,
+    model: str | None = None,
+    options: dict | None = None,
+    bypass_cache: bool = False,
+):
+    model = model or DEFAULT_MODEL
+    key = cache_key(model, prompt, options)
+    if not bypass_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    json_body = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+    }
+    if options:
+        json_body["options"] = options
+
+    data = await _post(await open_session(), json_body)
+
+    await response_cache.set(key, data["response"])
+
+    return data["response"]
@@ -0,0 +1,164 @@
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Literal
+
+from sqlalchemy import select, text
+
+from database import SessionDep
+from models import DataVersionModel
+import views.data_version as data_version_views
+from views.periods import buckets, next_bucket, parse_date
+
+Bucket = Literal["month", "quarter", "year"]
+
+# Выручка поставщиков по заказчикам за месяц; этим же запросом
+# заполняется таблица supplier_customer_months. JOIN customers — как
+# в SQL-версии ИХХ и в крайних днях views/ranges
+MONTHS = """
+SELECT
+    ks.winner_id AS supplier_id,
+    c.id AS customer_id,
+    date_trunc('month', ks.end_ks) AS month,
+    SUM(ks.end_price) AS revenue,
+    COUNT(*) AS auctions
+FROM ks
+JOIN customers c ON ks.customer_id = c.id
+WHERE ks.end_ks >= :since
+GROUP BY 1, 2, 3
+"""
+
+# Строка data_versions с версией данных, для которой пересчитана таблица
+POPULATED_ID = 2
+
+# Полные месяцы для views/ranges: вектор выручки по заказчикам
+# берется из таблицы, а не из ks
+MONTHS_SPEC = {
+    "label": "customer_id",
+    "value": "revenue",
+    "source": "supplier_customer_months",
+    "date": "month",
+    "filters": ["supplier_id = :supplier_id"],
+}
+
+
+# Версия данных -> пересчитана ли для нее таблица (только последняя версия)
+_populated: dict[int, bool] = {}
+
+
+async def _version(db: SessionDep, id: int):
+    result = await db.execute(
+        select(DataVersionModel.version).where(DataVersionModel.id == id)
+    )
+    return result.scalar()
+
+
+async def maintained(db: SessionDep, version: int):
+    """
+    Таблицей можно пользоваться, только если она пересчитана для текущей
+    версии данных
+    """
+    if version not in _populated:
+        populated = await _version(db, POPULATED_ID) == version
+        _populated.clear()
+        _populated[version] = populated
+    return _populated[version]
+
+
+async def refresh(db: SessionDep, since: datetime | None = None):
+    """
+    Пересчитывает месяцы начиная с месяца since (все, если не задан или
+    таблица не пересчитана для текущей версии) и отмечает ее готовой для
+    следующей версии. Не фиксирует транзакцию: это делает
+    data_version.bump, так что таблица и версия меняются вместе
+    """
+    current = await _version(db, 1) or 0
+    if since is None or await _version(db, POPULATED_ID) != current:
+        since = datetime.min
+    else:
+        since = datetime(since.year, since.month, 1)
+    await db.execute(
+        text("DELETE FROM supplier_customer_months WHERE month >= :since"),
+        {"since": since},
+    )
+    await db.execute(
+        text(
+            f"""
+INSERT INTO supplier_customer_months (supplier_id, customer_id, month, revenue, auctions)
+{MONTHS}
+            """
+        ),
+        {"since": since},
+    )
+    await db.execute(
+        text(
+            """
+INSERT INTO data_versions (id, version, updated_at)
+VALUES (:id, :version, now())
+ON CONFLICT (id) DO UPDATE
+SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at
+            """
+        ),
+        {"id": POPULATED_ID, "version": current + 1},
+    )
+
+
+def rate(values):
+    """
+    ИХХ по выручке от каждого заказчика: сумма квадратов долей в процентах
+    """
+    values = [value for value in values if value is not None]
+    grand_total = sum(values)
+    if not values or not grand_total:
+        return None
+    return sum((value / grand_total * 100) ** 2 for value in values).quantize(
+        Decimal("0.01"), ROUND_HALF_UP
+    )
+
+
+async def trend(
+    db: SessionDep,
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    bucket: Bucket = "month",
+):
+    """
+    ИХХ поставщика по месяцам/кварталам/годам; корзины берутся целиком,
+    в том числе последняя, в которую попадает end_date
+    """
+    start, end = parse_date(start_date), parse_date(end_date)
+    periods = buckets(start, end, bucket)
+    if not periods:
+        return []
+    lo = datetime.combine(periods[0][0], datetime.min.time())
+    hi = datetime.combine(next_bucket(periods[-1][0], bucket), datetime.min.time())
+    version = await data_version_views.current(db)
+    source = (
+        "supplier_customer_months"
+        if await maintained(db, version)
+        else f"({MONTHS}) AS supplier_customer_months"
+    )
+
+    result = await db.execute(
+        text(
+            f"""
+SELECT
+    date_trunc('{bucket}', month) AS bucket,
+    customer_id,
+    SUM(revenue) AS revenue
+FROM {source}
+WHERE supplier_id = :supplier_id
+  AND month >= :since AND month < :until
+GROUP BY 1, 2
+            """
+        ),
+        {"supplier_id": supplier_id, "since": lo, "until": hi},
+    )
+
+    customers = {}
+    for row in result.mappings():
+        customers.setdefault(row["bucket"].date(), []).append(row["revenue"])
+
+    return [
+        {bucket: label, "value": rate(customers.get(day, []))} for day, label in periods
+    ]
@@ -0,0 +1,129 @@
+import hashlib
+import os
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
+
+from database import read_session
+from responses import representation
+import views.api_keys as api_key_views
+import views.data_version as data_version_views
+
+load_dotenv()
+
+# Ответы аналитики меняются только при загрузке данных: ETag строится
+# из пути, параметров и версии данных, и повторный запрос с If-None-Match
+# получает 304 без выполнения обработчика
+HTTP_CACHE = os.getenv("HTTP_CACHE", "1") == "1"
+# Сколько секунд браузер/прокси может не перепроверять ответ
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 0))
+
+
+def cacheable(request: Request):
+    path = request.url.path
+    return (
+        HTTP_CACHE
+        and request.method in ("GET", "HEAD")
+        # Данные виджетов зависят еще и от настроек дашборда и доступны не
+        # всем: маршрут сам проверяет доступ и строит ETag (validators)
+        and path.startswith("/api/utils/")
+        # Сверка движков — только для ключа администратора: ни общий кэш,
+        # ни 304 без проверки ключа для нее недопустимы
+        and "/verify/" not in path
+    )
+
+
+def etag(request: Request, version: int, *parts):
+    params = "&".join(
+        f"{name}={value}" for name, value in sorted(request.query_params.multi_items())
+    )
+    media_type, _ = representation(request)
+    value = f"{request.url.path}?{params}#{version}#{media_type}"
+    if parts:
+        value += "#" + "#".join(str(part) for part in parts)
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def matches(if_none_match: str | None, tag: str):
+    if not if_none_match:
+        return False
+    # Слабое сравнение: W/ не учитывается
+    tags = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in tags or tag.removeprefix("W/") in tags
+
+
+def cache_control(private: bool = False):
+    # С обязательным ключом ответ нельзя отдавать из общего кэша прокси
+    if api_key_views.API_KEY_REQUIRED_FOR_UTILS:
+        private = True
+    scope = "private" if private else "public"
+    return f"{scope}, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate"
+
+
+def validators(request: Request, version: int, *parts):
+    """
+    ETag и заголовки для маршрута, который сам проверяет доступ: parts —
+    то, от чего ответ зависит помимо пути, параметров и версии данных
+    """
+    tag = etag(request, version, *parts)
+    return tag, {"ETag": tag, "Cache-Control": cache_control(True), "Vary": "Accept"}
+
+
+def not_modified(request: Request, tag: str, headers: dict):
+    if HTTP_CACHE and matches(request.headers.get("If-None-Match"), tag):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+async def _version_and_access(request: Request):
+    """
+    Версия данных и право на ответ без обработчика; с базой — только
+    когда версия или ключ не найдены в кэше процесса
+    """
+    key = request.headers.get(api_key_views.api_key_header.model.name)
+    version = data_version_views.cached()
+    if version is not None and not key and not api_key_views.API_KEY_REQUIRED_FOR_UTILS:
+        return version, True
+
+    async with await read_session() as db:
+        if version is None:
+            version = await data_version_views.current(db)
+        if key:
+            return version, await api_key_views.authenticate(db, key) is not None
+        return version, not api_key_views.API_KEY_REQUIRED_FOR_UTILS
+
+
+class ConditionalGetMiddleware:
+    """
+    304 по If-None-Match для ответов аналитики. Middleware на чистом ASGI:
+    с @app.middleware("http") (BaseHTTPMiddleware) тело ответа уходит
+    дальше потоком (more_body), и CompressionMiddleware его не сжимает
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        if not cacheable(request):
+            return await self.app(scope, receive, send)
+
+        version, allowed = await _version_and_access(request)
+        tag = etag(request, version)
+        headers = {"ETag": tag, "Cache-Control": cache_control(), "Vary": "Accept"}
+
+        if allowed and matches(request.headers.get("If-None-Match"), tag):
+            response = Response(status_code=304, headers=headers)
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from cache import LRUCache
+from database import SessionDep
+import views.data_version as data_version_views
+from views.periods import parse_date
+
+load_dotenv()
+
+# Показатели рынка не зависят от пользователя: считаются один раз на
+# (показатель, период, фильтры, версию данных) и отдаются всем поставщикам
+MARKET_CACHE_SIZE = int(os.getenv("MARKET_CACHE_SIZE", 4096))
+
+_MISSING = object()
+_cache = LRUCache(maxsize=MARKET_CACHE_SIZE)
+_pending: dict[tuple, asyncio.Future] = {}
+
+
+async def shared(db: SessionDep, name: str, compute, *args):
+    """
+    Результат compute(*args, db) из кэша; одновременные одинаковые
+    запросы ждут одно вычисление, а не запускают каждый свое
+    """
+    key = (name, await data_version_views.current(db), args)
+    value = _cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    pending = _pending.get(key)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # Отменили нас самих, а не запрос, который считал значение
+            if not pending.cancelled():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    _pending[key] = future
+    try:
+        value = await compute(*args, db)
+    except BaseException:
+        # Ожидающие посчитают сами и получат ошибку в своем запросе
+        future.cancel()
+        raise
+    finally:
+        if _pending.get(key) is future:
+            del _pending[key]
+
+    _cache.set(key, value)
+    future.set_result(value)
+    return value
+
+
+AUCTION_COUNT = (
+    "SELECT COUNT(*) FROM ks WHERE ks.end_ks BETWEEN :start_date AND :end_date"
+)
+
+
+async def _auction_count(start_date, end_date, db: SessionDep):
+    result = await db.execute(
+        text(AUCTION_COUNT), {"start_date": start_date, "end_date": end_date}
+    )
+    return result.scalar()
+
+
+async def auction_count(db: SessionDep, start_date: str, end_date: str):
+    """
+    Число КС на рынке за период (знаменатель доли побед)
+    """
+    return await shared(
+        db,
+        "auction_count",
+        _auction_count,
+        parse_date(start_date),
+        parse_date(end_date),
+    )
+
+
+def stats():
+    return {**_cache.stats(), "pending": len(_pending)}
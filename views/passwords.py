@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# "process" — хэширование в отдельных процессах (sha256_crypt держит GIL),
+# "thread" — в потоках, если процессы запускать нельзя
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", min(2, os.cpu_count() or 1))
+)
+# Сколько операций может ждать своей очереди, сверх этого отвечаем 503
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 64))
+
+pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+
+
+def _hash(password: str):
+    started = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - started
+
+
+def _verify(plain_password: str, hashed_password: str):
+    started = time.perf_counter()
+    verified = pwd_context.verify(plain_password, hashed_password)
+    return verified, time.perf_counter() - started
+
+
+class Metrics:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def as_dict(self):
+        done = self.completed or 1
+        return {
+            "executor": PASSWORD_HASH_EXECUTOR,
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_size": PASSWORD_HASH_QUEUE,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "avg_run_ms": round(self.run_seconds / done * 1000, 2),
+            "max_run_ms": round(self.max_run_seconds * 1000, 2),
+            "avg_wait_ms": round(self.wait_seconds / done * 1000, 2),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+        }
+
+
+metrics = Metrics()
+_executor: Executor | None = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password"
+            )
+        else:
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run(func, *args):
+    if metrics.in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+        metrics.rejected += 1
+        raise HTTPException(
+            status_code=503, detail="Сервер перегружен, повторите попытку позже"
+        )
+
+    metrics.submitted += 1
+    metrics.in_flight += 1
+    metrics.max_in_flight = max(metrics.max_in_flight, metrics.in_flight)
+    started = time.perf_counter()
+    try:
+        result, run_seconds = await asyncio.get_running_loop().run_in_executor(
+            get_executor(), func, *args
+        )
+    except Exception:
+        metrics.failed += 1
+        raise
+    finally:
+        metrics.in_flight -= 1
+
+    wait_seconds = max(time.perf_counter() - started - run_seconds, 0.0)
+    metrics.completed += 1
+    metrics.run_seconds += run_seconds
+    metrics.max_run_seconds = max(metrics.max_run_seconds, run_seconds)
+    metrics.wait_seconds += wait_seconds
+    metrics.max_wait_seconds = max(metrics.max_wait_seconds, wait_seconds)
+
+    return result
+
+
+async def hash_password(password: str):
+    return await _run(_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str):
+    return await _run(_verify, plain_password, hashed_password)
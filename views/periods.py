@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+
+
+def parse_date(value: str):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Неверный формат даты '{value}', ожидается ГГГГ-ММ-ДД",
+        )
+
+
+def previous_period(start_date: str, end_date: str):
+    """
+    Период той же длины, заканчивающийся накануне start_date: границы
+    в запросах включаются (BETWEEN), поэтому start_date в него не входит
+    """
+    start = date.fromisoformat(start_date[:10])
+    end = date.fromisoformat(end_date[:10])
+    previous_end = start - timedelta(days=1)
+    return (previous_end - (end - start)).isoformat(), previous_end.isoformat()
+
+
+def months_between(start: datetime, end: datetime):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def weeks_between(start: datetime, end: datetime):
+    start_week = start.date().toordinal() - start.weekday()
+    end_week = end.date().toordinal() - end.weekday()
+    return (end_week - start_week) // 7
+
+
+def _bucket_start(day: date, bucket: str):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    if bucket == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    if bucket == "year":
+        return date(day.year, 1, 1)
+    return day
+
+
+def next_bucket(day: date, bucket: str):
+    if bucket in ("day", "week"):
+        return day + timedelta(days=1 if bucket == "day" else 7)
+    month = (
+        day.year * 12 + day.month - 1 + {"month": 1, "quarter": 3, "year": 12}[bucket]
+    )
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def _bucket_label(day: date, bucket: str):
+    # Те же подписи, что to_char() в views/timeseries.BUCKET_LABELS
+    if bucket == "day":
+        return day.isoformat()
+    if bucket == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if bucket == "month":
+        return f"{day.year}-{day.month:02d}"
+    if bucket == "quarter":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return f"{day.year}"
+
+
+def buckets(start: datetime, end: datetime, bucket: str):
+    """
+    Корзины date_trunc(bucket) от start до end: первый день и подпись
+    """
+    result = []
+    day = _bucket_start(start.date(), bucket)
+    while day <= end.date():
+        result.append((day, _bucket_label(day, bucket)))
+        day = next_bucket(day, bucket)
+    return result
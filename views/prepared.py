@@ -0,0 +1,43 @@
+from database import register_statement
+import views.competitors as competitor_views
+import views.crossfilter as crossfilter_views
+import views.hhi as hhi_views
+import views.market as market_views
+import views.ranges as range_views
+from views.comparison import CHARTS, chart_sql
+
+# Запросы с постоянным текстом (параметры — через bind), которые
+# выполняются на каждой загрузке дашборда; DATABASE_PREPARE=1 готовит
+# их на каждом новом соединении пула. Текст должен совпадать с тем, что
+# передается в execute, иначе подготовленный запрос не найдется
+STATEMENTS = {
+    "auction_count": market_views.AUCTION_COUNT,
+    "competitors": competitor_views.COMPETITORS,
+    "crossfilter": crossfilter_views.CROSSFILTER.format(
+        region="TRUE", kpgz_category="TRUE"
+    ),
+    **{
+        f"{name}_compare": chart_sql(
+            spec, range_views.COLUMNS.get(name, (None, None, False))[2]
+        )
+        for name, spec in CHARTS.items()
+        if "period" in spec
+    },
+    **{
+        f"{name}_{part}": range_views.partial_sql(spec, by_month, inclusive)
+        for name, spec in {
+            **{name: CHARTS[name] for name in range_views.COLUMNS},
+            **range_views.METRICS,
+            "supplier_customer_months": hhi_views.MONTHS_SPEC,
+        }.items()
+        for part, by_month, inclusive in (
+            ("months", True, False),
+            ("edge", False, True),
+        )
+    },
+}
+
+
+def register():
+    for name, sql in STATEMENTS.items():
+        register_statement(name, sql)
@@ -0,0 +1,197 @@
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from database import SessionDep
+from models import DashboardModel
+import views.utils as util_views
+from views.periods import previous_period
+
+# Примерная оценка: на кириллице локальная модель тратит ~1 токен на 3 символа
+CHARS_PER_TOKEN = 3
+DEFAULT_TOKEN_BUDGET = 600
+DEFAULT_TOP_N = 5
+
+INSTRUCTION = (
+    "Ты аналитик госзакупок. Кратко (3-5 предложений) объясни поставщику, "
+    "что показывает его дашборд за период, отметь главные изменения "
+    "и дай одну практическую рекомендацию. Данные:"
+)
+
+
+def estimate_tokens(text: str):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _number(value):
+    if value is None:
+        return "н/д"
+    value = Decimal(value)
+    if abs(value) >= 1_000_000:
+        return f"{value / 1_000_000:.2f} млн"
+    if abs(value) >= 1_000:
+        return f"{value / 1_000:.1f} тыс"
+    return f"{value:.2f}"
+
+
+def _pairs(rows):
+    # Строки графиков: первый столбец — подпись, второй — значение
+    return [
+        (str(label), Decimal(value or 0))
+        for label, value in (list(row.values())[:2] for row in rows)
+    ]
+
+
+def _delta(current, previous):
+    if current is None or previous is None:
+        return ""
+    diff = Decimal(current) - Decimal(previous)
+    return f" ({'+' if diff >= 0 else ''}{diff:.2f} к прошлому периоду)"
+
+
+def _scorecard_lines(metrics, previous_metrics):
+    lines = []
+    for metric, previous in zip(metrics, previous_metrics):
+        value = "н/д" if metric["value"] is None else f"{metric['value']}"
+        if metric["unit"]:
+            value = f"{value} {metric['unit']}"
+        lines.append(
+            f"- {metric['name']}: {value}{_delta(metric['value'], previous['value'])}"
+        )
+    return lines
+
+
+def _breakdown_line(title: str, pairs, top_n: int):
+    if not pairs:
+        return f"{title}: нет данных"
+
+    total = sum(value for _, value in pairs)
+    top = pairs[:top_n]
+    parts = [
+        f"{label} {_number(value)}"
+        + (f" ({value / total * 100:.0f}%)" if total else "")
+        for label, value in top
+    ]
+    rest = len(pairs) - len(top)
+    if rest > 0:
+        rest_value = sum(value for _, value in pairs[top_n:])
+        parts.append(f"прочие {rest} — {_number(rest_value)}")
+    return f"{title}: " + "; ".join(parts)
+
+
+def _trend_line(pairs):
+    if not pairs:
+        return "Динамика выручки по месяцам: нет данных"
+
+    values = [value for _, value in pairs]
+    best = max(pairs, key=lambda pair: pair[1])
+    worst = min(pairs, key=lambda pair: pair[1])
+    mean = sum(values) / len(values)
+    empty = sum(1 for value in values if value == 0)
+    change = ""
+    if values[0]:
+        change = (
+            f", последний месяц к первому {(values[-1] / values[0] - 1) * 100:+.0f}%"
+        )
+    return (
+        f"Динамика выручки по месяцам ({len(values)} мес.): "
+        f"в среднем {_number(mean)}, максимум {best[0]} {_number(best[1])}, "
+        f"минимум {worst[0]} {_number(worst[1])}, месяцев без выручки {empty}"
+        f"{change}"
+    )
+
+
+def render_prompt(
+    title: str,
+    start_date: str,
+    end_date: str,
+    metrics,
+    previous_metrics,
+    regions,
+    customers,
+    trend,
+    top_n: int,
+):
+    lines = [
+        INSTRUCTION,
+        f"Дашборд «{title}», период {start_date} — {end_date}.",
+        "Ключевые показатели:",
+        *_scorecard_lines(metrics, previous_metrics),
+        _breakdown_line("Выручка по регионам", regions, top_n),
+        _breakdown_line("Крупнейшие заказчики", customers, top_n),
+        _trend_line(trend),
+    ]
+    return "\n".join(lines)
+
+
+async def build_dashboard_prompt(
+    db: SessionDep,
+    dashboard_id: int,
+    start_date: str,
+    end_date: str,
+    top_n: int = DEFAULT_TOP_N,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+):
+    """
+    Собирает компактный промпт по агрегатам дашборда: показатели с изменением
+    к предыдущему периоду, top-N разбивки и сводная статистика вместо рядов
+    """
+    dashboard = (
+        (
+            await db.execute(
+                select(DashboardModel)
+                .options(selectinload(DashboardModel.owner))
+                .where(DashboardModel.id == dashboard_id)
+            )
+        )
+        .scalars()
+        .first()
+    )
+    if not dashboard:
+        return None
+
+    supplier_id = dashboard.owner.supplier_id
+    prev_start, prev_end = previous_period(start_date, end_date)
+
+    metric_functions = [
+        util_views.herfindahl_hirschman_rate,
+        util_views.metric_percentage_wins,
+        util_views.metric_avg_downgrade_cost,
+        util_views.metric_total_revenue,
+    ]
+    metrics = [
+        await func(supplier_id, start_date, end_date, db) for func in metric_functions
+    ]
+    previous_metrics = [
+        await func(supplier_id, prev_start, prev_end, db) for func in metric_functions
+    ]
+
+    regions = _pairs(
+        await util_views.revenue_by_regions(supplier_id, start_date, end_date, db)
+    )
+    customers = _pairs(
+        await util_views.revenue_by_customers(
+            supplier_id, start_date, end_date, top_n, db
+        )
+    )
+    trend = _pairs(
+        await util_views.revenue_trend_by_mounth(supplier_id, start_date, end_date, db)
+    )
+
+    # Сокращаем разбивки, пока промпт не уложится в бюджет токенов
+    while True:
+        prompt = render_prompt(
+            dashboard.title,
+            start_date,
+            end_date,
+            metrics,
+            previous_metrics,
+            regions,
+            customers,
+            trend,
+            top_n,
+        )
+        if top_n <= 1 or estimate_tokens(prompt) <= token_budget:
+            return prompt
+        top_n -= 1
@@ -0,0 +1,246 @@
+import os
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from cache import LRUCache
+from database import SessionDep
+import views.data_version as data_version_views
+import views.hhi as hhi_views
+from views.comparison import CHARTS
+from views.periods import parse_date
+
+load_dotenv()
+
+# Период запроса делится на полные календарные месяцы (их частичные
+# агрегаты кэшируются и общие для всех пользователей) и крайние дни,
+# которые считаются при каждом запросе. RANGE_PLANNER=0 выключает
+RANGE_PLANNER = os.getenv("RANGE_PLANNER", "1") == "1"
+# Агрегат месяца — {подпись: (сумма, количество)}, у разбивок по
+# заказчикам это тысячи строк, поэтому кэш ограничен суммарным числом
+# строк, а не месяцев. Строка (подпись, Decimal, int) занимает около
+# 350 байт: 100000 строк — порядка 35 МБ на каждый процесс-воркер
+RANGE_CACHE_ROWS = int(os.getenv("RANGE_CACHE_ROWS", 100000))
+
+_partials = LRUCache(maxsize=RANGE_CACHE_ROWS, weigh=lambda part: len(part) + 1)
+
+# Подписи столбцов и наличие LIMIT — как в соответствующих функциях views/utils
+COLUMNS = {
+    "revenue_by_regions": ("region_name", "revenue", False),
+    "revenue_by_kpgz_category_by_region_id": ("kpgz_category", "total_revenue", True),
+    "revenue_by_kpgz_category_by_kpgz_category_id": ("name", "total_revenue", True),
+    "revenue_by_customers": ("customer_name", "total_revenue", True),
+    "revenue_by_customers_by_region_id": ("customer_name", "total_revenue", True),
+    "revenue_by_customers_by_kpgz_id": ("customer_name", "total_revenue", False),
+    "revenue_by_customers_by_region_id_and_kpgz_category_id": (
+        "customer_name",
+        "revenue",
+        True,
+    ),
+}
+
+# Неаддитивные показатели собираются из аддитивных частей: ИХХ — из
+# выручки по каждому заказчику, среднее снижение — из суммы и количества
+METRICS = {
+    "herfindahl_hirschman_rate": {
+        "label": "c.id",
+        "value": "ks.end_price",
+        "source": "ks JOIN customers c ON ks.customer_id = c.id",
+        "date": "ks.end_ks",
+        "filters": ["ks.winner_id = :supplier_id"],
+    },
+    "metric_avg_downgrade_cost": {
+        "label": "NULL",
+        "value": """(CAST(ks.start_price AS numeric) - CAST(ks.end_price AS numeric))
+        / CAST(ks.start_price AS numeric) * 100""",
+        "source": "ks",
+        "date": "ks.start_ks",
+        "filters": ["ks.winner_id = :supplier_id"],
+    },
+}
+
+
+def enabled():
+    return RANGE_PLANNER and not data_version_views.sql_only.get()
+
+
+def _next_month(value: datetime):
+    month = value.year * 12 + value.month
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def plan(start: datetime, end: datetime):
+    """
+    Полные месяцы внутри [start, end] и крайние интервалы
+    (начало, конец, включая ли конец)
+    """
+    if start.tzinfo or end.tzinfo:
+        return [], [(start, end, True)]
+
+    month = datetime(start.year, start.month, 1)
+    if month < start:
+        month = _next_month(month)
+
+    months = []
+    while _next_month(month) <= end:
+        months.append(month)
+        month = _next_month(month)
+    if not months:
+        return [], [(start, end, True)]
+
+    edges = [(_next_month(months[-1]), end, True)]
+    if start < months[0]:
+        edges.insert(0, (start, months[0], False))
+    return months, edges
+
+
+def partial_sql(spec: dict, by_month: bool, inclusive: bool):
+    date = spec["date"]
+    filters = [
+        f"{date} >= :lo",
+        f"{date} {'<=' if inclusive else '<'} :hi",
+        *spec["filters"],
+    ]
+    return f"""
+SELECT
+    {f"date_trunc('month', {date})" if by_month else "NULL"} AS month,
+    {spec["label"]} AS label,
+    SUM({spec["value"]}) AS value,
+    COUNT({spec["value"]}) AS count
+FROM {spec["source"]}
+WHERE {" AND ".join(filters)}
+GROUP BY 1, 2
+    """
+
+
+def _add(total: dict, part: dict):
+    # Как SUM в SQL: NULL только если NULL все слагаемые
+    for label, (value, count) in part.items():
+        current, current_count = total.get(label, (None, 0))
+        if current is None:
+            current = value
+        elif value is not None:
+            current += value
+        total[label] = (current, current_count + count)
+
+
+async def aggregate(
+    db: SessionDep,
+    name: str,
+    spec: dict,
+    start_date: str,
+    end_date: str,
+    months_spec: dict | None = None,
+    **params,
+):
+    """
+    Выручка по подписям за период: {подпись: (сумма, количество)}.
+    months_spec — другой источник для полных месяцев (предрасчитанная таблица)
+    """
+    months, edges = plan(parse_date(start_date), parse_date(end_date))
+    version = await data_version_views.current(db)
+    key = (name, version, tuple(sorted(params.items())))
+
+    total = {}
+    missing = []
+    for month in months:
+        part = _partials.get((*key, month))
+        if part is None:
+            missing.append(month)
+        else:
+            _add(total, part)
+
+    if missing:
+        # Все недостающие месяцы — одним запросом с разбивкой по месяцам
+        parts = {month: {} for month in missing}
+        result = await db.execute(
+            text(partial_sql(months_spec or spec, by_month=True, inclusive=False)),
+            {**params, "lo": missing[0], "hi": _next_month(missing[-1])},
+        )
+        for row in result.mappings():
+            if row["month"] in parts:
+                parts[row["month"]][row["label"]] = (row["value"], row["count"])
+        for month, part in parts.items():
+            _partials.set((*key, month), part)
+            _add(total, part)
+
+    for lo, hi, inclusive in edges:
+        result = await db.execute(
+            text(partial_sql(spec, by_month=False, inclusive=inclusive)),
+            {**params, "lo": lo, "hi": hi},
+        )
+        _add(
+            total,
+            {row["label"]: (row["value"], row["count"]) for row in result.mappings()},
+        )
+
+    return total
+
+
+def _round(value):
+    return None if value is None else value.quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+
+async def chart(
+    db: SessionDep,
+    name: str,
+    start_date: str,
+    end_date: str,
+    limit: int | None = None,
+    **params,
+):
+    total = await aggregate(db, name, CHARTS[name], start_date, end_date, **params)
+    label, value, limited = COLUMNS[name]
+    # ORDER BY ... DESC: NULL в PostgreSQL идут первыми
+    rows = sorted(
+        total.items(),
+        key=lambda item: (item[1][0] is None, item[1][0] or 0),
+        reverse=True,
+    )
+    if limited and limit is not None:
+        rows = rows[:limit]
+    return [{label: key, value: amount} for key, (amount, _) in rows]
+
+
+async def herfindahl_hirschman_rate(
+    db: SessionDep, supplier_id: int, start_date: str, end_date: str
+):
+    name = "herfindahl_hirschman_rate"
+    version = await data_version_views.current(db)
+    total = await aggregate(
+        db,
+        name,
+        METRICS[name],
+        start_date,
+        end_date,
+        months_spec=(
+            hhi_views.MONTHS_SPEC if await hhi_views.maintained(db, version) else None
+        ),
+        supplier_id=supplier_id,
+    )
+    return {
+        "name": "Индекс Херфиндаля-Хиршмана",
+        "value": hhi_views.rate([value for value, _ in total.values()]),
+        "unit": "",
+    }
+
+
+async def metric_avg_downgrade_cost(
+    db: SessionDep, supplier_id: int, start_date: str, end_date: str
+):
+    name = "metric_avg_downgrade_cost"
+    total = await aggregate(
+        db, name, METRICS[name], start_date, end_date, supplier_id=supplier_id
+    )
+    value, count = total.get(None, (None, 0))
+    return {
+        "name": "Среднее снижение цены",
+        "value": _round(value / count) if count else None,
+        "unit": "%",
+    }
+
+
+def stats():
+    return _partials.stats()
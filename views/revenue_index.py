@@ -0,0 +1,231 @@
+import asyncio
+import os
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database import SessionDep
+import views.columnar as columnar_views
+import views.data_version as data_version_views
+from views.periods import buckets, parse_date
+
+load_dotenv()
+
+# Индекс префиксных сумм для запросов с произвольным периодом;
+# REVENUE_INDEX=0 возвращает прямые SQL-запросы
+REVENUE_INDEX = os.getenv("REVENUE_INDEX", "1") == "1"
+
+# Выручка (в копейках) и число КС поставщика по дням; отдельно — часть,
+# пришедшаяся ровно на полночь: BETWEEN '...' AND 'ГГГГ-ММ-ДД' включает только ее
+DAYS = """
+SELECT
+    winner_id,
+    CAST(end_ks AS date) AS day,
+    CAST(COALESCE(SUM(end_price), 0) * 100 AS bigint) AS revenue,
+    CAST(
+        COALESCE(SUM(end_price) FILTER (WHERE end_ks = CAST(end_ks AS date)), 0)
+        * 100 AS bigint
+    ),
+    COUNT(*) AS auctions,
+    COUNT(*) FILTER (WHERE end_ks = CAST(end_ks AS date))
+FROM ks
+GROUP BY 1, 2
+"""
+
+
+def _days(value):
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def _prefix(values):
+    return np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(values)])
+
+
+def _rubles(kopecks):
+    return Decimal(int(kopecks)) / 100
+
+
+class RevenueIndex:
+    """
+    Префиксные суммы выручки и числа КС по дням (end_ks) для каждого
+    поставщика: сумма за любой период — разность двух значений,
+    найденных бинарным поиском, независимо от длины периода.
+
+    Хранятся только дни с КС: записи отсортированы по (поставщик, день),
+    поставщику соответствует непрерывный срез
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+
+    async def build(self, db: SessionDep):
+        rows = (await db.execute(text(DAYS))).all()
+        # Сортировка и префиксные суммы — чистый CPU, event loop в это время свободен
+        await asyncio.to_thread(self._build, rows)
+        return self
+
+    def _build(self, rows):
+        # Суммы целочисленные (копейки), чтобы округление совпадало с SQL
+        entries = [
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype="datetime64[D]").astype(np.int64),
+        ] + [np.array([row[i] for row in rows], dtype=np.int64) for i in range(2, 6)]
+
+        order = np.lexsort((entries[1], entries[0]))
+        supplier, day, revenue, midnight_revenue, auctions, midnight_auctions = [
+            column[order] for column in entries
+        ]
+        by_day = np.argsort(day, kind="stable")
+        market_days, market_starts = np.unique(day[by_day], return_index=True)
+
+        self.suppliers, self.offsets = np.unique(supplier, return_index=True)
+        self.offsets = np.append(self.offsets, len(supplier))
+        self.day = day
+        self.revenue = _prefix(revenue)
+        self.auctions = _prefix(auctions)
+        self.midnight_revenue = midnight_revenue
+        self.midnight_auctions = midnight_auctions
+        self.market_day = market_days
+        self.market_auctions = _prefix(
+            np.add.reduceat(auctions[by_day], market_starts)
+            if len(market_starts)
+            else np.zeros(0, dtype=np.int64)
+        )
+        self.market_midnight_auctions = (
+            np.add.reduceat(midnight_auctions[by_day], market_starts)
+            if len(market_starts)
+            else np.zeros(0, dtype=np.int64)
+        )
+
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def covers(start_date: str, end_date: str):
+        """
+        Индекс точен для границ периода в полночь (обычные даты ГГГГ-ММ-ДД)
+        """
+        start, end = parse_date(start_date), parse_date(end_date)
+        midnight = lambda value: value.tzinfo is None and value == value.replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        return midnight(start) and midnight(end) and start <= end
+
+    def _slice(self, supplier_id: int):
+        position = np.searchsorted(self.suppliers, supplier_id)
+        if position < len(self.suppliers) and self.suppliers[position] == supplier_id:
+            return int(self.offsets[position]), int(self.offsets[position + 1])
+        return 0, 0
+
+    def _range(self, days, prefix, midnight, lo: int, hi: int, bounds, end_day: int):
+        """
+        Суммы по интервалам [bounds[i], bounds[i + 1]) в днях, к последнему
+        добавляется значение ровно в полночь end_day
+        """
+        positions = lo + np.searchsorted(days[lo:hi], bounds)
+        totals = np.diff(prefix[positions])
+        end = lo + np.searchsorted(days[lo:hi], end_day)
+        if end < hi and days[end] == end_day and len(totals):
+            totals[-1] += midnight[end]
+        return totals
+
+    def _supplier_totals(self, supplier_id: int, bounds, end_day: int):
+        lo, hi = self._slice(supplier_id)
+        revenue = self._range(
+            self.day, self.revenue, self.midnight_revenue, lo, hi, bounds, end_day
+        )
+        auctions = self._range(
+            self.day, self.auctions, self.midnight_auctions, lo, hi, bounds, end_day
+        )
+        return revenue, auctions
+
+    def metric_total_revenue(self, supplier_id: int, start_date: str, end_date: str):
+        start, end = _days(parse_date(start_date)), _days(parse_date(end_date))
+        revenue, auctions = self._supplier_totals(supplier_id, [start, end], end)
+        value = None
+        if auctions[0]:
+            value = (_rubles(revenue[0]) / 1000000).quantize(
+                Decimal("0.01"), ROUND_HALF_UP
+            )
+        return {"name": "Общая выручка", "value": value, "unit": "млн. руб."}
+
+    def metric_percentage_wins(self, supplier_id: int, start_date: str, end_date: str):
+        start, end = _days(parse_date(start_date)), _days(parse_date(end_date))
+        _, wins = self._supplier_totals(supplier_id, [start, end], end)
+        market = self._range(
+            self.market_day,
+            self.market_auctions,
+            self.market_midnight_auctions,
+            0,
+            len(self.market_day),
+            [start, end],
+            end,
+        )
+        value = (
+            (Decimal(int(wins[0]) * 100) / int(market[0])).quantize(
+                Decimal("0.01"), ROUND_HALF_UP
+            )
+            if market[0]
+            else None
+        )
+        return {"name": "Доля побед в КС", "value": value, "unit": "%"}
+
+    def revenue_trend(
+        self, bucket: str, supplier_id: int, start_date: str, end_date: str
+    ):
+        start, end = parse_date(start_date), parse_date(end_date)
+        periods = buckets(start, end, bucket)
+        bounds = [max(_days(day), _days(start)) for day, _ in periods] + [_days(end)]
+        revenue, _ = self._supplier_totals(supplier_id, bounds, _days(end))
+        return [
+            {bucket: label, "total_revenue": _rubles(value)}
+            for (_, label), value in zip(periods, revenue)
+        ]
+
+
+_index: RevenueIndex | None = None
+_lock = asyncio.Lock()
+
+
+async def get_index(db: SessionDep):
+    """
+    Индекс для текущей версии данных; после загрузки данных строится
+    заново: строки ks могут меняться целиком (end_ks, winner_id), а не
+    только добавляться
+    """
+    global _index
+    if not REVENUE_INDEX or data_version_views.sql_only.get():
+        return None
+
+    version = await data_version_views.current(db)
+    if _index is not None and _index.version == version:
+        return _index
+    if _lock.locked():
+        # Индекс уже строит другой запрос: этот пока обслужит SQL
+        return None
+
+    async with _lock:
+        if _index is None or _index.version != version:
+            _index = await RevenueIndex(version).build(db)
+    return _index
+
+
+async def verify(db: SessionDep, supplier_id: int, start_date: str, end_date: str):
+    """
+    Сверяет ответы индекса с SQL-реализацией для поставщика и периода
+    """
+    index = await RevenueIndex(await data_version_views.current(db)).build(db)
+    args = (supplier_id, start_date, end_date)
+    report = {}
+    # Суммы в копейках и округление как в SQL: ответы должны совпадать точно
+    for name in ("metric_percentage_wins", "metric_total_revenue"):
+        expected = await columnar_views.oracle(db, name, *args)
+        report[name] = getattr(index, name)(*args) == expected
+    for bucket, name in (
+        ("month", "revenue_trend_by_mounth"),
+        ("week", "revenue_trend_by_weeks"),
+    ):
+        expected = await columnar_views.oracle(db, name, *args)
+        report[name] = index.revenue_trend(bucket, *args) == expected
+    return report
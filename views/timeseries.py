@@ -0,0 +1,303 @@
+import os
+from decimal import Decimal
+from typing import Literal
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from cache import LRUCache
+from database import SessionDep
+import views.columnar as columnar_views
+import views.data_version as data_version_views
+import views.revenue_index as revenue_index_views
+from views.periods import parse_date
+
+load_dotenv()
+
+# Тренды выручки поставщиков (главный график карточки дашборда) до
+# изменения данных; их же заполняет прогрев (views/warmup)
+TREND_CACHE_SIZE = int(os.getenv("TREND_CACHE_SIZE", 4096))
+
+Bucket = Literal["day", "week", "month", "quarter", "year"]
+SplitBy = Literal["region", "kpgz_category", "customer", "supplier"]
+Measure = Literal["revenue", "auctions"]
+DateField = Literal["start_ks", "end_ks"]
+
+BUCKET_LABELS = {
+    "day": "YYYY-MM-DD",
+    "week": 'IYYY-"W"IW',
+    "month": "YYYY-MM",
+    "quarter": 'YYYY-"Q"Q',
+    "year": "YYYY",
+}
+
+BUCKET_STEPS = {
+    "day": "1 day",
+    "week": "1 week",
+    "month": "1 month",
+    "quarter": "3 months",
+    "year": "1 year",
+}
+
+CUSTOMERS_JOIN = "JOIN customers c ON ks.customer_id = c.id"
+KPGZ_CATEGORIES_JOIN = """JOIN orders o ON o.id_ks = ks.id_ks
+JOIN cte ON o.id_cte = cte.id
+JOIN kpgz_details kd ON cte.kpgz_id = kd.id
+JOIN kpgz_categories kc ON kd.parent_id = kc.id"""
+
+SPLITS = {
+    "region": {
+        "joins": [CUSTOMERS_JOIN, "JOIN regions r ON c.region_id = r.id"],
+        "key": "c.region_id",
+        "name": "r.name",
+    },
+    "customer": {
+        "joins": [CUSTOMERS_JOIN],
+        "key": "c.id",
+        "name": "c.name",
+    },
+    "supplier": {
+        "joins": ["JOIN suppliers s ON ks.winner_id = s.id"],
+        "key": "s.id",
+        "name": "s.name",
+    },
+    "kpgz_category": {
+        "joins": [KPGZ_CATEGORIES_JOIN],
+        "key": "kc.id",
+        "name": "kc.code",
+    },
+}
+
+# КС может содержать позиции разных категорий, поэтому выручка категории
+# (и в разбивке, и в фильтре) — сумма ее позиций заказа, а не цена КС
+KPGZ_REVENUE = "SUM(o.oferta_price * o.count)"
+
+OTHER_SERIES = "Прочие"
+
+_trends = LRUCache(maxsize=TREND_CACHE_SIZE)
+
+
+def timeseries_sql(
+    bucket: str,
+    date_field: str,
+    measure: str,
+    split_by: str | None,
+    supplier_ids: bool,
+    region_id: bool,
+    kpgz_category_id: bool,
+):
+    date = f"ks.{date_field}"
+    joins = []
+    filters = [f"{date} BETWEEN :start_date AND :end_date"]
+    key, name = "NULL", "NULL"
+
+    if split_by:
+        split = SPLITS[split_by]
+        joins += split["joins"]
+        key, name = split["key"], split["name"]
+
+    if supplier_ids:
+        filters.append("ks.winner_id = ANY(:supplier_ids)")
+    if region_id:
+        if CUSTOMERS_JOIN not in joins:
+            joins.append(CUSTOMERS_JOIN)
+        filters.append("c.region_id = :region_id")
+    if kpgz_category_id:
+        if KPGZ_CATEGORIES_JOIN not in joins:
+            joins.append(KPGZ_CATEGORIES_JOIN)
+        filters.append("kc.id = :kpgz_category_id")
+
+    if measure == "auctions":
+        value = "COUNT(DISTINCT ks.id_ks)"
+    elif KPGZ_CATEGORIES_JOIN in joins:
+        value = KPGZ_REVENUE
+    else:
+        value = "SUM(ks.end_price)"
+
+    joins = "\n".join(joins)
+    where = "\n    AND ".join(filters)
+    return f"""
+WITH buckets AS (
+  SELECT generate_series(
+    date_trunc('{bucket}', CAST(:start_date AS timestamp)),
+    date_trunc('{bucket}', CAST(:end_date AS timestamp)),
+    interval '{BUCKET_STEPS[bucket]}'
+  ) AS bucket
+),
+agg AS (
+  SELECT
+    date_trunc('{bucket}', {date}) AS bucket,
+    {key} AS key,
+    {name} AS name,
+    {value} AS value
+  FROM ks
+  {joins}
+  WHERE {where}
+  GROUP BY 1, 2, 3
+)
+SELECT
+  to_char(b.bucket, '{BUCKET_LABELS[bucket]}') AS label,
+  a.key,
+  a.name,
+  a.value
+FROM buckets b
+LEFT JOIN agg a ON a.bucket = b.bucket
+ORDER BY b.bucket
+    """
+
+
+def densify(rows, series_limit: int | None):
+    """
+    Плотная матрица: общий список корзин и по ряду значений на каждую,
+    пропуски заполнены нулями
+    """
+    labels = []
+    positions = {}
+    series = {}
+    for row in rows:
+        if row["label"] not in positions:
+            positions[row["label"]] = len(labels)
+            labels.append(row["label"])
+        if row["value"] is None:
+            continue
+        item = series.setdefault(
+            row["key"], {"key": row["key"], "name": row["name"], "values": {}}
+        )
+        item["values"][positions[row["label"]]] = row["value"]
+
+    ordered = sorted(
+        series.values(), key=lambda item: sum(item["values"].values()), reverse=True
+    )
+    if series_limit and len(ordered) > series_limit:
+        other = {"key": None, "name": OTHER_SERIES, "values": {}}
+        for item in ordered[series_limit:]:
+            for position, value in item["values"].items():
+                other["values"][position] = other["values"].get(position, 0) + value
+        ordered = ordered[:series_limit] + [other]
+
+    for item in ordered:
+        values = item["values"]
+        item["values"] = [
+            values.get(position, Decimal(0)) for position in range(len(labels))
+        ]
+
+    if not ordered:
+        ordered = [{"key": None, "name": None, "values": [Decimal(0)] * len(labels)}]
+
+    return {"labels": labels, "series": ordered}
+
+
+async def timeseries(
+    db: SessionDep,
+    start_date: str,
+    end_date: str,
+    bucket: Bucket = "month",
+    supplier_ids: list[int] | None = None,
+    split_by: SplitBy | None = None,
+    region_id: int | None = None,
+    kpgz_category_id: int | None = None,
+    measure: Measure = "revenue",
+    date_field: DateField = "end_ks",
+    series_limit: int | None = 10,
+):
+    """
+    Временные ряды с произвольной гранулярностью: все ряды разбивки
+    (например, по регионам) считаются одним запросом
+    """
+    params = {
+        "start_date": parse_date(start_date),
+        "end_date": parse_date(end_date),
+    }
+    if supplier_ids:
+        params["supplier_ids"] = list(supplier_ids)
+    if region_id is not None:
+        params["region_id"] = region_id
+    if kpgz_category_id is not None:
+        params["kpgz_category_id"] = kpgz_category_id
+
+    query = timeseries_sql(
+        bucket,
+        date_field,
+        measure,
+        split_by,
+        "supplier_ids" in params,
+        "region_id" in params,
+        "kpgz_category_id" in params,
+    )
+    result = await db.execute(text(query), params)
+
+    return {
+        "bucket": bucket,
+        "measure": measure,
+        "split_by": split_by,
+        **densify(result.mappings(), series_limit),
+    }
+
+
+async def revenue_trend(
+    db: SessionDep,
+    bucket: Bucket,
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    region_id: int | None = None,
+    kpgz_category_id: int | None = None,
+):
+    # Сверки с SQL (sql_only) идут мимо кэша
+    if data_version_views.sql_only.get():
+        return await _revenue_trend(
+            db, bucket, supplier_id, start_date, end_date, region_id, kpgz_category_id
+        )
+
+    key = (
+        bucket,
+        supplier_id,
+        start_date,
+        end_date,
+        region_id,
+        kpgz_category_id,
+        await data_version_views.current(db),
+    )
+    trend = _trends.get(key)
+    if trend is None:
+        trend = await _revenue_trend(
+            db, bucket, supplier_id, start_date, end_date, region_id, kpgz_category_id
+        )
+        _trends.set(key, trend)
+    return trend
+
+
+async def _revenue_trend(
+    db: SessionDep,
+    bucket: Bucket,
+    supplier_id: int,
+    start_date: str,
+    end_date: str,
+    region_id: int | None,
+    kpgz_category_id: int | None,
+):
+    if region_id is None and kpgz_category_id is None:
+        index = await revenue_index_views.get_index(db)
+        if index is not None and index.covers(start_date, end_date):
+            return index.revenue_trend(bucket, supplier_id, start_date, end_date)
+
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_trend(
+            bucket, supplier_id, start_date, end_date, region_id, kpgz_category_id
+        )
+
+    # Формат старых графиков выручки: одна строка на корзину
+    data = await timeseries(
+        db,
+        start_date,
+        end_date,
+        bucket=bucket,
+        supplier_ids=[supplier_id],
+        region_id=region_id,
+        kpgz_category_id=kpgz_category_id,
+    )
+    return [
+        {bucket: label, "total_revenue": value}
+        for label, value in zip(data["labels"], data["series"][0]["values"])
+    ]
@@ -0,0 +1,103 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from jose import JWTError, jwt
+from sqlalchemy import select
+
+from cache import LRUCache
+from database import SessionDep
+from models import UserModel
+
+load_dotenv()
+
+SECRET_KEY = "$$#&><?><&*@#$%^&*()_+"
+ALGORITHM = "HS256"
+
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Изменения пользователя в соседних воркерах видны не позже чем через ttl
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+# token -> данные пользователя
+_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
+def create_access_token(data: dict):
+    to_encode = data.copy()
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+def decode(token: str):
+    """
+    Проверяет подпись и срок действия без обращения к базе
+    """
+    try:
+        # Ранее выданные токены содержат sub числом
+        return jwt.decode(
+            token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_sub": False}
+        )
+    except JWTError:
+        return None
+
+
+def _identity(user: UserModel):
+    return {
+        "id": user.id,
+        "supplier_id": user.supplier_id,
+        "full_name": user.full_name,
+        "email": user.email,
+    }
+
+
+def _remember(token: str, identity: dict, expires_at: float):
+    ttl = min(TOKEN_CACHE_TTL, max(expires_at - time.time(), 0))
+    _cache.set(token, identity, ttl=ttl)
+
+
+async def resolve(db: SessionDep, token: str):
+    payload = decode(token)
+    if payload is None or payload.get("sub") is None:
+        return None
+
+    identity = _cache.get(token)
+    if identity is not None:
+        return identity
+
+    result = await db.execute(select(UserModel).where(UserModel.token == token))
+    user = result.scalars().first()
+    if user is None or str(user.id) != str(payload["sub"]):
+        return None
+
+    identity = _identity(user)
+    _remember(token, identity, payload["exp"])
+    return identity
+
+
+def invalidate_user(user_id: int):
+    # Обход кэша вместо индекса по пользователям: индекс пришлось бы чистить
+    # при каждом вытеснении, а изменение пользователя — редкая операция
+    _cache.pop_if(lambda token, identity: identity["id"] == user_id)
+
+
+async def ensure_fresh_token(db: SessionDep, user: UserModel):
+    """
+    Выдает новый токен, если сохраненный истек, старый перестает действовать
+    """
+    if user.token and decode(user.token) is not None:
+        return user.token
+
+    invalidate_user(user.id)
+    user.token = create_access_token(data={"sub": user.id})
+
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+
+    return user.token
@@ -1,10 +1,9 @@
 from sqlalchemy import select
-from passlib.context import CryptContext
 from database import SessionDep
 from models import UserModel
 from schemas.users import Create, Update
-
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+import views.passwords as password_views
+import views.tokens as token_views
 
 
 async def create(db: SessionDep, user: Create):
@@ -51,12 +50,14 @@ async def update_by_id(db: SessionDep, user_id: int, user_update: Update):
     if user_update.email is not None:
         user.email = user_update.email
     if user_update.password is not None:
-        user.password = pwd_context.hash(user_update.password)
+        user.password = await password_views.hash_password(user_update.password)
 
     db.add(user)
     await db.commit()
     await db.refresh(user)
 
+    token_views.invalidate_user(user_id)
+
     return user
 
 
@@ -68,4 +69,6 @@ async def delete_by_id(db: SessionDep, user_id: int):
     await db.delete(user)
     await db.commit()
 
+    token_views.invalidate_user(user_id)
+
     return True
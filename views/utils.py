@@ -1,5 +1,16 @@
 from database import SessionDep
 from sqlalchemy import text
+import views.columnar as columnar_views
+import views.cube as cube_views
+import views.market as market_views
+import views.ranges as range_views
+import views.revenue_index as revenue_index_views
+import views.timeseries as timeseries_views
+
+
+def _rows(result):
+    # Строки графика целиком: подпись и значение, а не только первый столбец
+    return [dict(row) for row in result.mappings()]
 
 
 async def herfindahl_hirschman_rate(
@@ -9,6 +20,15 @@ async def herfindahl_hirschman_rate(
     Функция для расчета индекса Херфиндаля-Хиршмана
     """
 
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.herfindahl_hirschman_rate(supplier_id, start_date, end_date)
+
+    if range_views.enabled():
+        return await range_views.herfindahl_hirschman_rate(
+            db, supplier_id, start_date, end_date
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -78,15 +98,19 @@ async def metric_percentage_wins(
     end_date: str,
     db: SessionDep,
 ):
+    index = await revenue_index_views.get_index(db)
+    if index is not None and index.covers(start_date, end_date):
+        return index.metric_percentage_wins(supplier_id, start_date, end_date)
+
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.metric_percentage_wins(supplier_id, start_date, end_date)
+
+    market = await market_views.auction_count(db, start_date, end_date)
     result = await db.execute(
         text(
             f"""
-SELECT ROUND(
-         (COUNT(ks.id_ks) * 100.0 / 
-          (SELECT COUNT(*) 
-           FROM ks 
-           WHERE ks.end_ks BETWEEN '{start_date}' AND '{end_date}')
-         ), 2) AS win_rate
+SELECT ROUND(COUNT(ks.id_ks) * 100.0 / NULLIF({market}, 0), 2) AS win_rate
 FROM ks
 JOIN suppliers ON suppliers.id = ks.winner_id
 WHERE suppliers.id = {supplier_id}
@@ -100,6 +124,15 @@ WHERE suppliers.id = {supplier_id}
 async def metric_avg_downgrade_cost(
     supplier_id: int, start_date: str, end_date: str, db: SessionDep
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.metric_avg_downgrade_cost(supplier_id, start_date, end_date)
+
+    if range_views.enabled():
+        return await range_views.metric_avg_downgrade_cost(
+            db, supplier_id, start_date, end_date
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -122,6 +155,14 @@ GROUP BY s.id;
 async def metric_total_revenue(
     supplier_id: int, start_date: str, end_date: str, db: SessionDep
 ):
+    index = await revenue_index_views.get_index(db)
+    if index is not None and index.covers(start_date, end_date):
+        return index.metric_total_revenue(supplier_id, start_date, end_date)
+
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.metric_total_revenue(supplier_id, start_date, end_date)
+
     result = await db.execute(
         text(
             f"""
@@ -143,6 +184,15 @@ WHERE ks.winner_id = {supplier_id}
 async def revenue_by_regions(
     supplier_id: int, start_date: str, end_date: str, db: SessionDep
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_regions(supplier_id, start_date, end_date)
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db, "revenue_by_regions", start_date, end_date, supplier_id=supplier_id
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -161,7 +211,7 @@ ORDER BY revenue DESC
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 2 состояние 2
@@ -173,6 +223,23 @@ async def revenue_by_kpgz_category_by_region_id(
     limit: int,
     db: SessionDep,
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_kpgz_category_by_region_id(
+            supplier_id, start_date, end_date, region_id, limit
+        )
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_kpgz_category_by_region_id",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+            region_id=region_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -194,7 +261,7 @@ LIMIT {limit};
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 2 состояние 3
@@ -206,6 +273,23 @@ async def revenue_by_kpgz_category_by_kpgz_category_id(
     limit: int,
     db: SessionDep,
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_kpgz_category_by_kpgz_category_id(
+            supplier_id, start_date, end_date, kpgz_category_id, limit
+        )
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_kpgz_category_by_kpgz_category_id",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -228,7 +312,7 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 2 состояние 4
@@ -275,12 +359,29 @@ SELECT
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 1 состояние 1
 async def total_revenue_by_kpgz_category(
     start_date: str, end_date: str, limit: int, db: SessionDep
+):
+    cube = await cube_views.get_cube(db)
+    if cube is not None:
+        return cube.total_revenue_by_kpgz_category(start_date, end_date, limit)
+
+    return await market_views.shared(
+        db,
+        "total_revenue_by_kpgz_category",
+        _total_revenue_by_kpgz_category,
+        start_date,
+        end_date,
+        limit,
+    )
+
+
+async def _total_revenue_by_kpgz_category(
+    start_date: str, end_date: str, limit: int, db: SessionDep
 ):
     result = await db.execute(
         text(
@@ -301,12 +402,32 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 1 состояние 2 выбран регион
 async def total_revenue_by_kpgz_category_by_region_id(
     start_date: str, end_date: str, region_id: int, limit: int, db: SessionDep
+):
+    cube = await cube_views.get_cube(db)
+    if cube is not None:
+        return cube.total_revenue_by_kpgz_category_by_region_id(
+            start_date, end_date, region_id, limit
+        )
+
+    return await market_views.shared(
+        db,
+        "total_revenue_by_kpgz_category_by_region_id",
+        _total_revenue_by_kpgz_category_by_region_id,
+        start_date,
+        end_date,
+        region_id,
+        limit,
+    )
+
+
+async def _total_revenue_by_kpgz_category_by_region_id(
+    start_date: str, end_date: str, region_id: int, limit: int, db: SessionDep
 ):
     result = await db.execute(
         text(
@@ -338,12 +459,32 @@ SELECT
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 1 состояние 3 выбран КПГЗ
 async def total_revenue_by_regions_by_kpgz_category_id(
     start_date: str, end_date: str, kpgz_category_id: int, limit: int, db: SessionDep
+):
+    cube = await cube_views.get_cube(db)
+    if cube is not None:
+        return cube.total_revenue_by_regions_by_kpgz_category_id(
+            start_date, end_date, kpgz_category_id, limit
+        )
+
+    return await market_views.shared(
+        db,
+        "total_revenue_by_regions_by_kpgz_category_id",
+        _total_revenue_by_regions_by_kpgz_category_id,
+        start_date,
+        end_date,
+        kpgz_category_id,
+        limit,
+    )
+
+
+async def _total_revenue_by_regions_by_kpgz_category_id(
+    start_date: str, end_date: str, kpgz_category_id: int, limit: int, db: SessionDep
 ):
     result = await db.execute(
         text(
@@ -366,7 +507,7 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 1 состояние 4 выбран КПГЗ и регион
@@ -377,6 +518,32 @@ async def total_revenue_by_regions_by_kpgz_category_and_region_id(
     region_id: int,
     limit: int,
     db: SessionDep,
+):
+    cube = await cube_views.get_cube(db)
+    if cube is not None:
+        return cube.total_revenue_by_regions_by_kpgz_category_and_region_id(
+            start_date, end_date, kpgz_category_id, region_id, limit
+        )
+
+    return await market_views.shared(
+        db,
+        "total_revenue_by_regions_by_kpgz_category_and_region_id",
+        _total_revenue_by_regions_by_kpgz_category_and_region_id,
+        start_date,
+        end_date,
+        kpgz_category_id,
+        region_id,
+        limit,
+    )
+
+
+async def _total_revenue_by_regions_by_kpgz_category_and_region_id(
+    start_date: str,
+    end_date: str,
+    kpgz_category_id: int,
+    region_id: int,
+    limit: int,
+    db: SessionDep,
 ):
     result = await db.execute(
         text(
@@ -410,151 +577,43 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 3 состояние 1 по месяцам
 async def revenue_trend_by_mounth(
     supplier_id: int, start_date: str, end_date: str, db: SessionDep
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH months AS (
-  SELECT generate_series(
-    date_trunc('month', '{start_date}'::date),
-    date_trunc('month', '{end_date}'::date),
-    interval '1 month'
-  ) AS month_start
-),
-agg AS (
-  SELECT
-    date_trunc('month', ks.start_ks) AS month,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.start_ks BETWEEN '{start_date}' AND '{end_date}'
-  GROUP BY date_trunc('month', ks.start_ks)
-)
-SELECT
-  to_char(m.month_start, 'YYYY-MM') AS month,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM months m
-LEFT JOIN agg a ON a.month = m.month_start
-ORDER BY m.month_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db, "month", supplier_id, start_date, end_date
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 1 по неделям
 async def revenue_trend_by_weeks(
     supplier_id: int, start_date: str, end_date: str, db: SessionDep
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH weeks AS (
-  SELECT generate_series(
-    date_trunc('week', '{start_date}'::date),
-    date_trunc('week', '{end_date}'::date),
-    interval '1 week'
-  ) AS week_start
-),
-agg AS (
-  SELECT
-    date_trunc('week', ks.start_ks) AS week,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.start_ks BETWEEN '{start_date}' AND '{end_date}'
-  GROUP BY date_trunc('week', ks.start_ks)
-)
-SELECT
-  to_char(w.week_start, 'YYYY-"W"IW') AS week,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM weeks w
-LEFT JOIN agg a ON a.week = w.week_start
-ORDER BY w.week_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db, "week", supplier_id, start_date, end_date
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 2 по месяцам
 async def revenue_trend_by_mounth_by_region_id(
     supplier_id: int, start_date: str, end_date: str, region_id: int, db: SessionDep
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH months AS (
-  SELECT generate_series(
-    date_trunc('month', '{start_date}'::date),
-    date_trunc('month', '{end_date}'::date),
-    interval '1 month'
-  ) AS month_start
-),
-agg AS (
-  SELECT
-    date_trunc('month', ks.start_ks) AS month,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  JOIN customers c ON ks.customer_id = c.id
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-    AND c.region_id = {region_id}
-  GROUP BY date_trunc('month', ks.end_ks)
-)
-SELECT
-  to_char(m.month_start, 'YYYY-MM') AS month,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM months m
-LEFT JOIN agg a ON a.month = m.month_start
-ORDER BY m.month_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db, "month", supplier_id, start_date, end_date, region_id=region_id
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 2 по неделям
 async def revenue_trend_by_weeks_by_region_id(
     supplier_id: int, start_date: str, end_date: str, region_id: int, db: SessionDep
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH weeks AS (
-  SELECT generate_series(
-    date_trunc('week', '{start_date}'::date),
-    date_trunc('week', '{end_date}'::date),
-    interval '1 week'
-  ) AS week_start
-),
-agg AS (
-  SELECT
-    date_trunc('week', ks.start_ks) AS week,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  JOIN customers c ON ks.customer_id = c.id
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-    AND c.region_id = {region_id}
-  GROUP BY date_trunc('week', ks.end_ks)
-)
-SELECT
-  to_char(w.week_start, 'YYYY-"W"IW') AS week,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM weeks w
-LEFT JOIN agg a ON a.week = w.week_start
-ORDER BY w.week_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db, "week", supplier_id, start_date, end_date, region_id=region_id
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 3 по месяцам
@@ -565,47 +624,14 @@ async def revenue_trend_by_mounth_by_kpgz_category_id(
     kpgz_category_id: int,
     db: SessionDep,
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH months AS (
-  SELECT generate_series(
-    date_trunc('month', '{start_date}'::date),
-    date_trunc('month', '{end_date}'::date),
-    interval '1 month'
-  ) AS month_start
-),
-filtered_kpgz AS (
-  SELECT kd.id
-  FROM kpgz_details kd
-  WHERE kd.parent_id = {kpgz_category_id}
-),
-relevant_orders AS (
-  SELECT o.id_ks
-  FROM orders o
-  JOIN cte c ON o.id_cte = c.id
-  JOIN filtered_kpgz fk ON c.kpgz_id = fk.id
-),
-agg AS (
-  SELECT
-    date_trunc('month', ks.end_ks) AS month,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  JOIN relevant_orders ro ON ks.id_ks = ro.id_ks
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-  GROUP BY date_trunc('month', ks.end_ks)
-)
-SELECT
-  to_char(m.month_start, 'YYYY-MM') AS month,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM months m
-LEFT JOIN agg a ON a.month = m.month_start
-ORDER BY m.month_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db,
+        "month",
+        supplier_id,
+        start_date,
+        end_date,
+        kpgz_category_id=kpgz_category_id,
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 3 по неделям
@@ -616,47 +642,9 @@ async def revenue_trend_by_weeks_by_kpgz_category_id(
     kpgz_category_id: int,
     db: SessionDep,
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH weeks AS (
-  SELECT generate_series(
-    date_trunc('week', '{start_date}'::date),
-    date_trunc('week', '{end_date}'::date),
-    interval '1 week'
-  ) AS week_start
-),
-filtered_kpgz AS (
-  SELECT kd.id
-  FROM kpgz_details kd
-  WHERE kd.parent_id = {kpgz_category_id}
-),
-relevant_orders AS (
-  SELECT o.id_ks
-  FROM orders o
-  JOIN cte c ON o.id_cte = c.id
-  JOIN filtered_kpgz fk ON c.kpgz_id = fk.id
-),
-agg AS (
-  SELECT
-    date_trunc('week', ks.end_ks) AS week,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  JOIN relevant_orders ro ON ks.id_ks = ro.id_ks
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-  GROUP BY date_trunc('week', ks.end_ks)
-)
-SELECT
-  to_char(w.week_start, 'YYYY-"W"IW') AS week,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM weeks w
-LEFT JOIN agg a ON a.week = w.week_start
-ORDER BY w.week_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db, "week", supplier_id, start_date, end_date, kpgz_category_id=kpgz_category_id
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 4 по месяцам
@@ -668,41 +656,15 @@ async def revenue_trend_by_mounth_by_kpgz_category_id_and_region_id(
     region_id: int,
     db: SessionDep,
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH months AS (
-  SELECT generate_series(
-    date_trunc('month', '{start_date}'::date),
-    date_trunc('month', '{end_date}'::date),
-    interval '1 month'
-  ) AS month_start
-),
-agg AS (
-  SELECT
-    date_trunc('month', ks.end_ks) AS month,
-    SUM(o.oferta_price * o.count) AS total_revenue
-  FROM ks
-  JOIN customers c ON ks.customer_id = c.id
-  JOIN orders o ON ks.id_ks = o.id_ks
-  JOIN cte ON o.id_cte = cte.id
-  JOIN kpgz_details kd ON cte.kpgz_id = kd.id
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-    AND c.region_id = {region_id}
-    AND kd.parent_id = {kpgz_category_id}
-  GROUP BY date_trunc('month', ks.end_ks)
-)
-SELECT
-  to_char(m.month_start, 'YYYY-MM') AS month,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM months m
-LEFT JOIN agg a ON a.month = m.month_start
-ORDER BY m.month_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db,
+        "month",
+        supplier_id,
+        start_date,
+        end_date,
+        kpgz_category_id=kpgz_category_id,
+        region_id=region_id,
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 3 состояние 4 по месяцам
@@ -714,47 +676,35 @@ async def revenue_trend_by_weeks_by_kpgz_category_id_and_region_id(
     region_id: int,
     db: SessionDep,
 ):
-    result = await db.execute(
-        text(
-            f"""
-WITH weeks AS (
-  SELECT generate_series(
-    date_trunc('week', '{start_date}'::date),
-    date_trunc('week', '{end_date}'::date),
-    interval '1 week'
-  ) AS week_start
-),
-agg AS (
-  SELECT
-    date_trunc('week', ks.end_ks) AS week,
-    SUM(CAST(ks.end_price AS numeric)) AS total_revenue
-  FROM ks
-  JOIN customers c ON ks.customer_id = c.id
-  JOIN orders o ON ks.id_ks = o.id_ks
-  JOIN cte ON o.id_cte = cte.id
-  JOIN kpgz_details kd ON cte.kpgz_id = kd.id
-  WHERE ks.winner_id = {supplier_id}
-    AND ks.end_ks BETWEEN '{start_date}' AND '{end_date}'
-    AND c.region_id = {region_id}
-    AND kd.parent_id = {kpgz_category_id}
-  GROUP BY date_trunc('week', ks.end_ks)
-)
-SELECT
-  to_char(w.week_start, 'YYYY-"W"IW') AS week,
-  COALESCE(a.total_revenue, 0) AS total_revenue
-FROM weeks w
-LEFT JOIN agg a ON a.week = w.week_start
-ORDER BY w.week_start;
-            """
-        )
+    return await timeseries_views.revenue_trend(
+        db,
+        "week",
+        supplier_id,
+        start_date,
+        end_date,
+        kpgz_category_id=kpgz_category_id,
+        region_id=region_id,
     )
-    return result.scalars()._fetchiter_impl()
 
 
 # График 4 состояние 1 по месяцам
 async def revenue_by_customers(
     supplier_id: int, start_date: str, end_date: str, limit: int, db: SessionDep
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_customers(supplier_id, start_date, end_date, limit)
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_customers",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -772,7 +722,7 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 4 состояние 2 по месяцам когда выбран регион
@@ -784,6 +734,23 @@ async def revenue_by_customers_by_region_id(
     limit: int,
     db: SessionDep,
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_customers_by_region_id(
+            supplier_id, start_date, end_date, region_id, limit
+        )
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_customers_by_region_id",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+            region_id=region_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -804,7 +771,7 @@ LIMIT {limit}
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 4 состояние 3 по месяцам когда выбран КПГЗ
@@ -816,6 +783,23 @@ async def revenue_by_customers_by_kpgz_id(
     limit: int,
     db: SessionDep,
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_customers_by_kpgz_id(
+            supplier_id, start_date, end_date, kpgz_category_id, limit
+        )
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_customers_by_kpgz_id",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -837,7 +821,7 @@ ORDER BY total_revenue DESC;
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
 
 
 # График 4 состояние 4 когда выбран КПГЗ и регион
@@ -846,10 +830,28 @@ async def revenue_by_customers_by_region_id_and_kpgz_category_id(
     start_date: str,
     end_date: str,
     kpgz_category_id: int,
-    region_id,
+    region_id: int,
     limit: int,
     db: SessionDep,
 ):
+    engine = await columnar_views.get_engine(db)
+    if engine is not None:
+        return engine.revenue_by_customers_by_region_id_and_kpgz_category_id(
+            supplier_id, start_date, end_date, kpgz_category_id, region_id, limit
+        )
+
+    if range_views.enabled():
+        return await range_views.chart(
+            db,
+            "revenue_by_customers_by_region_id_and_kpgz_category_id",
+            start_date,
+            end_date,
+            limit,
+            supplier_id=supplier_id,
+            kpgz_category_id=kpgz_category_id,
+            region_id=region_id,
+        )
+
     result = await db.execute(
         text(
             f"""
@@ -876,4 +878,4 @@ SELECT
             """
         )
     )
-    return result.scalars()._fetchiter_impl()
+    return _rows(result)
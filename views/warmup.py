@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from contextlib import suppress
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from database import read_session
+from models import DashboardModel
+import views.batch as batch_views
+import views.columnar as columnar_views
+import views.cube as cube_views
+import views.data_version as data_version_views
+import views.revenue_index as revenue_index_views
+import views.widgets as widget_views
+from views.dashboards import DEFAULT_END_DATE, DEFAULT_START_DATE
+
+load_dotenv()
+
+# Построить структуры аналитики и прогреть кэши дашбордов при старте
+# воркера и после загрузки данных, а не на первых запросах пользователей
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+# Прогрев фоновый: меньше параллельных запросов, чем у пользовательских
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 2))
+WARMUP_MAX_OWNERS = int(os.getenv("WARMUP_MAX_OWNERS", 1000))
+# Как часто воркер проверяет версию данных: POST /api/data_version попадает
+# в один воркер, остальные замечают новую версию сами и прогревают свои кэши
+WARMUP_POLL_INTERVAL = float(os.getenv("WARMUP_POLL_INTERVAL", 10))
+
+# Карточка дашборда в views/dashboards: метрики и главный график владельца
+SCORECARD = (
+    "herfindahl_hirschman_rate",
+    "metric_percentage_wins",
+    "metric_avg_downgrade_cost",
+    "metric_total_revenue",
+    # Кэшируется во views/timeseries по версии данных
+    "revenue_trend_by_mounth",
+)
+
+stats = {"version": None, "derived_structures": None, "dashboards": None}
+_task: asyncio.Task | None = None
+_watcher: asyncio.Task | None = None
+
+
+def _ms(started: float):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+async def derived_structures():
+    """
+    Индекс выручки, куб рынка и (если включен) колоночный движок для
+    текущей версии данных
+    """
+    started = time.perf_counter()
+    async with await read_session() as db:
+        built = {
+            "revenue_index": await revenue_index_views.get_index(db) is not None,
+            "market_cube": await cube_views.get_cube(db) is not None,
+            "columnar_engine": await columnar_views.get_engine(db) is not None,
+        }
+    stats["derived_structures"] = {**built, "duration_ms": _ms(started)}
+    return stats["derived_structures"]
+
+
+async def dashboards():
+    """
+    Карточки и виджеты дашбордов за период по умолчанию; владельцы с
+    большим числом дашбордов — первыми. Статистики просмотров нет, поэтому
+    прогреваются все владельцы (не больше WARMUP_MAX_OWNERS)
+    """
+    started = time.perf_counter()
+    async with await read_session() as db:
+        owners = (
+            (
+                await db.execute(
+                    select(DashboardModel.owner_id)
+                    .group_by(DashboardModel.owner_id)
+                    .order_by(func.count().desc(), DashboardModel.owner_id)
+                    .limit(WARMUP_MAX_OWNERS)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        dashboard_ids = (
+            (
+                await db.execute(
+                    select(DashboardModel.id)
+                    .where(DashboardModel.owner_id.in_(owners))
+                    .order_by(DashboardModel.id)
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+    # views/dashboards передает в аналитику id владельца — те же ключи кэшей
+    calls = {
+        owner: [
+            batch_views.call_key(
+                name,
+                supplier_id=owner,
+                start_date=DEFAULT_START_DATE,
+                end_date=DEFAULT_END_DATE,
+            )
+            for name in SCORECARD
+        ]
+        for owner in owners
+    }
+    outcomes = await batch_views.run(
+        [key for keys in calls.values() for key in keys],
+        concurrency=WARMUP_CONCURRENCY,
+    )
+    warm_owners = sum(
+        not any(outcomes[key][1] for key in keys) for keys in calls.values()
+    )
+
+    # Виджеты по одному дашборду: внутри вызовы уже выполняются параллельно
+    warm_dashboards = 0
+    for dashboard_id in dashboard_ids:
+        async with await read_session() as db:
+            widgets = await widget_views.get_with_data_by_dashboard_id(
+                db, dashboard_id, DEFAULT_START_DATE, DEFAULT_END_DATE
+            )
+        warm_dashboards += widgets is not None and not any(
+            widget["error"] and widget["type"] in widget_views.ADAPTERS
+            for widget in widgets
+        )
+
+    stats["dashboards"] = {
+        "owners": len(owners),
+        "warm_owners": warm_owners,
+        "dashboards": len(dashboard_ids),
+        "warm_dashboards": warm_dashboards,
+        "coverage": (
+            round(
+                (warm_owners + warm_dashboards) / (len(owners) + len(dashboard_ids)), 4
+            )
+            if owners
+            else None
+        ),
+        "failed_calls": sum(1 for _, error in outcomes.values() if error),
+        "duration_ms": _ms(started),
+    }
+    return stats["dashboards"]
+
+
+async def run():
+    """
+    Структуры аналитики, затем дашборды; результат — в stats
+    """
+    started = time.perf_counter()
+    async with await read_session() as db:
+        stats["version"] = await data_version_views.current(db)
+    await derived_structures()
+    await dashboards()
+    stats["finished_at"] = time.time()
+    stats["duration_ms"] = _ms(started)
+    return stats
+
+
+def schedule():
+    """
+    Запускает прогрев в фоне, если он еще не идет
+    """
+    global _task
+    if _task is not None and not _task.done():
+        return False
+    _task = asyncio.create_task(run())
+    return True
+
+
+async def _watch(warm_now: bool):
+    if not warm_now:
+        # Текущая версия считается прогретой: ждем только ее смены
+        with suppress(Exception):
+            async with await read_session() as db:
+                stats["version"] = await data_version_views.current(db)
+    while True:
+        with suppress(Exception):
+            async with await read_session() as db:
+                version = await data_version_views.current(db)
+            # Если прогрев еще идет для прошлой версии, новая будет замечена
+            # на следующей проверке
+            if version != stats["version"]:
+                schedule()
+        await asyncio.sleep(WARMUP_POLL_INTERVAL)
+
+
+def start(warm_now: bool):
+    """
+    Запускает в воркере слежение за версией данных: прогрев сразу (если
+    warm_now) и после каждой ее смены
+    """
+    global _watcher
+    if _watcher is None or _watcher.done():
+        _watcher = asyncio.create_task(_watch(warm_now))
+
+
+async def cancel():
+    for task in (_watcher, _task):
+        if task is not None and not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await task
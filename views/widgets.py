@@ -1,7 +1,22 @@
-from sqlalchemy import select
+import os
 
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from cache import LRUCache
 from database import SessionDep
-from models import WidgetModel
+from models import DashboardModel, UserModel, WidgetModel
+import views.batch as batch_views
+import views.data_version as data_version_views
+from views.periods import parse_date
+
+load_dotenv()
+
+# Данные виджетов дашборда за период, до изменения данных
+WIDGET_CACHE_SIZE = int(os.getenv("WIDGET_CACHE_SIZE", 1024))
+WIDGET_LIMIT = 10
+
+_cache = LRUCache(maxsize=WIDGET_CACHE_SIZE)
 
 
 async def get_all(db: SessionDep):
@@ -16,5 +31,141 @@ async def get_by_dashboard_id(db: SessionDep, dashboard_id: int):
     return result.scalars().all()
 
 
+async def fingerprint(db: SessionDep, dashboard_id: int):
+    """
+    Все, от чего зависят данные виджетов помимо версии данных: поставщик
+    владельца, число виджетов, последний id и последнее изменение;
+    None, если дашборда нет
+    """
+    result = await db.execute(
+        select(
+            UserModel.supplier_id,
+            func.count(WidgetModel.id),
+            func.max(WidgetModel.id),
+            func.max(func.coalesce(WidgetModel.updated_at, WidgetModel.created_at)),
+        )
+        .select_from(DashboardModel)
+        .join(UserModel, DashboardModel.owner_id == UserModel.id)
+        .outerjoin(WidgetModel, WidgetModel.dashboard_id == DashboardModel.id)
+        .where(DashboardModel.id == dashboard_id)
+        .group_by(UserModel.supplier_id)
+    )
+    row = result.first()
+    return None if row is None else tuple(row)
+
+
 async def update_by_id(db: SessionDep, widget_id: int, widget: WidgetModel):
     pass
+
+
+# Адаптеры: тип виджета -> вызов аналитики (views/batch) для поставщика
+# и периода
+def _metric(name: str):
+    return lambda widget, supplier_id, start_date, end_date: batch_views.call_key(
+        name, supplier_id=supplier_id, start_date=start_date, end_date=end_date
+    )
+
+
+def _top(name: str):
+    return lambda widget, supplier_id, start_date, end_date: batch_views.call_key(
+        name,
+        supplier_id=supplier_id,
+        start_date=start_date,
+        end_date=end_date,
+        limit=WIDGET_LIMIT,
+    )
+
+
+def _market(name: str):
+    return lambda widget, supplier_id, start_date, end_date: batch_views.call_key(
+        name, start_date=start_date, end_date=end_date, limit=WIDGET_LIMIT
+    )
+
+
+def _trend(widget, supplier_id, start_date, end_date):
+    # Переключатель данных: по неделям вместо месяцев
+    name = "revenue_trend_by_weeks" if widget.data_switch else "revenue_trend_by_mounth"
+    return batch_views.call_key(
+        name, supplier_id=supplier_id, start_date=start_date, end_date=end_date
+    )
+
+
+ADAPTERS = {
+    "herfindahl_hirschman_rate": _metric("herfindahl_hirschman_rate"),
+    "metric_percentage_wins": _metric("metric_percentage_wins"),
+    "metric_avg_downgrade_cost": _metric("metric_avg_downgrade_cost"),
+    "metric_total_revenue": _metric("metric_total_revenue"),
+    "revenue_trend": _trend,
+    "revenue_by_regions": _metric("revenue_by_regions"),
+    "revenue_by_customers": _top("revenue_by_customers"),
+    "total_revenue_by_kpgz_category": _market("total_revenue_by_kpgz_category"),
+}
+
+
+async def get_with_data_by_dashboard_id(
+    db: SessionDep, dashboard_id: int, start_date: str, end_date: str
+):
+    """
+    Виджеты дашборда вместе с данными для поставщика владельца дашборда;
+    None, если дашборда нет
+    """
+    parse_date(start_date), parse_date(end_date)
+
+    supplier_id = (
+        await db.execute(
+            select(UserModel.supplier_id)
+            .join(DashboardModel, DashboardModel.owner_id == UserModel.id)
+            .where(DashboardModel.id == dashboard_id)
+        )
+    ).scalar()
+    if supplier_id is None:
+        return None
+
+    widgets = sorted(
+        await get_by_dashboard_id(db, dashboard_id),
+        key=lambda widget: (widget.index is None, widget.index, widget.id),
+    )
+    calls = {
+        widget.id: ADAPTERS[widget.type](widget, supplier_id, start_date, end_date)
+        for widget in widgets
+        if widget.type in ADAPTERS
+    }
+
+    key = (
+        dashboard_id,
+        start_date,
+        end_date,
+        await data_version_views.current(db),
+        tuple(calls.items()),
+    )
+    outcomes = _cache.get(key)
+    if outcomes is None:
+        outcomes = await batch_views.run(list(calls.values()))
+        # Ошибки могут быть временными — такой результат не кэшируется
+        if not any(error for _, error in outcomes.values()):
+            _cache.set(key, outcomes)
+
+    response = []
+    for widget in widgets:
+        data, error = None, f"Неизвестный тип виджета '{widget.type}'"
+        if widget.id in calls:
+            data, error = outcomes[calls[widget.id]]
+        response.append(
+            {
+                "id": widget.id,
+                "type": widget.type,
+                "index": widget.index,
+                "title": widget.title,
+                "data_switch": widget.data_switch,
+                "smooth": widget.smooth,
+                "min": widget.min,
+                "max": widget.max,
+                "data": data,
+                "error": error,
+            }
+        )
+    return response
+
+
+def stats():
+    return _cache.stats()